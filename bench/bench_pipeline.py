@@ -0,0 +1,381 @@
+# Reproducerbart end-to-end benchmark af Jarvis-pipelinen drevet af optagede lydklip.
+#
+# Klip-mappen skal indeholde en manifest.jsonl med én linje pr. klip:
+#   {"audio": "klokken_1.wav", "text": "hvad er klokken", "intent": "klokken"}
+#
+# Mikrofon, højttaler, browser og netværk (gTTS/Gemini) erstattes af lokale
+# stand-ins, så kun vores egen kode og modellerne måles. Kør fra repo-roden:
+#   python bench/bench_pipeline.py bench/clips
+#   python bench/bench_pipeline.py bench/clips --update-baseline
+#
+# Resultatet skrives til bench/results/pipeline.json og sammenlignes med
+# bench/baseline_pipeline.json. En regression giver exit-kode 1.
+
+import os
+import re
+import sys
+import json
+import time
+import types
+import argparse
+import platform
+import threading
+import contextvars
+import collections
+import concurrent.futures
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(REPO_ROOT, "src"))
+os.chdir(REPO_ROOT)  # Modeller indlæses relativt til repo-roden
+
+import librosa
+import jarvis_main as jm
+from turn_trace import start_turn
+
+RESULTS_PATH = os.path.join(BENCH_DIR, "results", "pipeline.json")
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline_pipeline.json")
+# 1,5 s syntetisk stemme-lignende lyd kodet som gTTS leverer det (MPEG-2 layer III, 24 kHz mono, 32 kbit/s)
+TTS_FIXTURE = os.path.join(BENCH_DIR, "fixtures", "tts.mp3")
+CONCURRENCY_LEVELS = [1, 2, 4, 8]
+WARMUP_CLIPS = 2
+
+# Tolerancer for regressionstjek mod baseline
+LATENCY_TOLERANCE = 1.25    # p95 må højst stige 25 %
+LATENCY_SLACK_MS = 5.0      # ... plus lidt absolut slack for meget hurtige stadier
+THROUGHPUT_TOLERANCE = 0.8  # Throughput må højst falde 20 %
+WER_TOLERANCE = 0.02
+ACCURACY_TOLERANCE = 0.02
+
+
+# --- Lokale stand-ins ---------------------------------------------------------
+
+class ClipCapture:
+    """Erstatter AudioCapture: afspiller det aktuelle klip chunk for chunk.
+
+    Efter klippet leveres stilhed, så record_audio() endpointer præcis som
+    med en rigtig mikrofon. Klippet er trådlokalt, så flere ture kan køre
+    samtidigt.
+    """
+
+    sample_width = 2
+
+    def __init__(self):
+        self._local = threading.local()
+        self._silence = bytes(jm.CHUNK * self.sample_width)
+
+    def load(self, audio):
+        pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+        step = jm.CHUNK * self.sample_width
+        self._local.chunks = collections.deque(pcm[i:i + step] for i in range(0, len(pcm), step))
+
+    def start(self):
+        pass
+
+    def begin_utterance(self):
+        return []
+
+    def read_chunk(self, timeout=1.0):
+        chunks = getattr(self._local, "chunks", None)
+        return chunks.popleft() if chunks else self._silence
+
+    def end_utterance(self):
+        self._local.chunks = collections.deque()
+
+    def stop(self):
+        pass
+
+
+class LocalTTS:
+    """Erstatter gTTS - skriver en forudgenereret mp3 i stedet for at kalde Google.
+
+    Mp3'en er gyldig, så speak() afkoder den som ved et rigtigt svar, og
+    afkodningen måles med i tts-stadiet.
+    """
+
+    with open(TTS_FIXTURE, "rb") as f:
+        mp3 = f.read()
+
+    def __init__(self, text, lang='da', slow=False):
+        self.text = text
+
+    def write_to_fp(self, fp):
+        fp.write(self.mp3)
+
+
+class NullAudioIO:
+    """Erstatter AudioIO - afspilning bliver til ingenting"""
+
+    def play(self, samples, rate=None, wait=False):
+        return None
+
+    def close(self):
+        pass
+
+
+class _GeminiResponse:
+    status_code = 200
+    text = ""
+
+    def json(self):
+        return {"candidates": [{"content": {"parts": [{"text": "Det ved jeg ikke."}]}}]}
+
+
+def install_stand_ins(capture):
+    jm.get_audio_capture = lambda: capture
+    jm.gTTS = LocalTTS
+    jm.get_audio_io = lambda: NullAudioIO()
+    jm.webbrowser = types.SimpleNamespace(open=lambda *args, **kwargs: True)
+    jm.requests = types.SimpleNamespace(post=lambda *args, **kwargs: _GeminiResponse())
+    os.environ.setdefault("GEMINI_API_KEY", "bench")
+    # Undgå at benchmarket skriver i de rigtige data-filer
+    jm.log_unknown_sentence = lambda sentence: None
+    jm.add_conversation_pair = lambda user_text, jarvis_text: None
+    jm.NOTES_DB = os.path.join(BENCH_DIR, "results", "bench_notes.db")
+    # Klippene afspilles flere gange (throughput-runderne) - uden cache måles hele kæden hver gang
+    jm.response_cache.maxsize = 0
+    # Teach-me venter på brugerens næste tur - et klip skal ikke blive svar på det forrige
+    jm.TEACH_ENABLED = False
+
+
+# --- Måling ------------------------------------------------------------------
+
+def normalize_words(text):
+    return re.sub(r"[^\wæøå ]", " ", (text or "").lower()).split()
+
+
+def word_errors(reference, hypothesis):
+    """(edit-distance, antal referenceord) på ordniveau"""
+    ref, hyp = normalize_words(reference), normalize_words(hypothesis)
+    prev = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        cur = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (r != h))
+        prev = cur
+    return prev[-1], len(ref)
+
+
+def peak_rss_bytes():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if platform.system() == "Darwin" else peak * 1024
+    except ImportError:
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset
+        except Exception:
+            return None
+
+
+def load_clips(clip_dir):
+    manifest = os.path.join(clip_dir, "manifest.jsonl")
+    if not os.path.exists(manifest):
+        sys.exit(f"[FEJL] Fandt ikke {manifest}")
+    clips = []
+    with open(manifest, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            audio, _ = librosa.load(os.path.join(clip_dir, entry["audio"]), sr=jm.RATE, mono=True)
+            clips.append({**entry, "samples": audio})
+    return clips
+
+
+def run_clip(capture, clip):
+    """Én tur: simuleret capture -> (kommando-genvej eller STT -> handle_command) -> TTS"""
+    trace = start_turn(jm.MODEL_VERSIONS)
+    capture.load(clip["samples"])
+    with trace.stage("capture"):
+        audio = jm.record_audio()
+    trace.audio_seconds = len(audio) / jm.RATE if audio is not None else None
+    jm.begin_turn()  # Som i main_async: samme modelversioner fra rescoring til svar
+    with trace.stage("spot"):
+        spotted, _ = jm.spot_command(audio)
+    text = None
+    if spotted:
+        jm.set_path(f"spot:{spotted}")
+        with trace.stage("handle_command"):
+            response = jm.handle_spotted(spotted)
+    else:
+        with trace.stage("stt"):
+            text = jm.transcribe_audio(audio)
+        with trace.stage("handle_command"):
+            response = jm.handle_command(text or "")
+    with trace.stage("tts"):
+        jm.speak(response)
+    record = trace.record()
+    record["clip"] = clip["audio"]
+    record["spotted"] = spotted
+    record["hypothesis"] = text or ""
+    record["predicted_intent"] = spotted or (jm.predict_intent(text.strip().lower()) if text else None)
+    return record
+
+
+def run_isolated(capture, clip):
+    # Hver tur i sin egen context, så traces ikke blandes mellem tråde
+    return contextvars.copy_context().run(run_clip, capture, clip)
+
+
+def percentiles(values):
+    arr = np.array(values, dtype=np.float64)
+    return {"p50": float(np.percentile(arr, 50)), "p95": float(np.percentile(arr, 95)),
+            "p99": float(np.percentile(arr, 99)), "mean": float(arr.mean())}
+
+
+def summarize(records):
+    stages = collections.defaultdict(list)
+    for record in records:
+        for name, ms in record["stages_ms"].items():
+            stages[name].append(ms)
+        stages["turn"].append(record["total_ms"])
+
+    errors = words = 0
+    intent_hits = intent_total = 0
+    for record in records:
+        if not record.get("spotted"):  # Genvejen giver ingen tekst - WER gælder kun Whisper-turene
+            e, n = word_errors(record["reference"], record["hypothesis"])
+            errors += e
+            words += n
+        if record.get("expected_intent"):
+            intent_total += 1
+            intent_hits += record["predicted_intent"] == record["expected_intent"]
+
+    rtfs = [r["rtf"] for r in records if r["rtf"] is not None]
+    return {
+        "latency_ms": {name: percentiles(values) for name, values in sorted(stages.items())},
+        "rtf": percentiles(rtfs) if rtfs else None,
+        "wer": errors / words if words else None,
+        "intent_accuracy": intent_hits / intent_total if intent_total else None,
+        "paths": dict(collections.Counter(r["path"] or "none" for r in records)),
+        "spot_rate": sum(bool(r.get("spotted")) for r in records) / len(records) if records else None,
+    }
+
+
+def measure_throughput(capture, clips, concurrency):
+    audio_seconds = sum(len(c["samples"]) for c in clips) / jm.RATE
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda clip: run_isolated(capture, clip), clips))
+    elapsed = time.perf_counter() - start
+    return {"turns_per_s": len(clips) / elapsed, "audio_s_per_s": audio_seconds / elapsed,
+            "wall_s": elapsed}
+
+
+def run_benchmark(clip_dir, spot=True):
+    jm.load_all_models()
+    if not spot:
+        jm.command_spotter = None  # Alle ture gennem Whisper - til sammenligning med genvejen
+    capture = ClipCapture()
+    install_stand_ins(capture)
+    os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+
+    clips = load_clips(clip_dir)
+    print(f"[INFO] {len(clips)} klip indlæst fra {clip_dir}")
+
+    for clip in clips[:WARMUP_CLIPS]:
+        run_isolated(capture, clip)
+
+    records = []
+    for clip in clips:
+        record = run_isolated(capture, clip)
+        record["reference"] = clip.get("text", "")
+        record["expected_intent"] = clip.get("intent")
+        records.append(record)
+
+    result = summarize(records)
+    result["throughput"] = {str(c): measure_throughput(capture, clips, c) for c in CONCURRENCY_LEVELS}
+    result["peak_rss_bytes"] = peak_rss_bytes()
+    result["clips"] = len(clips)
+    result["models"] = dict(jm.MODEL_VERSIONS)
+    result["platform"] = {"python": platform.python_version(), "machine": platform.machine(),
+                          "cpus": os.cpu_count()}
+    return result
+
+
+# --- Baseline ----------------------------------------------------------------
+
+def compare(result, baseline):
+    """Returnerer en liste af regressioner i forhold til baseline"""
+    problems = []
+    for stage, stats in baseline.get("latency_ms", {}).items():
+        current = result["latency_ms"].get(stage)
+        if current and current["p95"] > stats["p95"] * LATENCY_TOLERANCE + LATENCY_SLACK_MS:
+            problems.append(f"{stage} p95 {current['p95']:.1f} ms > baseline {stats['p95']:.1f} ms")
+    for level, stats in baseline.get("throughput", {}).items():
+        current = result["throughput"].get(level)
+        if current and current["turns_per_s"] < stats["turns_per_s"] * THROUGHPUT_TOLERANCE:
+            problems.append(f"throughput@{level} {current['turns_per_s']:.2f}/s < baseline "
+                            f"{stats['turns_per_s']:.2f}/s")
+    if baseline.get("wer") is not None and result["wer"] is not None:
+        if result["wer"] > baseline["wer"] + WER_TOLERANCE:
+            problems.append(f"WER {result['wer']:.3f} > baseline {baseline['wer']:.3f}")
+    if baseline.get("intent_accuracy") is not None and result["intent_accuracy"] is not None:
+        if result["intent_accuracy"] < baseline["intent_accuracy"] - ACCURACY_TOLERANCE:
+            problems.append(f"intent accuracy {result['intent_accuracy']:.3f} < baseline "
+                            f"{baseline['intent_accuracy']:.3f}")
+    return problems
+
+
+def print_report(result):
+    print(f"\n{'stadie':<16} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for stage, stats in result["latency_ms"].items():
+        print(f"{stage:<16} {stats['p50']:>7.1f}ms {stats['p95']:>7.1f}ms {stats['p99']:>7.1f}ms")
+    if result["rtf"]:
+        print(f"\nRTF p50/p95: {result['rtf']['p50']:.3f} / {result['rtf']['p95']:.3f}")
+    for level, stats in result["throughput"].items():
+        print(f"Concurrency {level}: {stats['turns_per_s']:.2f} ture/s ({stats['audio_s_per_s']:.1f}x real-time)")
+    if result["wer"] is not None:
+        print(f"WER: {result['wer']:.3f}")
+    if result["intent_accuracy"] is not None:
+        print(f"Intent accuracy: {result['intent_accuracy']:.3f}")
+    if result.get("spot_rate"):
+        print(f"Kommando-genvej: {result['spot_rate']:.1%} af turene sprang Whisper over")
+    if result["peak_rss_bytes"]:
+        print(f"Peak RSS: {result['peak_rss_bytes'] / 1024 ** 2:.0f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark af Jarvis-pipelinen")
+    parser.add_argument("clip_dir", help="Mappe med WAV-klip og manifest.jsonl")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--output", default=RESULTS_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="Gem resultatet som ny baseline")
+    parser.add_argument("--no-spot", action="store_true", help="Slå kommando-genvejen fra (alle ture via Whisper)")
+    args = parser.parse_args()
+
+    result = run_benchmark(args.clip_dir, spot=not args.no_spot)
+    print_report(result)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"\n[INFO] Resultat gemt i {args.output}")
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"[INFO] Baseline opdateret: {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("[ADVARSEL] Ingen baseline - kør med --update-baseline for at gemme en.")
+        return
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    if not baseline.get("clips"):
+        print("[ADVARSEL] Baseline er ikke målt endnu - kør med --update-baseline på referencemaskinen.")
+        return
+    problems = compare(result, baseline)
+    if problems:
+        print("\n!!! REGRESSION i forhold til baseline !!!")
+        for problem in problems:
+            print(f"  - {problem}")
+        sys.exit(1)
+    print("[INFO] Ingen regressioner i forhold til baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# Benchmark af identifikations-latens i SpeakerRegistry ved 10, 100 og 1000 talere.
+# Bruger syntetiske embeddings, så den kan køres uden stemmeprøver:
+#   python bench/bench_speaker_registry.py
+
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from speaker_registry import SpeakerRegistry
+
+EMBEDDING_DIM = 48         # Samme som speaker_recognition.EMBEDDING_DIM
+SAMPLES_PER_SPEAKER = 3    # Som i data/voices
+SPEAKER_COUNTS = [10, 100, 1000]
+QUERIES = 500
+RANDOM_SEED = 42
+
+
+def bench(n_speakers, rng):
+    with tempfile.TemporaryDirectory() as tmp:
+        centers = rng.normal(size=(n_speakers, EMBEDDING_DIM)).astype(np.float32)
+
+        start = time.perf_counter()
+        registry = SpeakerRegistry(tmp, dim=EMBEDDING_DIM)
+        for i, center in enumerate(centers):
+            for _ in range(SAMPLES_PER_SPEAKER):
+                registry.enroll(f"speaker_{i}", center + 0.1 * rng.normal(size=EMBEDDING_DIM))
+        enroll_time = time.perf_counter() - start
+
+        registry.search(centers[0])  # Byg indeks (første opslag efter enrollment)
+        targets = rng.integers(0, n_speakers, size=QUERIES)
+        queries = centers[targets] + 0.1 * rng.normal(size=(QUERIES, EMBEDDING_DIM))
+
+        latencies = []
+        correct = 0
+        for target, query in zip(targets, queries):
+            t0 = time.perf_counter()
+            label, _ = registry.search(query, k=1)[0]
+            latencies.append(time.perf_counter() - t0)
+            correct += label == f"speaker_{target}"
+
+        t0 = time.perf_counter()
+        registry.remove_speaker("speaker_0")
+        remove_time = time.perf_counter() - t0
+
+        latencies = np.array(latencies) * 1000
+        return {
+            "speakers": n_speakers,
+            "rows": n_speakers * SAMPLES_PER_SPEAKER,
+            "enroll_ms_per_sample": enroll_time * 1000 / (n_speakers * SAMPLES_PER_SPEAKER),
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p95_ms": float(np.percentile(latencies, 95)),
+            "accuracy": correct / QUERIES,
+            "remove_ms": remove_time * 1000,
+        }
+
+
+def main():
+    rng = np.random.default_rng(RANDOM_SEED)
+    print(f"{'talere':>7} {'rækker':>7} {'enroll/prøve':>13} {'p50':>9} {'p95':>9} {'acc':>6} {'fjern':>9}")
+    for n in SPEAKER_COUNTS:
+        r = bench(n, rng)
+        print(f"{r['speakers']:>7} {r['rows']:>7} {r['enroll_ms_per_sample']:>10.2f} ms "
+              f"{r['p50_ms']:>6.3f} ms {r['p95_ms']:>6.3f} ms {r['accuracy']:>6.2f} {r['remove_ms']:>6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+# Mikrobenchmarks af tekst-hot-paths med skaleringskurver.
+#
+# Genererer syntetiske dansk-lignende korpora og tidsmåler hver funktion isoleret
+# (warm-up + gentagelser) ved voksende datastørrelse:
+#   predict_intent        - 10 .. 1000 intents
+#   find_best_response    - 10^2 .. 10^6 samtalepar (exact-pass og TF-IDF-pass hver for sig)
+#   nn_chatbot_response   - 10^2 .. 10^4 par (kræver Keras/TensorFlow)
+#   extract_website_name  - 10 .. 10^4 ord i input
+#
+#   python bench/microbench_text.py                 # fuld kørsel
+#   python bench/microbench_text.py --quick         # kun de små størrelser
+#
+# Resultatet skrives til bench/results/microbench_text.json, og hvis matplotlib er
+# installeret også som log-log kurver (microbench_<funktion>.png).
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tracemalloc
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(REPO_ROOT, "src"))
+os.chdir(REPO_ROOT)
+
+import jarvis_main as jm
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+
+RESULTS_PATH = os.path.join(BENCH_DIR, "results", "microbench_text.json")
+PAIR_SIZES = [10 ** 2, 10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6]
+INTENT_SIZES = [10, 100, 1000]
+NN_PAIR_SIZES = [10 ** 2, 10 ** 3, 10 ** 4]
+TEXT_LENGTHS = [10, 100, 1000, 10000]
+QUICK_LIMIT = 10 ** 4
+EXAMPLES_PER_INTENT = 20
+WARMUP = 2
+REPEATS = 20
+TIME_BUDGET_S = 10.0  # Max tid pr. (funktion, størrelse) - store korpora får færre gentagelser
+RANDOM_SEED = 42
+
+SYLLABLES = ["hej", "kl", "ok", "ken", "hvad", "er", "dag", "sø", "ning", "lys", "mor", "gen", "by",
+             "vejr", "tid", "kal", "en", "der", "sk", "ole", "bil", "hus", "ma", "d", "ø", "re",
+             "stor", "lil", "le", "fø", "dsel", "år", "sang", "mu", "sik", "not", "at"]
+
+
+def build_vocabulary(rng, size=5000):
+    """Rigtige ord fra træningsdata + syntetiske ord bygget af danske stavelser"""
+    words = set()
+    for path in ("nlu_commands.json", "conversation_pairs.json"):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            texts = ([ex for intent in data["intents"] for ex in intent["examples"]]
+                     if isinstance(data, dict) else [p["user"] + " " + p["jarvis"] for p in data])
+            for text in texts:
+                words.update(text.lower().split())
+        except (OSError, ValueError, KeyError):
+            pass
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 4))))
+    return sorted(words)
+
+
+def sentence(rng, vocab, min_words=3, max_words=8):
+    return " ".join(rng.choice(vocab) for _ in range(rng.randint(min_words, max_words)))
+
+
+def make_pairs(rng, vocab, n):
+    return [{"user": sentence(rng, vocab), "jarvis": sentence(rng, vocab)} for _ in range(n)]
+
+
+def make_intents(rng, vocab, n_intents):
+    X, y = [], []
+    for i in range(n_intents):
+        # Hver intent har et par kerneord, så klasserne kan adskilles
+        core = [rng.choice(vocab) for _ in range(3)]
+        for _ in range(EXAMPLES_PER_INTENT):
+            X.append(" ".join(core[:rng.randint(1, 3)]) + " " + sentence(rng, vocab, 1, 4))
+            y.append(f"intent_{i}")
+    return X, y
+
+
+def time_call(fn, *args):
+    """Warm-up og gentagelser; returnerer statistik i ms"""
+    for _ in range(WARMUP):
+        fn(*args)
+    times = []
+    budget_start = time.perf_counter()
+    while len(times) < REPEATS:
+        t0 = time.perf_counter()
+        fn(*args)
+        times.append((time.perf_counter() - t0) * 1000)
+        if time.perf_counter() - budget_start > TIME_BUDGET_S and len(times) >= 3:
+            break
+    tracemalloc.start()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    arr = np.array(times)
+    return {"p50_ms": float(np.percentile(arr, 50)), "p95_ms": float(np.percentile(arr, 95)),
+            "min_ms": float(arr.min()), "repeats": len(times), "peak_alloc_bytes": peak}
+
+
+def scaling_exponent(sizes, times):
+    """Hældning i log-log: ~0 = konstant, ~1 = lineær i datastørrelsen"""
+    if len(sizes) < 2:
+        return None
+    return float(np.polyfit(np.log(sizes), np.log(times), 1)[0])
+
+
+def bench_predict_intent(rng, vocab, sizes):
+    results = []
+    for n_intents in sizes:
+        X, y = make_intents(rng, vocab, n_intents)
+        vectorizer = TfidfVectorizer()
+        model = LogisticRegression(max_iter=1000).fit(vectorizer.fit_transform(X), y)
+        jm.nlu = (model, vectorizer)
+        query = rng.choice(X)
+        stats = time_call(jm.predict_intent, query)
+        stats["size"] = n_intents
+        stats["model_bytes"] = int(model.coef_.nbytes + model.intercept_.nbytes)
+        results.append(stats)
+        print(f"predict_intent        intents={n_intents:>8} p50={stats['p50_ms']:9.3f} ms")
+    return results
+
+
+def bench_find_best_response(rng, vocab, sizes):
+    exact, tfidf = [], []
+    for n in sizes:
+        pairs = make_pairs(rng, vocab, n)
+        # Exact-pass: et kendt spørgsmål ligger midt i korpus
+        hit = pairs[n // 2]["user"]
+        stats = time_call(jm.find_best_response, hit, pairs)
+        stats["size"] = n
+        exact.append(stats)
+        # TF-IDF-pass: en ukendt sætning, så substring-pass fejler og TF-IDF køres
+        miss = "zzq " + sentence(rng, vocab)
+        stats = time_call(jm.find_best_response, miss, pairs)
+        stats["size"] = n
+        tfidf.append(stats)
+        print(f"find_best_response    pairs={n:>10} exact p50={exact[-1]['p50_ms']:9.3f} ms "
+              f"tfidf p50={stats['p50_ms']:9.3f} ms")
+    return exact, tfidf
+
+
+def bench_nn_chatbot(rng, vocab, sizes):
+    if not (jm.KERAS_AVAILABLE and jm.TF_AVAILABLE):
+        print("[ADVARSEL] Keras/TensorFlow ikke tilgængelig - springer nn_chatbot_response over.")
+        return []
+    from tensorflow import keras
+    from sklearn.preprocessing import LabelEncoder
+    results = []
+    for n in sizes:
+        pairs = make_pairs(rng, vocab, n)
+        questions = [p["user"] for p in pairs]
+        answers = [f"svar_{i % 1000}" for i in range(n)]
+        tokenizer = keras.preprocessing.text.Tokenizer()
+        tokenizer.fit_on_texts(questions)
+        le = LabelEncoder().fit(answers)
+        model = keras.Sequential([
+            keras.Input(shape=(8,)),
+            keras.layers.Embedding(len(tokenizer.word_index) + 1, 64),
+            keras.layers.Bidirectional(keras.layers.LSTM(64, return_sequences=True)),
+            keras.layers.GlobalAveragePooling1D(),
+            keras.layers.Dense(128, activation="relu"),
+            keras.layers.Dense(len(le.classes_), activation="softmax"),
+        ])
+        jm.nn_chatbot = (model, tokenizer, le)
+        stats = time_call(jm.nn_chatbot_response, rng.choice(questions))
+        stats["size"] = n
+        stats["vocab"] = len(tokenizer.word_index) + 1
+        stats["model_bytes"] = int(sum(w.size * w.dtype.size for w in model.get_weights()))
+        results.append(stats)
+        print(f"nn_chatbot_response   pairs={n:>10} p50={stats['p50_ms']:9.3f} ms")
+    return results
+
+
+def bench_extract_website_name(rng, vocab, lengths):
+    results = []
+    for n_words in lengths:
+        # Værste tilfælde: intet domæne i teksten, så alle ord gennemløbes
+        text = " ".join(rng.choice(vocab) for _ in range(n_words))
+        stats = time_call(jm.extract_website_name, text)
+        stats["size"] = n_words
+        results.append(stats)
+        print(f"extract_website_name  words={n_words:>10} p50={stats['p50_ms']:9.3f} ms")
+    return results
+
+
+def plot(results, out_dir):
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("[INFO] matplotlib ikke installeret - ingen kurver.")
+        return
+    for name, series in results.items():
+        if not series:
+            continue
+        sizes = [s["size"] for s in series]
+        plt.figure(figsize=(6, 4))
+        plt.loglog(sizes, [s["p50_ms"] for s in series], marker="o", label="p50")
+        plt.loglog(sizes, [s["p95_ms"] for s in series], marker="x", linestyle="--", label="p95")
+        plt.title(name)
+        plt.xlabel("Størrelse")
+        plt.ylabel("ms")
+        plt.legend()
+        plt.tight_layout()
+        plt.savefig(os.path.join(out_dir, f"microbench_{name}.png"))
+        plt.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mikrobenchmarks af tekst-hot-paths")
+    parser.add_argument("--quick", action="store_true", help=f"Kun størrelser op til {QUICK_LIMIT}")
+    parser.add_argument("--output", default=RESULTS_PATH)
+    args = parser.parse_args()
+
+    limit = QUICK_LIMIT if args.quick else float("inf")
+    rng = random.Random(RANDOM_SEED)
+    vocab = build_vocabulary(rng)
+
+    results = {}
+    results["predict_intent"] = bench_predict_intent(rng, vocab, [n for n in INTENT_SIZES if n <= limit])
+    results["find_best_response_exact"], results["find_best_response_tfidf"] = bench_find_best_response(
+        rng, vocab, [n for n in PAIR_SIZES if n <= limit])
+    results["nn_chatbot_response"] = bench_nn_chatbot(rng, vocab, [n for n in NN_PAIR_SIZES if n <= limit])
+    results["extract_website_name"] = bench_extract_website_name(rng, vocab, TEXT_LENGTHS)
+
+    print(f"\n{'funktion':<28} {'skaleringseksponent':>20}")
+    summary = {}
+    for name, series in results.items():
+        exponent = scaling_exponent([s["size"] for s in series], [s["p50_ms"] for s in series])
+        summary[name] = exponent
+        if exponent is not None:
+            print(f"{name:<28} {exponent:>20.2f}")
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"results": results, "scaling_exponent": summary}, f, indent=2)
+    plot(results, os.path.dirname(args.output))
+    print(f"\n[INFO] Resultat gemt i {args.output}")
+
+
+if __name__ == "__main__":
+    main()
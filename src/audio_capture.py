@@ -0,0 +1,103 @@
+import collections
+import queue
+import threading
+
+import pyaudio
+
+from audio_io import AudioIO
+
+# Standardværdier - jarvis_main.py sender sine egne konstanter ind
+FORMAT = pyaudio.paInt16
+CHANNELS = 1
+RATE = 16000
+CHUNK = 1024
+PRE_ROLL_MS = 500  # Hvor meget lyd (ms) der gemmes fra før optagelsen starter
+
+
+class AudioCapture:
+    """Holder mikrofonen åben og gemmer en rullende pre-roll buffer.
+
+    En baggrundstråd læser chunks hele tiden. Mens der ikke optages, lægges de i
+    en ringbuffer (deque med maxlen), så starten af næste kommando ikke går tabt
+    under TTS eller pausen mellem ture. Når en ytring startes, bliver pre-roll
+    sat foran de nye chunks. Streamen ejes af den fælles AudioIO, som også
+    genåbner den hvis mikrofonen forsvinder.
+    """
+
+    def __init__(self, format=FORMAT, channels=CHANNELS, rate=RATE, chunk=CHUNK, pre_roll_ms=PRE_ROLL_MS,
+                 audio_io=None):
+        self.format = format
+        self.channels = channels
+        self.rate = rate
+        self.chunk = chunk
+        self.pre_roll_ms = pre_roll_ms
+        self.pre_roll = collections.deque(maxlen=self.chunks_for_ms(pre_roll_ms))
+        self.sample_width = pyaudio.get_sample_size(format)
+
+        self._owns_io = audio_io is None
+        self.audio_io = audio_io or AudioIO()
+        self._thread = None
+        self._running = False
+        self._recording = False
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+
+    def chunks_for_ms(self, ms):
+        """Antal hele chunks der dækker `ms` millisekunder (0 slår pre-roll fra)"""
+        if ms <= 0:
+            return 0
+        return max(1, int(round(ms / 1000 * self.rate / self.chunk)))
+
+    def start(self):
+        if self._running:
+            return
+        self.audio_io.open_input(format=self.format, channels=self.channels, rate=self.rate, chunk=self.chunk)
+        self._running = True
+        self._thread = threading.Thread(target=self._reader_loop, name="jarvis-capture", daemon=True)
+        self._thread.start()
+        print(f"[INFO] Lydoptagelse startet med {self.pre_roll_ms} ms pre-roll ({self.pre_roll.maxlen} chunks).")
+
+    def _reader_loop(self):
+        while self._running:
+            # AudioIO genåbner selv mikrofonen hvis enheden forsvinder eller skiftes
+            data = self.audio_io.read(self.chunk)
+            if data is None or not self._running:
+                break
+            with self._lock:
+                if self._recording:
+                    self._queue.put(data)
+                else:
+                    self.pre_roll.append(data)
+
+    def begin_utterance(self):
+        """Start en ny ytring og returner pre-roll chunks der skal sættes foran"""
+        if not self._running:
+            self.start()
+        with self._lock:
+            frames = list(self.pre_roll)
+            self.pre_roll.clear()
+            # Smid eventuelle rester fra en tidligere ytring væk
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self._recording = True
+        return frames
+
+    def read_chunk(self, timeout=1.0):
+        """Næste live chunk i den igangværende ytring (None ved timeout)"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def end_utterance(self):
+        """Afslut ytringen - nye chunks går igen i pre-roll bufferen"""
+        with self._lock:
+            self._recording = False
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        if self._owns_io:
+            self.audio_io.close()
@@ -0,0 +1,186 @@
+import threading
+import weakref
+import numpy as np
+
+SAMPLE_RATE = 16000
+FRAME_LENGTH = 400  # 25 ms analysevindue
+HOP_LENGTH = 160    # 10 ms mellem frames
+N_FFT = 512
+N_MELS = 40
+N_MFCC = 13
+FMIN, FMAX = 20.0, 7600.0
+AMIN = 1e-10  # Gulv før log, så stilhed ikke giver -inf
+INITIAL_FRAMES = 2048  # ~20 s; bufferne fordobles hvis en optagelse er længere
+
+
+def _hz_to_mel(hz):
+    return 2595.0 * np.log10(1.0 + np.asarray(hz, dtype=np.float64) / 700.0)
+
+
+def _mel_to_hz(mel):
+    return 700.0 * (10.0 ** (np.asarray(mel, dtype=np.float64) / 2595.0) - 1.0)
+
+
+def mel_filterbank(sr=SAMPLE_RATE, n_fft=N_FFT, n_mels=N_MELS, fmin=FMIN, fmax=FMAX):
+    """Trekantede mel-filtre (n_fft // 2 + 1, n_mels) - ganges direkte på power-spektret"""
+    bins = np.fft.rfftfreq(n_fft, 1.0 / sr)
+    edges = _mel_to_hz(np.linspace(_hz_to_mel(fmin), _hz_to_mel(fmax), n_mels + 2))
+    lower, center, upper = edges[:-2, None], edges[1:-1, None], edges[2:, None]
+    rising = (bins[None, :] - lower) / (center - lower)
+    falling = (upper - bins[None, :]) / (upper - center)
+    weights = np.maximum(0.0, np.minimum(rising, falling))
+    weights *= (2.0 / (upper - lower))  # Samme energi pr. filter uanset bredde
+    return weights.T.astype(np.float32)
+
+
+def dct_matrix(n_in=N_MELS, n_out=N_MELS):
+    """Ortonormal DCT-II som matrix (n_in, n_out) - MFCC = log-mel @ matrix"""
+    n = np.arange(n_in)[:, None]
+    k = np.arange(n_out)[None, :]
+    basis = np.cos(np.pi / n_in * (n + 0.5) * k) * np.sqrt(2.0 / n_in)
+    basis[:, 0] /= np.sqrt(2.0)
+    return basis.astype(np.float32)
+
+
+# Konstante matricer beregnes én gang pr. proces
+WINDOW = np.hanning(FRAME_LENGTH + 1)[:-1].astype(np.float32)
+MEL_BASIS = mel_filterbank()
+DCT = dct_matrix()
+
+
+class Features:
+    """Frame-features for én ytring. Alle arrays er views (T, ...) ind i strømmens buffere.
+
+    power:     STFT power-spektrum (T, N_FFT // 2 + 1)
+    logmel:    log-mel i dB (T, N_MELS)
+    mfcc:      alle N_MELS cepstrale koefficienter (T, N_MELS) - brug mfcc[:, :n]
+    amplitude: gennemsnitlig |sample| (int16-skala) i hver frames hop - samme mål som VAD'en
+    rms_db:    frame-energi i dB
+    """
+
+    __slots__ = ("power", "logmel", "mfcc", "amplitude", "rms_db")
+
+    def __init__(self, power, logmel, mfcc, amplitude, rms_db):
+        self.power = power
+        self.logmel = logmel
+        self.mfcc = mfcc
+        self.amplitude = amplitude
+        self.rms_db = rms_db
+
+    def __len__(self):
+        return len(self.rms_db)
+
+    def __getitem__(self, index):
+        return Features(self.power[index], self.logmel[index], self.mfcc[index], self.amplitude[index],
+                        self.rms_db[index])
+
+    def speech(self, top_db=30):
+        """Fra første til sidste frame inden for top_db af den kraftigste (pre-roll og endpoint-stilhed væk)"""
+        if not len(self):
+            return self
+        loud = np.flatnonzero(self.rms_db > self.rms_db.max() - top_db)
+        return self[loud[0]:loud[-1] + 1]
+
+    @property
+    def seconds(self):
+        return len(self) * HOP_LENGTH / SAMPLE_RATE
+
+
+class FeatureStream:
+    """Beregner features inkrementelt efterhånden som lyden optages.
+
+    `push()` tager en chunk (int16-bytes eller float32), regner kun de frames
+    der er blevet komplette (vektoriseret over alle nye frames: vindue, rfft,
+    mel, log og DCT i ét pass) og returnerer dem som views. Hele ytringens
+    features hentes med `features()` uden kopiering.
+    """
+
+    def __init__(self, capacity=INITIAL_FRAMES):
+        self._pending = np.zeros(0, dtype=np.float32)  # Samples der endnu ikke har dannet en hel frame
+        self._n = 0
+        self._alloc(capacity)
+
+    def _alloc(self, capacity):
+        old = getattr(self, "_arrays", None)
+        shapes = {"power": N_FFT // 2 + 1, "logmel": N_MELS, "mfcc": N_MELS, "amplitude": None, "rms_db": None}
+        self._arrays = {name: np.empty((capacity,) if dim is None else (capacity, dim), dtype=np.float32)
+                        for name, dim in shapes.items()}
+        if old is not None:
+            for name, array in old.items():
+                self._arrays[name][:self._n] = array[:self._n]
+
+    def push(self, chunk):
+        if isinstance(chunk, (bytes, bytearray, memoryview)):
+            samples = np.frombuffer(chunk, dtype=np.int16).astype(np.float32) / 32768.0
+        else:
+            samples = np.asarray(chunk, dtype=np.float32)
+        buffer = np.concatenate([self._pending, samples]) if len(self._pending) else samples
+        count = 0 if len(buffer) < FRAME_LENGTH else (len(buffer) - FRAME_LENGTH) // HOP_LENGTH + 1
+        start = self._n
+        if count:
+            frames = np.lib.stride_tricks.sliding_window_view(buffer, FRAME_LENGTH)[::HOP_LENGTH][:count]
+            self._compute(frames)
+        self._pending = buffer[count * HOP_LENGTH:]
+        return self._view(start, self._n)
+
+    def _compute(self, frames):
+        count = len(frames)
+        if self._n + count > len(self._arrays["rms_db"]):
+            self._alloc(max(2 * len(self._arrays["rms_db"]), self._n + count))
+        end = self._n + count
+        spectrum = np.fft.rfft(frames * WINDOW, n=N_FFT)
+        power = self._arrays["power"][self._n:end]
+        np.square(np.abs(spectrum), out=power, casting="same_kind")
+        logmel = self._arrays["logmel"][self._n:end]
+        np.matmul(power, MEL_BASIS, out=logmel)
+        np.log10(np.maximum(logmel, AMIN, out=logmel), out=logmel)
+        logmel *= 10.0
+        np.matmul(logmel, DCT, out=self._arrays["mfcc"][self._n:end])
+        self._arrays["amplitude"][self._n:end] = np.abs(frames[:, :HOP_LENGTH]).mean(axis=1) * 32768.0
+        self._arrays["rms_db"][self._n:end] = 10.0 * np.log10(np.maximum(np.mean(frames ** 2, axis=1), AMIN))
+        self._n = end
+
+    def _view(self, start, end):
+        a = self._arrays
+        return Features(a["power"][start:end], a["logmel"][start:end], a["mfcc"][start:end],
+                        a["amplitude"][start:end], a["rms_db"][start:end])
+
+    def features(self):
+        return self._view(0, self._n)
+
+
+def compute_features(audio):
+    """Features for en hel buffer (16 kHz float32) i ét kald"""
+    stream = FeatureStream(capacity=max(1, (len(audio) - FRAME_LENGTH) // HOP_LENGTH + 1))
+    stream.push(audio)
+    return stream.features()
+
+
+# Features knyttet til de PCM-buffere de er beregnet fra. Nøglen er bufferens id, og
+# posten fjernes når bufferen frigives, så et genbrugt id aldrig rammer gamle features.
+_published = {}
+_published_lock = threading.Lock()
+
+
+def _forget(key):
+    with _published_lock:
+        _published.pop(key, None)
+
+
+def publish(audio, features):
+    """Knyt færdige features (fx fra optagelsens FeatureStream) til bufferen - ingen kopi"""
+    key = id(audio)
+    with _published_lock:
+        _published[key] = (weakref.ref(audio, lambda _ref, key=key: _forget(key)), features)
+    return features
+
+
+def features_for(audio):
+    """Features for en PCM-buffer: de publicerede hvis optageren har dem, ellers beregnes de én gang"""
+    if not isinstance(audio, np.ndarray):
+        return compute_features(np.asarray(audio, dtype=np.float32))
+    with _published_lock:
+        entry = _published.get(id(audio))
+    if entry is not None and entry[0]() is audio:
+        return entry[1]
+    return publish(audio, compute_features(np.asarray(audio, dtype=np.float32)))
@@ -0,0 +1,230 @@
+import time
+import queue
+import asyncio
+import threading
+
+import numpy as np
+import pyaudio
+
+FORMAT = pyaudio.paInt16
+CHANNELS = 1
+OUTPUT_RATE = 24000  # gTTS leverer 24 kHz - andet resamples før afspilning
+OUTPUT_CHUNK = 1024
+PLAYBACK_BUFFER_SECONDS = 2.0  # Højst så meget lyd i kø til højttaleren; play() venter når den er fuld
+RECOVER_BACKOFF = (0.5, 1.0, 2.0, 5.0)  # Sekunder mellem forsøg på at genåbne lydenhederne
+
+
+class AudioIO:
+    """Én PortAudio-kontekst for hele processen med vedvarende input- og output-streams.
+
+    Streams åbnes én gang og genbruges hver tur. Afspilning går gennem en
+    begrænset kø af chunks, som en baggrundstråd skriver til højttaleren - er
+    køen fuld, venter `play()` (backpressure) i stedet for at buffere et helt
+    svar i hukommelsen. Fejler en stream (fx når en USB-mikrofon tages ud),
+    genstartes PortAudio så den aktuelle enhedsliste læses igen, og de
+    streams der var åbne genåbnes med backoff, indtil en enhed er
+    tilgængelig. `read_async()` og `play_async()` kører på den executor der
+    gives med, så de ikke blokerer event-loopet.
+    """
+
+    def __init__(self, output_rate=OUTPUT_RATE, output_chunk=OUTPUT_CHUNK,
+                 buffer_seconds=PLAYBACK_BUFFER_SECONDS, executor=None):
+        self.output_rate = output_rate
+        self.output_chunk = output_chunk
+        self.executor = executor  # None = event-loopets standard-executor
+        self.generation = 0  # Tælles op ved hver genstart af PortAudio
+        self._pa = None
+        self._input = None
+        self._input_args = None
+        self._output = None
+        self._output_wanted = False  # Output er åbnet før og skal genåbnes efter en fejl
+        self._lock = threading.RLock()
+        # Holdes under stream.read(), så recover() ikke lukker input midt i en læsning.
+        # Rækkefølge: _read_lock før _lock
+        self._read_lock = threading.Lock()
+        self._closed = False
+        self._playback = queue.Queue(maxsize=max(1, int(buffer_seconds * output_rate / output_chunk)))
+        self._player = None
+
+    # --- PortAudio og streams ---
+
+    def _ensure_pa(self):
+        if self._pa is None:
+            self._pa = pyaudio.PyAudio()
+        return self._pa
+
+    def open_input(self, format=FORMAT, channels=CHANNELS, rate=16000, chunk=1024):
+        """Mikrofon-stream på den fælles kontekst (genbruges og genåbnes ved enhedsskift)"""
+        with self._lock:
+            self._input_args = {"format": format, "channels": channels, "rate": rate, "frames_per_buffer": chunk}
+            if self._input is None:
+                self._input = self._ensure_pa().open(input=True, **self._input_args)
+            return self._input, self.generation
+
+    def _open_output(self):
+        with self._lock:
+            if self._output is None:
+                self._output = self._ensure_pa().open(format=FORMAT, channels=CHANNELS, rate=self.output_rate,
+                                                      output=True, frames_per_buffer=self.output_chunk)
+                self._output_wanted = True
+            return self._output, self.generation
+
+    def _close_streams(self):
+        for stream in (self._input, self._output):
+            if stream is not None:
+                try:
+                    stream.stop_stream()
+                    stream.close()
+                except Exception:
+                    pass
+        self._input = self._output = None
+
+    def recover(self, failed_generation):
+        """Genstart PortAudio efter en stream-fejl. Returnerer når streams er åbne igen (eller lukket).
+
+        Kun de streams der var åbnet før fejlen genåbnes - en maskine uden
+        højttaler venter altså ikke på en output-enhed. Har en anden tråd
+        allerede genstartet efter samme fejl (generationen er talt op),
+        genbruges dens streams.
+        """
+        attempt = 0
+        while not self._closed:
+            # Input lukkes først når ingen læser fra den
+            with self._read_lock, self._lock:
+                if self.generation != failed_generation:
+                    return True
+                self._close_streams()
+                if self._pa is not None:
+                    try:
+                        self._pa.terminate()
+                    except Exception:
+                        pass
+                    self._pa = None
+                try:
+                    if self._input_args is not None:
+                        self._input = self._ensure_pa().open(input=True, **self._input_args)
+                    if self._output_wanted:
+                        self._open_output()
+                    self.generation += 1
+                    print(f"[INFO] Lydenheder genåbnet (generation {self.generation}).")
+                    return True
+                except Exception as e:
+                    self._close_streams()
+                    delay = RECOVER_BACKOFF[min(attempt, len(RECOVER_BACKOFF) - 1)]
+                    if attempt == 0:
+                        print(f"[ADVARSEL] Ingen brugbar lydenhed ({e}) - prøver igen.")
+            attempt += 1
+            time.sleep(delay)
+        return False
+
+    def input_stream(self):
+        with self._lock:
+            return self._input, self.generation
+
+    # --- Optagelse ---
+
+    def read(self, frames):
+        """Næste `frames` samples fra mikrofonen (bytes). Genåbner ved fejl; None når AudioIO er lukket"""
+        while not self._closed:
+            with self._read_lock:
+                stream, generation = self.input_stream()
+                if stream is None:
+                    raise RuntimeError("Input-streamen er ikke åbnet (kald open_input først)")
+                try:
+                    return stream.read(frames, exception_on_overflow=False)
+                except Exception as e:
+                    error = e
+            if self._closed:
+                break
+            print(f"[FEJL] Kunne ikke læse fra mikrofonen: {error}")
+            # Enheden er væk eller skiftet - vent på at en mikrofon er genåbnet
+            if not self.recover(generation):
+                break
+        return None
+
+    async def read_async(self, frames):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.read, frames)
+
+    # --- Afspilning ---
+
+    def _start_player(self):
+        if self._player is None:
+            self._player = threading.Thread(target=self._player_loop, name="jarvis-playback", daemon=True)
+            self._player.start()
+
+    def _player_loop(self):
+        while True:
+            item = self._playback.get()
+            if item is None:
+                return
+            data, done = item
+            while data:
+                stream, generation = self._open_output()
+                try:
+                    stream.write(data)
+                    break
+                except Exception as e:
+                    if self._closed:
+                        return
+                    print(f"[ADVARSEL] Afspilning fejlede: {e}")
+                    if not self.recover(generation):
+                        return
+            if done is not None:
+                done.set()
+
+    def play(self, samples, rate=None, wait=False):
+        """Læg float32 PCM i afspilningskøen. Blokerer kun når køen er fuld (eller med wait=True)"""
+        if self._closed:
+            return
+        samples = np.asarray(samples, dtype=np.float32)
+        rate = rate or self.output_rate
+        if rate != self.output_rate:
+            samples = resample(samples, rate, self.output_rate)
+        pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+        self._start_player()
+        step = self.output_chunk * 2  # int16
+        done = threading.Event()
+        chunks = [pcm[i:i + step] for i in range(0, len(pcm), step)] or [b""]
+        for i, chunk in enumerate(chunks):
+            self._playback.put((chunk, done if i == len(chunks) - 1 else None))
+        if wait:
+            done.wait()
+        return done
+
+    async def play_async(self, samples, rate=None, wait=False):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, lambda: self.play(samples, rate, wait))
+
+    def stop_playback(self):
+        """Smid ventende lyd væk (fx når brugeren afbryder)"""
+        while True:
+            try:
+                item = self._playback.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None and item[1] is not None:
+                item[1].set()
+
+    def close(self):
+        """Luk streams og PortAudio - én gang, ved nedlukning"""
+        self._closed = True
+        self.stop_playback()
+        if self._player is not None:
+            self._playback.put(None)
+            self._player.join(timeout=2.0)
+            self._player = None
+        with self._read_lock, self._lock:
+            self._close_streams()
+            if self._pa is not None:
+                self._pa.terminate()
+                self._pa = None
+
+
+def resample(samples, orig_rate, target_rate):
+    """Lineær resampling - godt nok til TTS-tale, og uden ekstra afhængigheder"""
+    if orig_rate == target_rate or not len(samples):
+        return samples
+    n = int(round(len(samples) * target_rate / orig_rate))
+    positions = np.arange(n) * (orig_rate / target_rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
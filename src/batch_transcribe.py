@@ -0,0 +1,253 @@
+# Offline transskription af en mappe med lydfiler (stemmenoter, testklip) til JSONL
+#
+#   python src/batch_transcribe.py data/voice_notes --output data/transcripts.jsonl
+#   python src/batch_transcribe.py bench/clips --workers 2 --batch-size 16 --max-buffered-minutes 20
+#
+# Filerne afkodes samtidigt af faster-whispers BatchedInferencePipeline (VAD-stykker af
+# hver fil afkodes i batches). Antal workers og mængden af indlæst lyd er begrænset, så
+# hukommelsesforbruget ikke vokser med arkivet. Output-filen er samtidig checkpoint: hver
+# færdig fil skrives som én linje med det samme, og en afbrudt kørsel fortsætter hvor den
+# slap ved at springe filer over der allerede står i output-filen (sti, størrelse og mtime).
+
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import threading
+import concurrent.futures
+
+import numpy as np
+
+RATE = 16000
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".flac", ".ogg", ".m4a", ".webm")
+DEFAULT_OUTPUT = os.path.join("data", "transcripts.jsonl")
+DEFAULT_WORKERS = max(1, min(4, (os.cpu_count() or 1) // 2))
+DEFAULT_BATCH_SIZE = 8
+DEFAULT_BEAM_SIZE = 5
+MAX_BUFFERED_MINUTES = 30  # Lyd indlæst på én gang (30 min float32 @ 16 kHz ~ 115 MB)
+
+
+def find_audio_files(root, extensions=AUDIO_EXTENSIONS):
+    """Alle lydfiler under root, sorteret så rækkefølgen er den samme ved genoptagelse"""
+    if os.path.isfile(root):
+        return [root]
+    files = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith(extensions):
+                files.append(os.path.join(dirpath, name))
+    return files
+
+
+def file_key(path):
+    """Identificerer en fil i checkpointet - en ændret fil transskriberes igen"""
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}:{stat.st_size}:{int(stat.st_mtime)}"
+
+
+def load_checkpoint(output):
+    """Nøglerne for filer der allerede er transskriberet uden fejl"""
+    done = set()
+    if not os.path.exists(output):
+        return done
+    with open(output, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Halv linje fra en afbrudt kørsel
+            if "error" not in record and record.get("key"):
+                done.add(record["key"])
+    return done
+
+
+def audio_duration(path):
+    """Varighed i sekunder uden at indlæse lyden (bruges til hukommelsesbudgettet)"""
+    try:
+        import soundfile as sf
+        return sf.info(path).duration
+    except Exception:
+        import librosa
+        return librosa.get_duration(path=path)
+
+
+def load_audio(path):
+    import librosa
+    samples, _ = librosa.load(path, sr=RATE, mono=True)
+    return samples.astype(np.float32, copy=False)
+
+
+def load_pipeline(model_name="small", device="cpu", compute_type="int8", workers=DEFAULT_WORKERS,
+                  cpu_threads=0):
+    """WhisperModel med én CTranslate2-worker pr. samtidig fil, pakket i BatchedInferencePipeline"""
+    from faster_whisper import WhisperModel, BatchedInferencePipeline
+    if not cpu_threads:
+        cpu_threads = max(1, (os.cpu_count() or 1) // workers)
+    model = WhisperModel(model_name, device=device, compute_type=compute_type,
+                         cpu_threads=cpu_threads, num_workers=workers)
+    return BatchedInferencePipeline(model=model)
+
+
+def transcribe_file(pipeline, path, audio, language="da", beam_size=DEFAULT_BEAM_SIZE,
+                    batch_size=DEFAULT_BATCH_SIZE):
+    """Én fil -> record med tekst, segmenter og confidences"""
+    start = time.perf_counter()
+    segments, info = pipeline.transcribe(audio, language=language, beam_size=beam_size, batch_size=batch_size)
+    segments = [{
+        "start": round(segment.start, 2),
+        "end": round(segment.end, 2),
+        "text": segment.text.strip(),
+        "avg_logprob": round(segment.avg_logprob, 4),
+        "no_speech_prob": round(segment.no_speech_prob, 4),
+        "compression_ratio": round(segment.compression_ratio, 3),
+    } for segment in segments]
+    elapsed = time.perf_counter() - start
+    duration = len(audio) / RATE
+
+    # Samme mål som i jarvis_main.decode: log-sandsynlighed vægtet med segmentlængde
+    durations = [max(s["end"] - s["start"], 1e-3) for s in segments]
+    logprob = (sum(s["avg_logprob"] * d for s, d in zip(segments, durations)) / sum(durations)
+               if segments else None)
+    return {
+        "path": path,
+        "duration": round(duration, 2),
+        "text": " ".join(s["text"] for s in segments).strip(),
+        "language": info.language,
+        "language_probability": round(info.language_probability, 4),
+        "avg_logprob": round(logprob, 4) if logprob is not None else None,
+        "confidence": round(math.exp(logprob), 4) if logprob is not None else None,
+        "segments": segments,
+        "elapsed": round(elapsed, 3),
+        "rtf": round(elapsed / duration, 4) if duration else None,
+    }
+
+
+class AudioBudget:
+    """Begrænser mængden af lyd (i sekunder) der er indlæst i hukommelsen på én gang.
+
+    En fil der alene er større end budgettet får lov, når intet andet er indlæst,
+    så én lang optagelse ikke blokerer kørslen.
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.in_use = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self, seconds):
+        with self._cond:
+            self._cond.wait_for(lambda: self.in_use == 0 or self.in_use + seconds <= self.seconds)
+            self.in_use += seconds
+
+    def release(self, seconds):
+        with self._cond:
+            self.in_use = max(0.0, self.in_use - seconds)
+            self._cond.notify_all()
+
+
+def run(files, output, pipeline, workers=DEFAULT_WORKERS, budget_seconds=MAX_BUFFERED_MINUTES * 60,
+        **options):
+    """Transskribér filerne med højst `workers` samtidige filer og skriv hver record straks"""
+    budget = AudioBudget(budget_seconds)
+    totals = {"files": 0, "failed": 0, "audio": 0.0}
+
+    def work(path, key, seconds):
+        try:
+            audio = load_audio(path)
+            record = transcribe_file(pipeline, path, audio, **options)
+        except Exception as e:
+            record = {"path": path, "error": str(e)}
+        finally:
+            budget.release(seconds)
+        record["key"] = key
+        return record
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    start = time.perf_counter()
+    with open(output, "a", encoding="utf-8") as out, \
+            concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+
+        def drain(block):
+            nonlocal pending
+            if not pending:
+                return
+            done, pending = concurrent.futures.wait(
+                pending, timeout=None if block else 0, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                record = future.result()
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                os.fsync(out.fileno())  # Checkpoint: linjen er på disken før den tælles som færdig
+                totals["files"] += 1
+                if "error" in record:
+                    totals["failed"] += 1
+                    print(f"[FEJL] {record['path']}: {record['error']}")
+                    continue
+                totals["audio"] += record["duration"]
+                wall = time.perf_counter() - start
+                print(f"[INFO] {totals['files']}/{len(files)} {record['path']} ({record['duration']:.1f}s lyd, "
+                      f"rtf {record['rtf']:.2f}) - samlet {totals['audio'] / wall:.1f}x realtid")
+
+        for path, key in files:
+            try:
+                seconds = audio_duration(path)
+            except Exception as e:
+                print(f"[ADVARSEL] Kan ikke læse varigheden af {path}: {e}")
+                seconds = 0.0
+            # Højst én fil i kø pr. worker ud over dem der afkodes, så budgettet og listen følges ad
+            while len(pending) >= workers * 2:
+                drain(block=True)
+            budget.acquire(seconds)
+            pending.add(pool.submit(work, path, key, seconds))
+            drain(block=False)
+        while pending:
+            drain(block=True)
+
+    totals["wall"] = time.perf_counter() - start
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transskribér en mappe med lydfiler til JSONL")
+    parser.add_argument("input", help="Mappe (gennemløbes rekursivt) eller én lydfil")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="JSONL-output og checkpoint")
+    parser.add_argument("--model", default="small")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--compute-type", default="int8")
+    parser.add_argument("--language", default="da")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Filer der afkodes samtidigt")
+    parser.add_argument("--cpu-threads", type=int, default=0, help="Tråde pr. worker (0 = kerner / workers)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="VAD-stykker pr. batch")
+    parser.add_argument("--beam-size", type=int, default=DEFAULT_BEAM_SIZE)
+    parser.add_argument("--max-buffered-minutes", type=float, default=MAX_BUFFERED_MINUTES,
+                        help="Maks. minutter lyd indlæst i hukommelsen på én gang")
+    parser.add_argument("--restart", action="store_true", help="Ignorér checkpointet og start forfra")
+    args = parser.parse_args()
+
+    files = find_audio_files(args.input)
+    if args.restart and os.path.exists(args.output):
+        os.remove(args.output)
+    done = load_checkpoint(args.output)
+    todo = [(path, key) for path, key in ((path, file_key(path)) for path in files) if key not in done]
+    print(f"[INFO] {len(files)} lydfiler fundet, {len(files) - len(todo)} allerede transskriberet, "
+          f"{len(todo)} tilbage.")
+    if not todo:
+        return
+
+    pipeline = load_pipeline(args.model, args.device, args.compute_type, args.workers, args.cpu_threads)
+    totals = run(todo, args.output, pipeline, workers=args.workers,
+                 budget_seconds=args.max_buffered_minutes * 60, language=args.language,
+                 beam_size=args.beam_size, batch_size=args.batch_size)
+    speed = totals["audio"] / totals["wall"] if totals["wall"] else 0.0
+    print(f"[RESULTAT] {totals['files']} filer ({totals['failed']} fejlede), {totals['audio'] / 60:.1f} min lyd "
+          f"på {totals['wall']:.1f}s - {speed:.1f}x realtid. Output: {args.output}")
+    if totals["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# Evaluering af NN-chatbotten på testsættet
+#
+#   python src/chatbot_eval.py                 # samme split som nn_chatbot_trainer.py
+#   python src/chatbot_eval.py --examples 20 --json models/nn_chatbot_eval.json
+#
+# Hele testsættet forudsiges i batches med ét predict-kald. Token-id'er oversættes
+# tilbage til ord via et forudberegnet id->ord array, så afkodning er et enkelt
+# array-opslag pr. token i stedet for en gennemgang af hele vokabularet.
+
+import json
+import argparse
+import numpy as np
+
+TOP_K = (1, 3, 5)
+CALIBRATION_BINS = 10
+PREDICT_BATCH_SIZE = 256
+
+
+def id_to_word_table(tokenizer):
+    """Array hvor table[id] er ordet for token-id'et ('' for padding og ukendte id'er)"""
+    table = np.full(max(tokenizer.word_index.values(), default=0) + 1, "", dtype=object)
+    for word, idx in tokenizer.word_index.items():
+        table[idx] = word
+    return table
+
+
+def decode_sequences(sequences, table):
+    """Paddede token-sekvenser (n, længde) -> tekster"""
+    sequences = np.asarray(sequences)
+    ids = np.where(sequences < len(table), sequences, 0)
+    words = table[ids]
+    return [" ".join(row[seq != 0]) for row, seq in zip(words, sequences)]
+
+
+def top_k_accuracy(probs, y_true, ks=TOP_K):
+    """Andel hvor det rigtige svar er blandt de k mest sandsynlige"""
+    result = {}
+    true_probs = probs[np.arange(len(y_true)), y_true]
+    # Rang = antal klasser med strengt højere sandsynlighed end den rigtige
+    rank = (probs > true_probs[:, None]).sum(axis=1)
+    for k in ks:
+        if k <= probs.shape[1]:
+            result[f"top{k}"] = float(np.mean(rank < k))
+    return result
+
+
+def confusion_summary(y_true, y_pred, labels, limit=10):
+    """De hyppigste forvekslinger og de svar der oftest rammes forkert (uden en fuld C x C matrix)"""
+    wrong = y_true != y_pred
+    pairs, counts = np.unique(np.stack([y_true[wrong], y_pred[wrong]], axis=1), axis=0, return_counts=True) \
+        if wrong.any() else (np.empty((0, 2), dtype=int), np.empty(0, dtype=int))
+    order = np.argsort(-counts, kind="stable")[:limit]
+    confused = [{"true": str(labels[t]), "predicted": str(labels[p]), "count": int(c)}
+                for (t, p), c in zip(pairs[order], counts[order])]
+
+    support = np.bincount(y_true, minlength=len(labels))
+    errors = np.bincount(y_true[wrong], minlength=len(labels))
+    worst = np.argsort(-errors, kind="stable")[:limit]
+    per_class = [{"answer": str(labels[i]), "errors": int(errors[i]), "support": int(support[i])}
+                 for i in worst if errors[i]]
+    return {"errors": int(wrong.sum()), "most_confused": confused, "worst_answers": per_class}
+
+
+def calibration(probs, y_true, bins=CALIBRATION_BINS):
+    """Reliability-tabel og expected calibration error (ECE) for modellens top-1 confidence"""
+    confidence = probs.max(axis=1)
+    correct = probs.argmax(axis=1) == y_true
+    edges = np.linspace(0.0, 1.0, bins + 1)
+    which = np.clip(np.digitize(confidence, edges[1:-1]), 0, bins - 1)
+    count = np.bincount(which, minlength=bins)
+    conf_sum = np.bincount(which, weights=confidence, minlength=bins)
+    acc_sum = np.bincount(which, weights=correct, minlength=bins)
+    table = []
+    ece = 0.0
+    for b in range(bins):
+        if not count[b]:
+            continue
+        mean_conf = conf_sum[b] / count[b]
+        accuracy = acc_sum[b] / count[b]
+        ece += count[b] / len(y_true) * abs(accuracy - mean_conf)
+        table.append({"bin": f"{edges[b]:.1f}-{edges[b + 1]:.1f}", "count": int(count[b]),
+                      "confidence": round(float(mean_conf), 3), "accuracy": round(float(accuracy), 3)})
+    return {"ece": round(float(ece), 4), "mean_confidence": round(float(confidence.mean()), 4),
+            "bins": table}
+
+
+def evaluate(model, X_test, y_test, le, tokenizer=None, examples=5, batch_size=PREDICT_BATCH_SIZE):
+    """Samlet rapport: accuracy, top-k, forvekslinger, kalibrering og eksempler"""
+    y_test = np.asarray(y_test)
+    probs = model.predict(X_test, batch_size=batch_size, verbose=0)
+    y_pred = probs.argmax(axis=1)
+    report = {
+        "samples": int(len(y_test)),
+        "accuracy": float(np.mean(y_pred == y_test)),
+        **top_k_accuracy(probs, y_test),
+        "confusion": confusion_summary(y_test, y_pred, le.classes_),
+        "calibration": calibration(probs, y_test),
+    }
+    if tokenizer is not None and examples:
+        table = id_to_word_table(tokenizer)
+        n = min(examples, len(y_test))
+        texts = decode_sequences(X_test[:n], table)
+        report["examples"] = [{
+            "input": texts[i],
+            "predicted": str(le.classes_[y_pred[i]]),
+            "confidence": round(float(probs[i, y_pred[i]]), 3),
+            "true": str(le.classes_[y_test[i]]),
+        } for i in range(n)]
+    return report
+
+
+def print_report(report):
+    topk = ", ".join(f"{k} {report[k]:.3f}" for k in ("top1", "top3", "top5") if k in report)
+    print(f"[RESULTAT] {report['samples']} testeksempler - accuracy {report['accuracy']:.4f} ({topk})")
+    cal = report["calibration"]
+    print(f"[RESULTAT] Kalibrering: ECE {cal['ece']:.4f}, gennemsnitlig confidence {cal['mean_confidence']:.3f}")
+    for row in cal["bins"]:
+        print(f"   confidence {row['bin']}: {row['count']:>5} eksempler, "
+              f"confidence {row['confidence']:.3f}, accuracy {row['accuracy']:.3f}")
+    confusion = report["confusion"]
+    if confusion["most_confused"]:
+        print(f"[RESULTAT] Hyppigste forvekslinger ({confusion['errors']} fejl i alt):")
+        for row in confusion["most_confused"]:
+            print(f"   {row['count']:>4}x  '{row['true']}' -> '{row['predicted']}'")
+    for row in report.get("examples", []):
+        print(f"Input: '{row['input']}'")
+        print(f"Predicted answer: '{row['predicted']}'")
+        print(f"Confidence: {row['confidence']:.2f}")
+        print(f"True answer: '{row['true']}'")
+        print("-" * 40)
+
+
+def main():
+    import pickle
+    from tensorflow import keras
+    from sklearn.model_selection import train_test_split
+    from nn_chatbot_trainer import DATA_PATH, VALIDATION_SPLIT, RANDOM_SEED
+
+    parser = argparse.ArgumentParser(description="Evaluer NN chatbotten på testsættet")
+    parser.add_argument("--data", default=DATA_PATH)
+    parser.add_argument("--model", default="models/nn_chatbot.h5")
+    parser.add_argument("--examples", type=int, default=5)
+    parser.add_argument("--json", default=None, help="Gem rapporten som JSON")
+    args = parser.parse_args()
+
+    model = keras.models.load_model(args.model)
+    with open("models/nn_tokenizer.pkl", "rb") as f:
+        tokenizer = pickle.load(f)
+    with open("models/nn_labelencoder.pkl", "rb") as f:
+        le = pickle.load(f)
+    with open(args.data, "r", encoding="utf-8") as f:
+        pairs = json.load(f)
+
+    # Samme split som træneren (samme data og seed)
+    X = keras.preprocessing.sequence.pad_sequences(
+        tokenizer.texts_to_sequences([pair["user"] for pair in pairs]),
+        maxlen=model.input_shape[1], padding="post")
+    y = le.transform([pair["jarvis"] for pair in pairs])
+    _, test_idx = train_test_split(np.arange(len(X)), test_size=VALIDATION_SPLIT, random_state=RANDOM_SEED)
+
+    report = evaluate(model, X[test_idx], y[test_idx], le, tokenizer, examples=args.examples)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"[INFO] Rapport gemt i {args.json}")
+
+
+if __name__ == "__main__":
+    main()
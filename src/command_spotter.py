@@ -0,0 +1,211 @@
+# Genvej for korte kommandoer: genkend kommandoen direkte fra lyden uden Whisper og NLU
+#
+#   python src/command_spotter.py bench/clips                      # træn på optagede klip
+#   python src/command_spotter.py bench/clips data/kws_clips --intents klokken dato vejr youtube noter
+#
+# Klip-mapperne har samme manifest.jsonl som benchmarket ({"audio", "text", "intent"}).
+# Log-mel frames kommer fra den fælles feature-service (audio_features) - for en optaget
+# tur er de allerede beregnet under optagelsen. Stilhed skæres fra, log-mel midles i faste tidsintervaller, og en
+# logistisk regression klassificerer mellem de hyppigste kommandoer og "andet". Tærsklen
+# vælges ud fra out-of-fold sandsynligheder, så genvejen kun tages når den er sikker -
+# ellers kører turen som før gennem Whisper. Træneren udskriver coverage, accuracy og
+# latens for en række tærskler, så afvejningen kan vælges med --precision.
+
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from audio_features import features_for, SAMPLE_RATE as RATE
+
+TIME_BINS = 12    # Log-mel midles i så mange lige lange tidsintervaller
+TRIM_TOP_DB = 30
+MAX_SECONDS = 2.5  # Længere ytringer går altid gennem Whisper
+OTHER = "andet"
+DEFAULT_INTENTS = 5
+TARGET_PRECISION = 0.98  # Andel korrekte blandt de ture der tager genvejen
+MODEL_PATH = os.path.join("models", "command_spotter.joblib")
+LATENCY_SAMPLE = 20  # Klip der bruges til at måle latens
+
+
+def spot_features(audio):
+    """Fast-længde feature-vektor for en kort ytring (float32 PCM, 16 kHz)"""
+    speech = features_for(audio).speech(TRIM_TOP_DB)
+    logmel = speech.logmel  # (T, mels), view
+    if not len(logmel):
+        logmel = np.zeros((1, features_for(audio).logmel.shape[1]), dtype=np.float32)
+    logmel = logmel - logmel.mean()  # Uafhængig af mikrofonens forstærkning
+    # Middel over TIME_BINS lige lange tidsintervaller med én reduceat (korte ytringer gentager frames)
+    starts = (np.arange(TIME_BINS) * len(logmel)) // TIME_BINS
+    counts = np.diff(np.append(starts, len(logmel)))
+    pooled = np.add.reduceat(logmel, starts, axis=0) / np.maximum(counts, 1)[:, None]
+    return np.concatenate([pooled.ravel(), logmel.std(axis=0), [speech.seconds]]).astype(np.float32)
+
+
+class CommandSpotter:
+    """Trænet genvej: lyd -> (intent, confidence) eller (None, confidence) når Whisper skal tage over"""
+
+    def __init__(self, bundle):
+        self.pipeline = bundle["pipeline"]
+        self.intents = tuple(bundle["intents"])
+        self.threshold = bundle["threshold"]
+        self.max_seconds = bundle.get("max_seconds", MAX_SECONDS)
+        self.classes = list(self.pipeline.classes_)
+
+    def predict(self, audio):
+        if audio is None or not len(audio):
+            return None, 0.0
+        features = spot_features(audio)
+        if features[-1] > self.max_seconds:  # Talens længde efter trim (pre-roll og endpoint-stilhed fjernet)
+            return None, 0.0
+        probs = self.pipeline.predict_proba(features[None, :])[0]
+        best = int(np.argmax(probs))
+        label, confidence = self.classes[best], float(probs[best])
+        if label == OTHER or confidence < self.threshold:
+            return None, confidence
+        return label, confidence
+
+
+def load_spotter(path=MODEL_PATH):
+    """Den trænede genvej, eller None hvis den ikke er trænet endnu"""
+    if not os.path.exists(path):
+        return None
+    import joblib
+    return CommandSpotter(joblib.load(path))
+
+
+def clip_label(entry):
+    """Manifest-linje -> label. 'læs mine noter' (uden antal) bliver til intent 'noter'"""
+    from jarvis_commands import parse_notes_request, NOTES_PAGE_SIZE
+    text = (entry.get("text") or "").strip().lower()
+    if not any(ch.isdigit() for ch in text) and parse_notes_request(text) == ("recent", NOTES_PAGE_SIZE):
+        return "noter"
+    return entry.get("intent") or OTHER
+
+
+def load_clip_features(clip_dirs):
+    """Features, labels og talens varighed for alle klip - plus et par rå klip til latensmåling"""
+    import librosa
+    features, labels, sample = [], [], []
+    for clip_dir in clip_dirs:
+        manifest = os.path.join(clip_dir, "manifest.jsonl")
+        if not os.path.exists(manifest):
+            print(f"[ADVARSEL] Fandt ikke {manifest} - springer mappen over.")
+            continue
+        with open(manifest, "r", encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+        for entry in entries:
+            audio, _ = librosa.load(os.path.join(clip_dir, entry["audio"]), sr=RATE, mono=True)
+            features.append(spot_features(audio))
+            labels.append(clip_label(entry))
+            if len(sample) < LATENCY_SAMPLE:
+                sample.append(audio)
+    features = np.array(features)
+    return features, np.array(labels, dtype=object), features[:, -1], sample
+
+
+def choose_intents(labels, durations, count=DEFAULT_INTENTS, max_seconds=MAX_SECONDS):
+    """De hyppigste intents blandt de korte klip"""
+    short = labels[(durations <= max_seconds) & (labels != OTHER)]
+    names, counts = np.unique(short, return_counts=True)
+    return [str(name) for name in names[np.argsort(-counts, kind="stable")][:count]]
+
+
+def build_pipeline():
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.linear_model import LogisticRegression
+    return make_pipeline(StandardScaler(), LogisticRegression(C=0.5, max_iter=2000))
+
+
+def out_of_fold_probs(X, y, folds=5, seed=42):
+    from sklearn.model_selection import StratifiedKFold, cross_val_predict
+    folds = max(2, min(folds, np.unique(y, return_counts=True)[1].min()))
+    cv = StratifiedKFold(n_splits=folds, shuffle=True, random_state=seed)
+    return cross_val_predict(build_pipeline(), X, y, cv=cv, method="predict_proba")
+
+
+def tradeoff(probs, classes, y, thresholds):
+    """Pr. tærskel: andel af kommando-klippene der tager genvejen, og hvor mange af dem der er rigtige"""
+    best = probs.argmax(axis=1)
+    predicted = np.array(classes, dtype=object)[best]
+    confidence = probs[np.arange(len(y)), best]
+    is_command = y != OTHER
+    rows = []
+    for threshold in thresholds:
+        taken = (predicted != OTHER) & (confidence >= threshold)
+        correct = taken & (predicted == y)
+        rows.append({
+            "threshold": float(threshold),
+            "coverage": float(taken[is_command].mean()) if is_command.any() else 0.0,
+            "precision": float(correct.sum() / taken.sum()) if taken.any() else 1.0,
+            "false_accepts": int((taken & ~is_command).sum()),
+        })
+    return rows
+
+
+def pick_threshold(rows, precision=TARGET_PRECISION):
+    """Laveste tærskel (størst coverage) der holder præcisionen - ellers den strengeste"""
+    for row in rows:
+        if row["precision"] >= precision:
+            return row["threshold"]
+    return rows[-1]["threshold"]
+
+
+def measure_latency(spotter, X_audio, repeats=3):
+    """Median ms pr. klip for features + forudsigelse"""
+    timings = []
+    for _ in range(repeats):
+        for audio in X_audio:
+            start = time.perf_counter()
+            spotter.predict(audio)
+            timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings)) if timings else 0.0
+
+
+def main():
+    import joblib
+    parser = argparse.ArgumentParser(description="Træn genvejen der genkender korte kommandoer direkte fra lyd")
+    parser.add_argument("clip_dirs", nargs="+", help="Mapper med manifest.jsonl og lydklip")
+    parser.add_argument("--intents", nargs="*", default=None,
+                        help=f"Kommandoer genvejen må tage (standard: de {DEFAULT_INTENTS} hyppigste korte)")
+    parser.add_argument("--precision", type=float, default=TARGET_PRECISION)
+    parser.add_argument("--max-seconds", type=float, default=MAX_SECONDS)
+    parser.add_argument("--output", default=MODEL_PATH)
+    args = parser.parse_args()
+
+    X, labels, durations, sample = load_clip_features(args.clip_dirs)
+    if not len(X):
+        sys.exit("[FEJL] Ingen klip fundet.")
+    intents = args.intents or choose_intents(labels, durations, max_seconds=args.max_seconds)
+    # Alt andet (og lange klip) er "andet", så modellen lærer at afvise det
+    y = np.where(np.isin(labels, intents) & (durations <= args.max_seconds), labels, OTHER).astype(object)
+    names, counts = np.unique(y, return_counts=True)
+    print(f"[INFO] {len(y)} klip: " + ", ".join(f"{n} {c}" for n, c in zip(names, counts)))
+    if OTHER not in names:
+        print("[ADVARSEL] Ingen klip med andre sætninger - genvejen kan kun afvise via tærsklen.")
+
+    probs = out_of_fold_probs(X, y)
+    rows = tradeoff(probs, list(names), y, np.round(np.arange(0.5, 1.0, 0.05), 2))
+    threshold = pick_threshold(rows, args.precision)
+
+    pipeline = build_pipeline().fit(X, y)
+    bundle = {"pipeline": pipeline, "intents": intents, "threshold": threshold, "max_seconds": args.max_seconds,
+              "report": rows}
+    latency = bundle["latency_ms"] = measure_latency(CommandSpotter(bundle), sample)
+
+    print(f"[RESULTAT] Out-of-fold afvejning (features + forudsigelse ~{latency:.1f} ms pr. klip):")
+    for row in rows:
+        mark = "*" if row["threshold"] == threshold else " "
+        print(f" {mark} tærskel {row['threshold']:.2f}: coverage {row['coverage']:.3f}, "
+              f"præcision {row['precision']:.3f}, falske accepter {row['false_accepts']}")
+    print(f"[INFO] Tærskel {threshold:.2f} valgt (præcision >= {args.precision}). Intents: {', '.join(intents)}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    joblib.dump(bundle, args.output)
+    print(f"[INFO] Genvej gemt i {args.output}")
+
+
+if __name__ == "__main__":
+    main()
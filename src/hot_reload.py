@@ -0,0 +1,80 @@
+import os
+import threading
+
+import metrics
+
+RELOAD_INTERVAL = 2.0  # Sekunder mellem mtime-tjek
+
+
+def path_signature(paths):
+    """(sti, mtime, størrelse) for hver fil - None hvis filen ikke findes"""
+    signature = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            signature.append((path, st.st_mtime_ns, st.st_size))
+        except OSError:
+            signature.append((path, None, None))
+    return tuple(signature)
+
+
+class Watch:
+    def __init__(self, name, paths, reload):
+        self.name = name
+        self.paths = list(paths)
+        self.reload = reload  # Kaldes uden argumenter; returnerer True hvis en ny version blev taget i brug
+        self.signature = path_signature(self.paths)
+        self.pending = None
+
+
+class HotReloader:
+    """Genindlæser artefakter i models/ og data/ når filerne ændres på disk.
+
+    Ændringer findes ved mtime-polling (virker ens på Windows og Linux uden
+    ekstra afhængigheder). En ændring skal have været stabil i ét interval,
+    før den genindlæses, så en fil der stadig skrives ikke indlæses halvt.
+    Selve indlæsningen, røgtesten og udskiftningen af den globale reference
+    ligger i reload-funktionen og kører på reloaderens egen tråd.
+    """
+
+    def __init__(self, interval=RELOAD_INTERVAL):
+        self.interval = interval
+        self.watches = {}
+        self._thread = None
+        self._stop = threading.Event()
+
+    def watch(self, name, paths, reload):
+        self.watches[name] = Watch(name, paths, reload)
+        return self.watches[name]
+
+    def poll(self):
+        for watch in self.watches.values():
+            signature = path_signature(watch.paths)
+            if signature == watch.signature:
+                watch.pending = None
+                continue
+            if signature != watch.pending:
+                watch.pending = signature  # Vent et interval mere - filen kan være ved at blive skrevet
+                continue
+            try:
+                changed = watch.reload()
+            except Exception as e:
+                print(f"[FEJL] Genindlæsning af {watch.name} fejlede: {e}")
+                metrics.record_error(f"reload_{watch.name}")
+                changed = False
+            # Også ved fejl: prøv først igen når filerne ændres næste gang
+            watch.signature = signature
+            watch.pending = None
+            metrics.RELOADS.inc(artifact=watch.name, result="swapped" if changed else "kept")
+
+    def start(self):
+        if self._thread:
+            return
+        def run():
+            while not self._stop.wait(self.interval):
+                self.poll()
+        self._thread = threading.Thread(target=run, name="jarvis-hot-reload", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
@@ -1,8 +1,14 @@
+import re
 import datetime
 import webbrowser
 import os
+from notes_store import get_store, format_entries
 
-NOTES_FILE = "noter.txt"
+NOTES_PAGE_SIZE = 5
+NUMBER_WORDS = {"en": 1, "et": 1, "to": 2, "tre": 3, "fire": 4, "fem": 5, "seks": 6, "syv": 7, "otte": 8,
+                "ni": 9, "ti": 10}
+SEARCH_NOTES = re.compile(r"søg (?:i |blandt )?(?:mine )?noter(?:ne)? (?:efter |om |for )?(.+)")
+RECENT_NOTES = re.compile(r"(?:læs|vis|hvad er) (?:op )?(?:mine |de )?(?:sidste |seneste )?(\d+|\w+)? ?(?:sidste |seneste )?noter")
 
 def get_time():
     now = datetime.datetime.now()
@@ -12,27 +18,39 @@ def open_youtube():
     webbrowser.open("https://www.youtube.com")
     return "Åbner YouTube..."
 
-def save_note(note_text):
-    with open(NOTES_FILE, "a", encoding="utf-8") as f:
-        f.write(note_text + "\n")
+def save_note(note_text, speaker=None):
+    get_store().add(note_text, kind="note", speaker=speaker)
     return "Noten er gemt."
 
 def open_website(url):
     webbrowser.open(url)
     return f"Åbner {url}..."
 
-def save_message(message):
-    with open("beskeder.txt", "a", encoding="utf-8") as f:
-        f.write(message + "\n")
+def save_message(message, speaker=None):
+    get_store().add(message, kind="message", speaker=speaker)
     return "Beskeden er gemt."
 
-def list_notes():
-    try:
-        with open(NOTES_FILE, "r", encoding="utf-8") as f:
-            notes = f.readlines()
-        return "".join(notes) if notes else "Ingen noter fundet."
-    except FileNotFoundError:
-        return "Ingen noter fundet."
+def list_notes(limit=NOTES_PAGE_SIZE, page=0, speaker=None):
+    entries = get_store().recent("note", limit=limit, offset=page * limit, speaker=speaker)
+    return format_entries(entries) if entries else "Ingen noter fundet."
+
+def search_notes(query, limit=NOTES_PAGE_SIZE, page=0, speaker=None):
+    entries = get_store().search(query, "note", limit=limit, offset=page * limit, speaker=speaker)
+    return format_entries(entries) if entries else f"Ingen noter om {query}."
+
+def parse_notes_request(text):
+    """'søg noter efter mælk' -> ("search", "mælk"), 'læs mine sidste 5 noter' -> ("recent", 5), ellers None"""
+    text = text.strip().lower()
+    match = SEARCH_NOTES.search(text)
+    if match:
+        return "search", match.group(1).strip(" ?.!")
+    match = RECENT_NOTES.search(text)
+    if match:
+        count = match.group(1)
+        if count and count.isdigit():
+            return "recent", max(1, min(int(count), 50))
+        return "recent", NUMBER_WORDS.get(count, NOTES_PAGE_SIZE)
+    return None
 
 def get_date():
     now = datetime.datetime.now()
@@ -59,6 +77,7 @@ COMMANDS = {
     "åbn hjemmeside": open_website,
     "gem besked": save_message,
     "liste noter": list_notes,
+    "søg noter": search_notes,
     "dato": get_date,
     "åbn fil": open_file,
     "søg google": search_google,
@@ -0,0 +1,313 @@
+# Samlet konfiguration af ydelses-knapperne med navngivne profiler pr. installation
+#
+#   JARVIS_CONFIG_PROFILE=low-latency python src/jarvis_main.py
+#   python src/jarvis_server.py --profile server
+#
+# Værdierne lægges i lag: standardværdier < profil < "settings" i config/jarvis_config.json
+# < "hosts"-afsnittet for den aktuelle maskine. Profilen vælges af (i prioriteret rækkefølge)
+# kaldet, JARVIS_CONFIG_PROFILE, maskinens "profile" under "hosts" og filens "profile".
+# Alt valideres samlet én gang ved opstart; en ugyldig værdi stopper programmet med en liste
+# over fejlene. Mens Jarvis kører, kan værdierne ændres med POST /admin/config på metrics-serveren:
+# RUNTIME-indstillinger gælder fra næste tur, RELOAD genindlæser Whisper, og RESTART læses
+# kun ved opstart.
+
+import os
+import json
+import socket
+import threading
+
+CONFIG_FILE = os.environ.get("JARVIS_CONFIG") or os.path.join("config", "jarvis_config.json")
+PROFILE_ENV = "JARVIS_CONFIG_PROFILE"
+DEFAULT_PROFILE = "default"
+
+RUNTIME = "runtime"  # Bruges fra næste tur
+RELOAD = "reload"    # Whisper genindlæses med de nye værdier
+RESTART = "restart"  # Læses kun ved opstart (lydstreams, thread pool, hukommelsesbudget)
+
+WHISPER_MODELS = ("tiny", "base", "small", "medium", "large-v2", "large-v3", "large-v3-turbo")
+COMPUTE_TYPES = ("default", "auto", "int8", "int8_float16", "int8_float32", "int16", "float16", "bfloat16",
+                 "float32")
+TRUE_WORDS = ("1", "true", "ja", "on")
+FALSE_WORDS = ("0", "false", "nej", "off")
+
+
+class ConfigError(ValueError):
+    pass
+
+
+class Setting:
+    """Én indstilling: standardværdi (bestemmer typen), hvornår en ændring slår igennem, og grænser"""
+
+    def __init__(self, default, apply=RUNTIME, choices=None, minimum=None, maximum=None, help=""):
+        self.default = default
+        self.type = type(default)
+        self.apply = apply
+        self.choices = choices
+        self.minimum = minimum
+        self.maximum = maximum
+        self.help = help
+
+    def parse(self, value):
+        """Værdi fra JSON eller en query-streng -> typet værdi (ValueError med forklaring ved fejl)"""
+        if isinstance(value, str) and self.type is not str:
+            text = value.strip().lower()
+            if self.type is bool:
+                if text not in TRUE_WORDS + FALSE_WORDS:
+                    raise ValueError(f"forventer true/false, fik '{value}'")
+                value = text in TRUE_WORDS
+            else:
+                try:
+                    value = self.type(text)
+                except ValueError:
+                    raise ValueError(f"forventer {self.type.__name__}, fik '{value}'") from None
+        elif self.type is float and type(value) is int:
+            value = float(value)
+        if type(value) is not self.type:
+            raise ValueError(f"forventer {self.type.__name__}, fik {type(value).__name__}")
+        if self.choices is not None and value not in self.choices:
+            raise ValueError(f"skal være en af {', '.join(map(str, self.choices))}")
+        if self.minimum is not None and value < self.minimum:
+            raise ValueError(f"skal være mindst {self.minimum}")
+        if self.maximum is not None and value > self.maximum:
+            raise ValueError(f"må højst være {self.maximum}")
+        return value
+
+
+SETTINGS = {
+    # Optagelse og VAD
+    "rate": Setting(16000, RESTART, choices=(16000,), help="Samplerate - Whisper og lyd-features kræver 16 kHz"),
+    "chunk": Setting(1024, RESTART, minimum=128, maximum=8192, help="Samples pr. mikrofon-chunk"),
+    "pre_roll_ms": Setting(500, RESTART, minimum=0, maximum=5000, help="Lyd fra før optagelsen der sættes foran"),
+    "silence_threshold": Setting(200, minimum=0, maximum=32767,
+                                 help="Gennemsnitlig amplitude (int16) under dette tæller som stilhed"),
+    "silence_seconds": Setting(4.0, minimum=0.2, maximum=30.0, help="Stilhed før optagelsen stopper"),
+    "max_recording_seconds": Setting(20.0, minimum=1.0, maximum=120.0, help="Længste optagelse"),
+    # Whisper
+    "whisper_model": Setting("small", RELOAD, choices=WHISPER_MODELS),
+    "whisper_device": Setting("auto", RELOAD, choices=("auto", "cuda", "cpu"),
+                              help="auto = GPU hvis den kan bruges, ellers CPU"),
+    "compute_type": Setting("int8", RELOAD, choices=COMPUTE_TYPES),
+    "stt_cpu_threads": Setting(0, RELOAD, minimum=0, maximum=256, help="CTranslate2-tråde (0 = vælger selv)"),
+    "beam_size": Setting(5, minimum=1, maximum=20),
+    "stt_nbest": Setting(2, minimum=1, maximum=3, help="Hypoteser ved usikker transskription (1 = slået fra)"),
+    "nbest_logprob_threshold": Setting(-0.6, minimum=-5.0, maximum=0.0,
+                                       help="Gennemsnitlig log-sandsynlighed under dette udløser ekstra hypoteser"),
+    # Svar og ressourcer
+    "similarity_threshold": Setting(0.4, minimum=0.0, maximum=1.0,
+                                    help="Minimum cosinus-lighed for et retrieval-svar"),
+    "executor_workers": Setting(4, RESTART, minimum=1, maximum=64, help="Tråde til optagelse, STT og TTS"),
+    "low_memory": Setting(False, RESTART, help="Fjern NN-chatbot og taler-modeller når de er inaktive"),
+    "model_idle_ttl": Setting(600, RESTART, minimum=10, maximum=86400, help="Sekunder før en inaktiv model fjernes"),
+}
+
+# Kun afvigelserne fra standardværdierne
+PROFILES = {
+    "default": {},
+    # Kortere endpoint-stilhed og én afkodning pr. tur; mindre chunks giver VAD'en finere opløsning
+    "low-latency": {
+        "chunk": 512,
+        "silence_seconds": 1.0,
+        "max_recording_seconds": 10.0,
+        "beam_size": 1,
+        "stt_nbest": 1,
+    },
+    # Mindre Whisper, færre tråde og inaktive modeller fjernes
+    "low-memory": {
+        "whisper_model": "base",
+        "executor_workers": 2,
+        "low_memory": True,
+        "model_idle_ttl": 300,
+        "stt_nbest": 1,
+    },
+    # Større Whisper, bredere beam, flere hypoteser og strengere retrieval
+    "high-accuracy": {
+        "whisper_model": "medium",
+        "beam_size": 8,
+        "stt_nbest": 3,
+        "nbest_logprob_threshold": -0.4,
+        "similarity_threshold": 0.5,
+    },
+    # Flere worker-processer deler CPU'en: fast trådbudget pr. worker og ingen ekstra afkodninger
+    "server": {
+        "stt_cpu_threads": 2,
+        "stt_nbest": 1,
+    },
+}
+
+
+def validate(changes):
+    """Rå værdier -> typede værdier. ConfigError med alle fejl på én gang"""
+    clean, errors = {}, []
+    for key, value in changes.items():
+        setting = SETTINGS.get(key)
+        if setting is None:
+            errors.append(f"ukendt indstilling '{key}'")
+            continue
+        try:
+            clean[key] = setting.parse(value)
+        except ValueError as e:
+            errors.append(f"{key}: {e}")
+    if errors:
+        raise ConfigError("; ".join(errors))
+    return clean
+
+
+def check(values):
+    """Sammenhæng mellem indstillinger"""
+    if values["silence_seconds"] >= values["max_recording_seconds"]:
+        raise ConfigError("silence_seconds skal være mindre end max_recording_seconds")
+
+
+def read_file(path=None):
+    path = path or CONFIG_FILE
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except json.JSONDecodeError as e:
+        raise ConfigError(f"{path}: ugyldig JSON ({e})") from None
+    if not isinstance(data, dict):
+        raise ConfigError(f"{path}: forventer et JSON-objekt")
+    return data
+
+
+def resolve(profile=None, data=None, hostname=None):
+    """(profilnavn, fuldt valideret sæt værdier) for denne maskine"""
+    data = data or {}
+    hostname = hostname or socket.gethostname()
+    host = (data.get("hosts") or {}).get(hostname) or {}
+    profile = profile or os.environ.get(PROFILE_ENV) or host.get("profile") or data.get("profile") or DEFAULT_PROFILE
+    if profile not in PROFILES:
+        raise ConfigError(f"ukendt profil '{profile}' (findes: {', '.join(PROFILES)})")
+    values = {name: setting.default for name, setting in SETTINGS.items()}
+    errors = []
+    layers = ((f"profil {profile}", PROFILES[profile]), ("settings", data.get("settings") or {}),
+              (f"hosts.{hostname}.settings", host.get("settings") or {}))
+    for origin, layer in layers:
+        try:
+            values.update(validate(layer))
+        except ConfigError as e:
+            errors.append(f"{origin}: {e}")
+    if errors:
+        raise ConfigError(" | ".join(errors))
+    check(values)
+    return profile, values
+
+
+class Config:
+    """De gældende værdier. Læses uden lås (`config["beam_size"]`); en ændring bygger en ny
+    dict og skifter den ind med én tildeling, så en læser aldrig ser en halv opdatering.
+    """
+
+    def __init__(self):
+        self.profile, self._values = DEFAULT_PROFILE, {name: s.default for name, s in SETTINGS.items()}
+        self.data = {}
+        self.loaded = False
+        self._lock = threading.Lock()
+        self._apply_lock = threading.Lock()  # Én genindlæsning ad gangen - holdes ikke sammen med _lock
+        self._listeners = []  # (nøgler, funktion) - kaldes når en RELOAD-indstilling ændres
+
+    def __getitem__(self, key):
+        return self._values[key]
+
+    def as_dict(self):
+        return dict(self._values)
+
+    def reset(self, profile, values, data):
+        with self._lock:
+            self.profile, self._values, self.data = profile, values, data
+            self.loaded = True
+
+    def on_change(self, keys, fn):
+        self._listeners.append((frozenset(keys), fn))
+
+    def update(self, changes, startup=False):
+        """Valider og anvend ændringer; returnerer dem der faktisk ændrede noget.
+
+        Uden `startup` afvises RESTART-indstillinger, og lyttere for ændrede
+        RELOAD-indstillinger kaldes - efter låsen er sluppet, så en langsom
+        genindlæsning ikke blokerer andre ændringer. Fejler en lytter, rulles
+        de ændrede nøgler tilbage.
+        """
+        clean = validate(changes)
+        with self._lock:
+            old = self._values
+            changed = {key: value for key, value in clean.items() if old[key] != value}
+            if not changed:
+                return {}
+            restart = sorted(key for key in changed if SETTINGS[key].apply == RESTART)
+            if restart and not startup:
+                raise ConfigError(f"{', '.join(restart)} kræver genstart - sæt dem i {CONFIG_FILE}")
+            values = {**old, **changed}
+            check(values)
+            self._values = values
+        listeners = [fn for keys, fn in self._listeners if keys & changed.keys()] if not startup else []
+        if listeners:
+            with self._apply_lock:
+                try:
+                    for fn in listeners:
+                        fn()
+                except Exception as e:
+                    with self._lock:
+                        # Kun nøgler der stadig har vores værdi - en senere ændring får lov at stå
+                        self._values = {**self._values, **{key: old[key] for key, value in changed.items()
+                                                           if self._values[key] == value}}
+                    raise ConfigError(f"kunne ikke anvende {', '.join(sorted(changed))}: {e}") from e
+        print(f"[INFO] Konfiguration ændret: {', '.join(f'{k}={v}' for k, v in changed.items())}")
+        return changed
+
+
+config = Config()
+
+
+def load_config(profile=None, path=None):
+    """Læs profil og config-fil ind i `config`. Kaldes én gang ved opstart"""
+    data = read_file(path)
+    profile, values = resolve(profile, data)
+    config.reset(profile, values, data)
+    overrides = {key: value for key, value in values.items() if value != SETTINGS[key].default}
+    print(f"[INFO] Konfiguration: profil '{profile}'"
+          + (f" ({', '.join(f'{k}={v}' for k, v in overrides.items())})" if overrides else ""))
+    return config
+
+
+def changes_from_params(params):
+    """Query-parametre -> ændringer. profile=<navn> giver profilens værdier for alt der kan skiftes i drift"""
+    params = dict(params)
+    profile = params.pop("profile", None)
+    changes, pending = {}, []
+    if profile:
+        _, values = resolve(profile, config.data)
+        for key, value in values.items():
+            if SETTINGS[key].apply != RESTART:
+                changes[key] = value
+            elif value != config[key]:
+                pending.append(key)
+    changes.update(params)
+    return profile, changes, pending
+
+
+def status(changed=None, pending=()):
+    settings = {key: {"value": config[key], "apply": setting.apply} for key, setting in SETTINGS.items()}
+    result = {"profile": config.profile, "changed": changed or {}, "settings": settings}
+    if pending:
+        result["restart_required"] = list(pending)
+    return json.dumps(result, ensure_ascii=False, indent=2) + "\n"
+
+
+def show_config(params):
+    """Admin-route (GET): /admin/config viser værdierne. Ændringer kræver POST"""
+    if params:
+        return 405, "Fejl: brug POST for at ændre konfigurationen\n"
+    return 200, status()
+
+
+def admin_config(params):
+    """Admin-route (POST): /admin/config?beam_size=1&silence_seconds=1.5 ændrer værdierne,
+    ?profile=low-latency skifter til profilens værdier (dem der kan ændres uden genstart)"""
+    profile, changes, pending = changes_from_params(params)
+    changed = config.update(changes) if changes else {}
+    if profile:
+        config.profile = profile
+    return 200, status(changed, pending)
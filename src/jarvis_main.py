@@ -1,3 +1,4 @@
+import io
 import os
 # Undertryk TensorFlow INFO og WARNING beskeder
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
@@ -13,7 +14,6 @@ import json
 import requests
 from faster_whisper import WhisperModel
 from gtts import gTTS
-import playsound
 import traceback
 import librosa
 import uuid
@@ -21,6 +21,7 @@ import joblib
 import json
 import asyncio
 import concurrent.futures
+import contextvars
 from functools import partial
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
@@ -42,166 +43,508 @@ from pathlib import Path
 import threading
 import torch
 import soundfile as sf
+from audio_capture import AudioCapture
+from audio_io import AudioIO
+from speaker_recognition import SpeakerRecognizer
+from turn_trace import start_turn, trace_stage, set_path, current_trace, file_version
+import metrics
+from metrics import timed, record_error
+from sampling_profiler import profiler, install_signal_toggle, admin_profile, profile_status
+from model_manager import ModelManager
+from retrieval_index import RetrievalIndex
+from hot_reload import HotReloader
+from notes_store import get_store, format_entries, LEGACY_FILES as LEGACY_NOTES_FILES
+from jarvis_commands import parse_notes_request
+from unknown_log import get_unknown_log, normalize
+from response_cache import ResponseCache
+from teach_dialog import TeachDialog, DialogManager
+from command_spotter import load_spotter, MODEL_PATH as COMMAND_SPOTTER_PATH
+from audio_features import FeatureStream, publish
+from nlu_trainer import current_version as current_nlu_version, read_nlu, VERSIONS_DIR as NLU_VERSIONS_DIR
+from jarvis_config import config, load_config, admin_config, show_config
+
+# Profil og config/jarvis_config.json valideres én gang ved opstart (se src/jarvis_config.py).
+# En server-worker har allerede fået supervisorens værdier
+if not config.loaded:
+    load_config()
 
 # Globale variabler
 FORMAT = pyaudio.paInt16
 CHANNELS = 1
-RATE = 16000
-CHUNK = 1024
+RATE = config["rate"]
+CHUNK = config["chunk"]
+PRE_ROLL_MS = config["pre_roll_ms"]  # Rullende pre-roll (ms) der sættes foran hver optagelse
 TEMP_WAV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "temp_recording.wav")
-NOTES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "noter.txt")
+NOTES_DB = os.path.join("data", "notes.db")
+LEGACY_NOTES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "noter.txt")  # Importeres én gang
 TEMP_MP3_BASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "temp_response_")
+CONVERSATIONS_FILE = os.path.join("data", "conversation_pairs.json")
+TEACH_ENABLED = True  # Slås fra i server-mode, hvor flere processer ellers skriver i samme samtalefil
+LOCAL_SESSION = "local"  # Sessionen for mikrofonen på denne maskine
+# N-best: ved usikker transskription afkodes igen billigt, og hypoteserne rescores mod NLU og retrieval
+# (antal hypoteser og tærskel: stt_nbest og nbest_logprob_threshold i konfigurationen)
+NBEST_PROMPT = "Hvad er klokken? Dato. Vejret. Åbn YouTube. Gem note. Søg på Google. Åbn hjemmeside."
+NBEST_DECODES = [
+    {"beam_size": 1, "initial_prompt": NBEST_PROMPT},  # Greedy, skubbet mod kommandoordforrådet
+    {"beam_size": 1, "temperature": 0.6},             # Sampling giver en anden læsning
+]
+RESCORE_WEIGHTS = {"stt": 0.4, "intent": 0.4, "retrieval": 0.2}
+# Genvej: korte kommandoer genkendt direkte fra lyden springer Whisper og NLU over.
+# Sætningen bruges som kommandotekst, når intentens handler skal have en
+SPOT_PHRASES = {"klokken": "hvad er klokken", "dato": "hvilken dato er det", "vejr": "hvordan er vejret",
+                "youtube": "åbn youtube", "noter": "læs mine noter"}
 
 # === Globale variabler for forudindlæste modeller ===
 whisper_model = None
-nlu_model = None
-nlu_vectorizer = None
-nn_model = None
-nn_tokenizer = None
-nn_le = None
+nlu = None  # (model, vectorizer) - byttes med én tildeling når en ny version trænes
+nn_chatbot = None  # (model, tokenizer, labelencoder)
+audio_io = None  # Den ene PortAudio-kontekst (mikrofon og højttaler)
+audio_capture = None
+speaker_recognizer = None
+command_spotter = None  # CommandSpotter eller None (ikke trænet)
+conversations_cache = None  # (mtime, pairs)
+retrieval_index = None  # (pairs, RetrievalIndex)
+MODEL_VERSIONS = {}  # Versioner af indlæste modeller (skrives med i hver turn-trace)
+model_manager = ModelManager()
+hot_reloader = HotReloader()
+response_cache = ResponseCache()
+# Tærsklen er ikke en del af nøglen, men afgør om retrieval eller NN-chatbotten svarer
+config.on_change(("similarity_threshold",), response_cache.clear)
+dialogs = DialogManager()  # Igangværende teach-me dialoger pr. session
+# Stier hvis svar kun afhænger af kommandoen og model-/dataversionerne. klokken, dato, gem_note,
+# website, google, youtube og noter afhænger af tid eller har sideeffekter og caches aldrig -
+# heller ikke teach-me, Gemini eller ukendte sætninger. NN-chatbottens svar caches, men
+# sætningen logges stadig som ukendt ved hvert cache-hit
+CACHEABLE_PATHS = ("retrieval", "nn_chatbot", "intent:vejr")
+# Artefakterne en tur startede med - nye versioner tages først i brug ved næste tur
+_turn_artifacts = contextvars.ContextVar("jarvis_turn_artifacts", default=None)
+
+# Hukommelsesbudget: i low-memory mode fjernes NN-chatbot og taler-modeller når de er inaktive
+LOW_MEMORY = config["low_memory"] or os.environ.get("JARVIS_LOW_MEMORY") == "1"
+MODEL_IDLE_TTL = config["model_idle_ttl"]  # Sekunder
+MEMORY_BUDGET_MB = int(os.environ.get("JARVIS_MEMORY_BUDGET_MB", "0")) or None
 
 # Thread pool til I/O-operationer
-executor = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+executor = concurrent.futures.ThreadPoolExecutor(max_workers=config["executor_workers"])
 
-# === Funktion til at indlæse alle modeller én gang ===
-def load_all_models():
-    global whisper_model, nlu_model, nlu_vectorizer, nn_model, nn_tokenizer, nn_le
-    print("[INFO] Indlæser modeller...")
-    try:
+# === Indlæsning af modeller (én funktion pr. model, så de kan fjernes og genindlæses) ===
+def read_whisper():
+    """Faster-Whisper efter konfigurationen. whisper_device=auto prøver GPU og falder tilbage til CPU"""
+    name, device, compute_type = config["whisper_model"], config["whisper_device"], config["compute_type"]
+    if device != "cpu":
         try:
-            # Bruger nu Faster-Whisper med int8 kvantisering for bedre hastighed
-            whisper_model = WhisperModel("small", device="cuda", compute_type="int8")
-            print("[INFO] Faster-Whisper model ('small') indlæst på GPU (cuda) med INT8 kvantisering.")
+            return WhisperModel(name, device="cuda", compute_type=compute_type), f"{name}-{compute_type}-cuda"
         except Exception as e:
+            if device == "cuda":
+                raise
             print(f"[ADVARSEL] Kunne ikke indlæse Whisper på GPU: {e}\nFalder tilbage til CPU...")
-            # int8 er god for CPU-performance
-            whisper_model = WhisperModel("small", device="cpu", compute_type="int8")
-            print("[INFO] Faster-Whisper model ('small') indlæst på CPU med INT8 kvantisering.")
-    except Exception as e:
-        print(f"[FEJL] Kunne ikke indlæse Whisper model: {e}")
+    model = WhisperModel(name, device="cpu", compute_type=compute_type, cpu_threads=config["stt_cpu_threads"])
+    return model, f"{name}-{compute_type}-cpu"
 
-    try:
-        nlu_model = joblib.load("models/nlu_model.joblib")
-        nlu_vectorizer = joblib.load("models/vectorizer.joblib")
-        print("[INFO] NLU model og vectorizer indlæst.")
-    except Exception as e:
-        print(f"[FEJL] Kunne ikke indlæse NLU model/vectorizer: {e}")
+def load_whisper():
+    global whisper_model
+    whisper_model, version = read_whisper()
+    MODEL_VERSIONS["whisper"] = version
+    print(f"[INFO] Faster-Whisper model indlæst ({version}).")
 
-    try:
-        if KERAS_AVAILABLE:
-            nn_model = keras.models.load_model("models/nn_chatbot.h5")
-            with open("models/nn_tokenizer.pkl", "rb") as f:
-                nn_tokenizer = pickle.load(f)
-            with open("models/nn_labelencoder.pkl", "rb") as f:
-                nn_le = pickle.load(f)
-            print("[INFO] NN chatbot model, tokenizer og labelencoder indlæst.")
-    except Exception as e:
-        print(f"[FEJL] Kunne ikke indlæse NN chatbot model/data: {e}")
+def reload_whisper():
+    """Skift Whisper efter en ændring via /admin/config - den gamle model bruges indtil den nye er klar"""
+    global whisper_model
+    if whisper_model is None:
+        return  # Ikke indlæst endnu (fx i server-supervisoren) - de nye værdier bruges ved indlæsning
+    model, version = read_whisper()
+    whisper_model = model
+    MODEL_VERSIONS["whisper"] = version
+    print(f"[INFO] Whisper skiftet til {version}.")
+
+config.on_change(("whisper_model", "whisper_device", "compute_type", "stt_cpu_threads"), reload_whisper)
+
+def load_nlu(bundle=None):
+    """Indlæs den aktuelle NLU-version - eller tag en allerede indlæst (model, vectorizer, version)"""
+    global nlu
+    model, vectorizer, version = bundle or read_nlu(current_nlu_version())
+    nlu = (model, vectorizer)
+    MODEL_VERSIONS["nlu"] = version
+    print(f"[INFO] NLU model og vectorizer indlæst (version {version}).")
+
+def reload_nlu():
+    """Skift til en nyere NLU-version uden genstart"""
+    global nlu
+    version = current_nlu_version()
+    if (version or file_version("models/nlu_model.joblib")) == MODEL_VERSIONS.get("nlu"):
+        return False
+    model, vectorizer, version = read_nlu(version)
+    model.predict(vectorizer.transform(["hej"]))  # Røgtest før modellen tages i brug
+    nlu = (model, vectorizer)
+    MODEL_VERSIONS["nlu"] = version
+    response_cache.clear()
+    print(f"[INFO] NLU-model skiftet til version {version}.")
+    return True
+
+NN_CHATBOT_FILES = ("models/nn_chatbot.h5", "models/nn_tokenizer.pkl", "models/nn_labelencoder.pkl")
+
+def read_nn_chatbot():
+    model = keras.models.load_model(NN_CHATBOT_FILES[0])
+    with open(NN_CHATBOT_FILES[1], "rb") as f:
+        tokenizer = pickle.load(f)
+    with open(NN_CHATBOT_FILES[2], "rb") as f:
+        le = pickle.load(f)
+    return model, tokenizer, le
+
+def pad_for_model(model, sequences):
+    """Pad til modellens faste inputlængde - eller blot til den længste sekvens hvis den er variabel"""
+    maxlen = model.input_shape[1] or max(1, max(len(seq) for seq in sequences))
+    return keras.preprocessing.sequence.pad_sequences(sequences, maxlen=maxlen, padding="post")
+
+def load_nn_chatbot():
+    global nn_chatbot
+    if not KERAS_AVAILABLE:
+        return
+    nn_chatbot = read_nn_chatbot()
+    MODEL_VERSIONS["nn_chatbot"] = file_version(NN_CHATBOT_FILES[0])
+    print("[INFO] NN chatbot model, tokenizer og labelencoder indlæst.")
+
+def reload_nn_chatbot():
+    """Skift til en nytrænet NN chatbot. Er den fjernet (low-memory), indlæses den nye ved næste brug"""
+    global nn_chatbot
+    if not KERAS_AVAILABLE or nn_chatbot is None:
+        return False
+    bundle = read_nn_chatbot()
+    model, tokenizer, le = bundle
+    seq = pad_for_model(model, tokenizer.texts_to_sequences(["hej"]))
+    idx = int(np.argmax(model.predict(seq, verbose=0)))
+    le.inverse_transform([idx])  # Røgtest: output-laget skal passe til labelencoderen
+    nn_chatbot = bundle
+    MODEL_VERSIONS["nn_chatbot"] = file_version(NN_CHATBOT_FILES[0])
+    response_cache.clear()
+    print(f"[INFO] NN chatbot skiftet til version {MODEL_VERSIONS['nn_chatbot']}.")
+    return True
+
+def unload_nn_chatbot():
+    global nn_chatbot
+    nn_chatbot = None
+    if KERAS_AVAILABLE:
+        keras.backend.clear_session()
+
+def load_command_spotter(spotter=None):
+    global command_spotter
+    command_spotter = spotter or load_spotter()
+    if command_spotter is None:
+        print(f"[INFO] Ingen kommando-genvej ({COMMAND_SPOTTER_PATH}) - alle ture går gennem Whisper.")
+        return
+    MODEL_VERSIONS["command_spotter"] = file_version(COMMAND_SPOTTER_PATH)
+    print(f"[INFO] Kommando-genvej indlæst ({', '.join(command_spotter.intents)}, "
+          f"tærskel {command_spotter.threshold:.2f}).")
+
+def reload_command_spotter():
+    global command_spotter
+    spotter = load_spotter()
+    if spotter is None:
+        return False
+    spotter.predict(np.zeros(RATE, dtype=np.float32))  # Røgtest
+    command_spotter = spotter
+    MODEL_VERSIONS["command_spotter"] = file_version(COMMAND_SPOTTER_PATH)
+    print(f"[INFO] Kommando-genvej skiftet til version {MODEL_VERSIONS['command_spotter']}.")
+    return True
+
+def load_speaker():
+    global speaker_recognizer
+    # Synkroniserer taler-registret inkrementelt med data/voices (ingen gentræning)
+    speaker_recognizer = SpeakerRecognizer()
+    print("[INFO] Taler-genkendelse indlæst.")
+
+def unload_speaker():
+    global speaker_recognizer
+    speaker_recognizer = None
+
+def load_all_models():
+    print("[INFO] Indlæser modeller...")
+    # Sjældent brugte modeller kan fjernes efter MODEL_IDLE_TTL i low-memory mode
+    idle_ttl = MODEL_IDLE_TTL if LOW_MEMORY else None
+    model_manager.register("whisper", load_whisper)
+    model_manager.register("nlu", load_nlu)
+    model_manager.register("command_spotter", load_command_spotter)
+    model_manager.register("nn_chatbot", load_nn_chatbot, unload_nn_chatbot, idle_ttl=idle_ttl)
+    model_manager.register("speaker", load_speaker, unload_speaker, idle_ttl=idle_ttl)
+    for name in model_manager.models:
+        model_manager.ensure_loaded(name)
+    model_manager.start_reaper()
+    model_manager.report(MEMORY_BUDGET_MB * 1024 ** 2 if MEMORY_BUDGET_MB else None)
     print("[INFO] Modelindlæsning færdig.")
 
+def start_hot_reload():
+    """Overvåg models/ og data/ og skift ændrede artefakter ind uden genstart"""
+    hot_reloader.watch("nlu", [os.path.join(NLU_VERSIONS_DIR, "CURRENT"),
+                               "models/nlu_model.joblib", "models/vectorizer.joblib"], reload_nlu)
+    hot_reloader.watch("nn_chatbot", NN_CHATBOT_FILES, reload_nn_chatbot)
+    hot_reloader.watch("conversations", [CONVERSATIONS_FILE], reload_conversations)
+    hot_reloader.watch("command_spotter", [COMMAND_SPOTTER_PATH], reload_command_spotter)
+    hot_reloader.start()
+    return hot_reloader
+
+def artifact(name):
+    """Den version af en global model/data-reference som den aktuelle tur bruger"""
+    pinned = _turn_artifacts.get()
+    if pinned is not None and pinned.get(name) is not None:
+        return pinned[name]
+    return globals()[name]
+
+@timed("predict_intent")
 def predict_intent(text):
-    global nlu_model, nlu_vectorizer
-    if not nlu_model or not nlu_vectorizer:
+    bundle = artifact("nlu")
+    if bundle is None:
         print("[FEJL] NLU model eller vectorizer ikke indlæst!")
         return None
+    nlu_model, nlu_vectorizer = bundle  # Samme version for både vectorizer og model
     try:
         text_vec = nlu_vectorizer.transform([text])
         prediction = nlu_model.predict(text_vec)
         return prediction[0]
     except Exception as e:
         print(f"Fejl under NLU intent forudsigelse: {e}")
+        record_error("predict_intent")
         return None
 
+@timed("spot_command")
+def spot_command(audio):
+    """Kommando-genvejen: (intent, confidence) når en kort kommando er genkendt sikkert, ellers (None, ...)"""
+    spotter = command_spotter
+    if spotter is None or audio is None:
+        return None, 0.0
+    try:
+        return spotter.predict(audio)
+    except Exception as e:
+        print(f"[ADVARSEL] Kommando-genvejen fejlede - bruger Whisper: {e}")
+        record_error("spot_command")
+        return None, 0.0
+
+async def spot_command_async(audio):
+    """Asynkron wrapper til kommando-genvejen"""
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(executor, partial(spot_command, audio))
+
+def handle_spotted(intent):
+    """Svar på en kommando genkendt direkte fra lyden - uden transskription og NLU"""
+    metrics.INTENTS.inc(intent=intent)
+    command = SPOT_PHRASES.get(intent, intent)
+    if intent == "noter":
+        route("intent:notes")
+        return answer_notes_request(parse_notes_request(command))
+    return respond_to_intent(intent, command)
+
 # Asynkron version af transcribe_audio
-async def transcribe_audio_async(file_path):
+async def transcribe_audio_async(audio, rescore=True):
     """Asynkron wrapper til transskription"""
     loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(executor, partial(transcribe_audio, file_path))
+    # Kør i en kopi af context, så rescoringen kan skrive nbest-felterne til turens trace
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(executor, partial(ctx.run, transcribe_audio, audio, rescore))
 
-def transcribe_audio(file_path):
-    global whisper_model
-    if not whisper_model:
-        print("[FEJL] Whisper model ikke indlæst!")
+def load_audio(audio):
+    """Returnerer float32 PCM (16 kHz mono) - enten bufferen selv eller indlæst fra en fil"""
+    if audio is None:
         return None
-    temp_path = Path(file_path).resolve()
-    print(f"Indlæser og transskriberer {temp_path}...")
+    if isinstance(audio, np.ndarray):
+        return audio
+    temp_path = Path(audio).resolve()
     if not temp_path.exists():
         print(f"[FEJL] Lydfilen findes ikke: {temp_path}")
         return None
     start_time = time.time()
     try:
-        # Indlæs lydfilen med librosa (uændret)
-        try:
-            audio, _ = librosa.load(str(temp_path), sr=16000, mono=True)
-            print(f" - Lyd indlæst med librosa ({len(audio)} samples, 16000Hz) på {time.time() - start_time:.2f}s")
-        except Exception as e:
-            print(f"[FEJL] Kunne ikke indlæse lyd med librosa: {e}")
+        samples, _ = librosa.load(str(temp_path), sr=RATE, mono=True)
+        print(f" - Lyd indlæst med librosa ({len(samples)} samples, {RATE}Hz) på {time.time() - start_time:.2f}s")
+        return samples
+    except Exception as e:
+        print(f"[FEJL] Kunne ikke indlæse lyd med librosa: {e}")
+        return None
+
+def decode(audio, **options):
+    """Én Whisper-afkodning -> (tekst, gennemsnitlig log-sandsynlighed vægtet med segmentlængde)"""
+    segments, info = whisper_model.transcribe(audio, language="da", **options)
+    segments_list = list(segments)  # Konverter generator til liste
+    if not segments_list:
+        return None, None
+    durations = [max(segment.end - segment.start, 1e-3) for segment in segments_list]
+    logprob = sum(segment.avg_logprob * d for segment, d in zip(segments_list, durations)) / sum(durations)
+    return " ".join(segment.text for segment in segments_list).strip(), logprob
+
+def rescore_hypotheses(hypotheses):
+    """Vælg den hypotese der bedst passer til en kendt kommando eller et kendt spørgsmål.
+
+    Alle hypoteser vurderes i ét batch: én NLU predict_proba og én retrieval-forespørgsel.
+    """
+    texts = [text for text, _ in hypotheses]
+    lowered = [text.lower() for text in texts]
+    stt = np.exp([logprob for _, logprob in hypotheses])
+    intent = np.zeros(len(texts))
+    retrieval = np.zeros(len(texts))
+    bundle = artifact("nlu")  # Turens låste version - den samme som klassificerer den valgte hypotese
+    if bundle is not None:
+        model, vectorizer = bundle
+        intent = model.predict_proba(vectorizer.transform(lowered)).max(axis=1)
+    pairs = load_conversations()
+    if pairs:
+        retrieval = get_retrieval_index(pairs).query_many(lowered).max(axis=1)
+    scores = (RESCORE_WEIGHTS["stt"] * stt + RESCORE_WEIGHTS["intent"] * intent
+              + RESCORE_WEIGHTS["retrieval"] * retrieval)
+    best = int(np.argmax(scores))
+    trace = current_trace()
+    if trace is not None:
+        trace.set(nbest=len(texts), nbest_pick=best)
+    for i, text in enumerate(texts):
+        print(f"   {'*' if i == best else ' '} {scores[i]:.3f}  (stt {stt[i]:.2f}, intent {intent[i]:.2f}, "
+              f"retrieval {retrieval[i]:.2f})  '{text}'")
+    return texts[best]
+
+@timed("transcribe_audio")
+def transcribe_audio(audio, rescore=True):
+    """Transskriberer en PCM-buffer fra record_audio() eller en lydfil.
+
+    Med `rescore` (kommandoer, ikke fritekst som teach-me svar) afkodes usikre
+    transskriptioner igen, og den hypotese der passer bedst til NLU og
+    retrieval vælges.
+    """
+    global whisper_model
+    if not whisper_model:
+        print("[FEJL] Whisper model ikke indlæst!")
+        return None
+    start_time = time.time()
+    try:
+        audio = load_audio(audio)
+        if audio is None:
             return None
-            
+        print(f"Transskriberer {len(audio) / RATE:.1f}s lyd...")
+
         # Brug Faster-Whisper til transskription
-        segments, info = whisper_model.transcribe(audio, language="da", beam_size=5)
-        segments_list = list(segments)  # Konverter generator til liste
-        
-        if segments_list:
-            # Saml tekst fra alle segmenter
-            transcription = " ".join([segment.text for segment in segments_list])
-            print(f" - Transskription færdig på {time.time() - start_time:.2f}s: '{transcription}'")
-            return transcription.strip()
-        else:
+        transcription, logprob = decode(audio, beam_size=config["beam_size"])
+        if transcription is None:
             print(f"[ADVARSEL] Ingen tekst blev genereret ved transskription.")
             return None
+        print(f" - Transskription færdig på {time.time() - start_time:.2f}s: '{transcription}'")
+
+        nbest = config["stt_nbest"]
+        if rescore and nbest > 1 and logprob < config["nbest_logprob_threshold"]:
+            hypotheses = [(transcription, logprob)]
+            seen = {normalize(transcription)}
+            for options in NBEST_DECODES[:nbest - 1]:
+                text, alt_logprob = decode(audio, **options)
+                if text and normalize(text) not in seen:
+                    seen.add(normalize(text))
+                    hypotheses.append((text, alt_logprob))
+            if len(hypotheses) > 1:
+                print(f" - Usikker transskription (logprob {logprob:.2f}) - rescorer {len(hypotheses)} hypoteser:")
+                transcription = rescore_hypotheses(hypotheses)
+        return transcription
     except Exception as e:
         print(f"Fejl under transskription: {e}")
+        record_error("transcribe_audio")
         traceback.print_exc()
         return None
 
+# Asynkron taler-genkendelse
+async def identify_speaker_async(audio):
+    """Asynkron wrapper til taler-genkendelse"""
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(executor, partial(identify_speaker, audio))
+
+def identify_speaker(audio):
+    """Identificerer taleren på samme PCM-buffer som Whisper får - returnerer (bruger, konfidens)"""
+    with model_manager.use("speaker"):
+        recognizer = speaker_recognizer
+        if not recognizer:
+            return "guest", 0.0
+        try:
+            speaker, confidence, _ = recognizer.identify(load_audio(audio), sr=RATE)
+            return speaker, confidence
+        except Exception as e:
+            print(f"[FEJL] Taler-genkendelse fejlede: {e}")
+            record_error("identify_speaker")
+            return "guest", 0.0
+
+@timed("nn_chatbot_response")
 def nn_chatbot_response(user_input):
-    global nn_model, nn_tokenizer, nn_le
     if not KERAS_AVAILABLE:
         return None
-    if not nn_model or not nn_tokenizer or not nn_le:
-        print("[FEJL] NN chatbot model/data ikke indlæst!")
-        return None
-    try:
-        seq = nn_tokenizer.texts_to_sequences([user_input])
-        if KERAS_AVAILABLE and TF_AVAILABLE:
-            seq = keras.preprocessing.sequence.pad_sequences(seq, maxlen=nn_model.input_shape[1], padding="post")
-            pred = nn_model.predict(seq, verbose=0)
-            idx = np.argmax(pred)
-            return nn_le.inverse_transform([idx])[0]
-        else:
+    # Indlæser modellen igen hvis den er fjernet pga. inaktivitet (low-memory mode)
+    with model_manager.use("nn_chatbot"):
+        model, tokenizer, le = artifact("nn_chatbot") or (None, None, None)
+        if not model or not tokenizer or not le:
+            print("[FEJL] NN chatbot model/data ikke indlæst!")
+            return None
+        try:
+            seq = tokenizer.texts_to_sequences([user_input])
+            if KERAS_AVAILABLE and TF_AVAILABLE:
+                seq = pad_for_model(model, seq)
+                pred = model.predict(seq, verbose=0)
+                idx = np.argmax(pred)
+                return le.inverse_transform([idx])[0]
+            else:
+                return None
+        except Exception as e:
+            print(f"[NN-Chatbot fejl]: {e}")
+            record_error("nn_chatbot_response")
             return None
-    except Exception as e:
-        print(f"[NN-Chatbot fejl]: {e}")
-        return None
 
 # Asynkron version af record_audio
 async def record_audio_async():
     """Asynkron wrapper til lydoptagelse"""
     loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(executor, record_audio)
+    # Kør i en kopi af context, så optageren kan skrive til turens trace
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(executor, partial(ctx.run, record_audio))
+
+def get_audio_io():
+    """Returnerer den fælles AudioIO - PortAudio initialiseres kun én gang pr. proces"""
+    global audio_io
+    if audio_io is None:
+        audio_io = AudioIO(executor=executor)
+    return audio_io
+
+def get_audio_capture():
+    """Returnerer den fælles AudioCapture (startes ved første kald)"""
+    global audio_capture
+    if audio_capture is None:
+        audio_capture = AudioCapture(format=FORMAT, channels=CHANNELS, rate=RATE, chunk=CHUNK,
+                                     pre_roll_ms=PRE_ROLL_MS, audio_io=get_audio_io())
+    audio_capture.start()
+    return audio_capture
 
+@timed("record_audio")
 def record_audio():
-    p = pyaudio.PyAudio()
-    stream = p.open(format=FORMAT, channels=CHANNELS, rate=RATE, input=True, frames_per_buffer=CHUNK)
+    capture = get_audio_capture()
     print("Jarvis lytter... (Sig noget eller tryk Ctrl+C for at stoppe)")
-    frames = []
-    silence_threshold = 200 # Sænket fra 400
+    # Pre-roll sættes foran, så en kommando der startede før kaldet ikke klippes
+    frames = capture.begin_utterance()
+    if frames:
+        print(f"Pre-roll: {len(frames)} chunks ({len(frames) * CHUNK / RATE * 1000:.0f} ms) sat foran optagelsen")
+    # Frame-features (energi, log-mel, MFCC) beregnes løbende under optagelsen og deles med
+    # VAD, kommando-genvej og taler-genkendelse - ingen af dem regner på lyden igen
+    stream = FeatureStream()
+    for data in frames:
+        stream.push(data)
+    # VAD-grænserne læses ved hver optagelse, så ændringer via /admin/config gælder fra næste tur
+    silence_threshold = config["silence_threshold"]
     silence_chunks = 0
-    max_silence_chunks = int(4 * RATE / CHUNK)  # 4 sekunders stilhed før stop
-    max_recording_chunks = int(20 * RATE / CHUNK)  # Max 20 sekunder optagelse
+    max_silence_chunks = int(config["silence_seconds"] * RATE / CHUNK)  # Stilhed før stop
+    max_recording_chunks = int(config["max_recording_seconds"] * RATE / CHUNK)  # Længste optagelse
     chunk_count = 0
     listening = True
     max_amplitude_seen = 0
+    amplitude_mean = 0.0
 
     try:
         while listening:
-            data = stream.read(CHUNK)
+            data = capture.read_chunk()
+            if data is None:
+                print("[ADVARSEL] Ingen lyd fra mikrofonen.")
+                break
             frames.append(data)
             chunk_count += 1
-            audio_data = np.frombuffer(data, dtype=np.int16)
-            amplitude_mean = np.abs(audio_data).mean()
-            amplitude_max_raw = np.abs(audio_data).max() if len(audio_data) > 0 else 0
+            block = stream.push(data)
+            if len(block):
+                amplitude_mean = float(block.amplitude.mean())
+            amplitude_max_raw = np.abs(np.frombuffer(data, dtype=np.int16)).max() if data else 0
             max_amplitude_seen = max(max_amplitude_seen, amplitude_mean) # Beholder gennemsnit her
             
             if chunk_count < 10 or chunk_count % 20 == 0: # Log lidt i starten og periodisk
@@ -221,68 +564,83 @@ def record_audio():
         listening = False
     finally:
         print(f"Lytning afsluttet! Optog {chunk_count} chunks. Max amplitude: {max_amplitude_seen:.2f}")
-        stream.stop_stream()
-        stream.close()
-        p.terminate()
+        capture.end_utterance()
+        trace = current_trace()
+        if trace is not None:
+            # Endpoint-ventetid = den stilhed der skulle til, før optagelsen stoppede
+            trace.add_stage("vad_endpoint", silence_chunks * CHUNK / RATE)
+            trace.set(pre_roll_chunks=len(frames) - chunk_count)
         
         if not frames:
             print("Ingen lyd optaget.")
             return None
-            
-        try:
-            wf = wave.open(TEMP_WAV, 'wb')
-            wf.setnchannels(CHANNELS)
-            wf.setsampwidth(p.get_sample_size(FORMAT))
-            wf.setframerate(RATE)
-            wf.writeframes(b''.join(frames))
-            wf.close()
-            
-            if os.path.exists(TEMP_WAV):
-                size = os.path.getsize(TEMP_WAV)
-                print(f"Lyd gemt midlertidigt i {TEMP_WAV} ({size} bytes)")
-                return TEMP_WAV
-            else:
-                print(f"Fejl: Kunne ikke finde den gemte lydfil {TEMP_WAV}")
-                return None
-        except Exception as e:
-            print(f"Fejl ved skrivning af lydfil: {e}")
-            return None
+
+        # Bufferen gives direkte videre til Whisper og taler-genkendelse (ingen WAV-rundtur)
+        pcm = np.frombuffer(b''.join(frames), dtype=np.int16)
+        audio = pcm.astype(np.float32) / 32768.0
+        publish(audio, stream.features())
+        return audio
 
 # Asynkron TTS
 async def speak_async(text, lang='da'):
-    """Asynkron wrapper til TTS"""
+    """Asynkron TTS: syntesen kører på executoren, afspilningen går gennem AudioIO.play_async.
+    Returnerer klippets længde i sekunder (0.0 hvis intet blev afspillet)"""
     loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(executor, partial(speak, text, lang))
+    samples, rate = await loop.run_in_executor(executor, partial(synthesize, text, lang))
+    if samples is None:
+        return 0.0
+    try:
+        # Ikke-blokerende: venter kun hvis afspilningskøen er fuld
+        await get_audio_io().play_async(samples, rate)
+        print(f"Lydklip afspilles ({len(samples) / rate:.1f}s, ikke-blokerende)")
+        return len(samples) / rate
+    except Exception as e:
+        print(f"Kunne ikke afspille lyd: {e}")
+        return 0.0
 
-def speak(text, lang='da'):
+@timed("speak")
+def synthesize(text, lang='da'):
+    """gTTS -> (float32 mono, samplerate) i hukommelsen (ingen temp-fil). (None, None) ved fejl"""
     try:
         print(f"Jarvis svarer: {text}")
-        
-        unique_id = uuid.uuid4()
-        response_mp3 = os.path.join(os.path.dirname(os.path.abspath(__file__)), f"jarvis_response_{unique_id}.mp3")
-        
-        tts = gTTS(text=text, lang=lang, slow=False)
-        tts.save(response_mp3)
-        print(f"Lydfil gemt til: {response_mp3}")
-        
-        try:
-            # Gør lydafspilning non-blocking
-            playsound.playsound(response_mp3, block=False)
-            print(f"Lydklip afspilles (ikke-blokerende)")
-        except Exception as e:
-            print(f"Kunne ikke afspille lyd: {e}")
+        mp3 = io.BytesIO()
+        gTTS(text=text, lang=lang, slow=False).write_to_fp(mp3)
+        return decode_mp3(mp3.getvalue())
     except Exception as e:
         print(f"Fejl ved tekst-til-tale konvertering: {e}")
+        record_error("speak")
         print(traceback.format_exc())
-    finally:
-        if response_mp3 and os.path.exists(response_mp3):
-            try:
-                time.sleep(0.5)
-                os.remove(response_mp3)
-                print(f"Midlertidig lydfil {os.path.basename(response_mp3)} slettet")
-            except:
-                # Ikke kritisk, fortsæt
-                pass
+        return None, None
+
+def speak(text, lang='da'):
+    samples, rate = synthesize(text, lang)
+    if samples is None:
+        return
+    try:
+        # Afspilles på den åbne output-stream - venter kun hvis afspilningskøen er fuld
+        get_audio_io().play(samples, rate)
+        print(f"Lydklip afspilles ({len(samples) / rate:.1f}s, ikke-blokerende)")
+    except Exception as e:
+        print(f"Kunne ikke afspille lyd: {e}")
+
+def decode_mp3(data):
+    """MP3-bytes -> (float32 mono, samplerate). Falder tilbage til librosa via en temp-fil"""
+    if not data:
+        return None, None
+    try:
+        samples, rate = sf.read(io.BytesIO(data), dtype="float32")
+    except Exception:
+        path = f"{TEMP_MP3_BASE}{uuid.uuid4()}.mp3"
+        try:
+            with open(path, "wb") as f:
+                f.write(data)
+            samples, rate = librosa.load(path, sr=None, mono=True)
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+    if samples.ndim > 1:
+        samples = samples.mean(axis=1)
+    return samples, rate
 
 def extract_website_name(text):
     if "google" in text.lower():
@@ -297,6 +655,7 @@ def extract_website_name(text):
             return word
     return None
 
+@timed("get_gemini_response")
 def get_gemini_response(text):
     api_key = os.environ.get('GEMINI_API_KEY', None)
     
@@ -326,61 +685,243 @@ def get_gemini_response(text):
                     return parts[0]['text']
         
         print(f"Gemini API-svar fejlede: {response.status_code} {response.text}")
+        record_error("get_gemini_response")
         return None
     except Exception as e:
         print(f"Fejl under Gemini API-kald: {e}")
+        record_error("get_gemini_response")
         return None
 
 def load_conversations():
+    """Samtalepar fra disk - genbruger den indlæste liste så længe filen er uændret"""
+    global conversations_cache
+    pinned = _turn_artifacts.get()
+    if pinned is not None and pinned.get("conversations_cache") is not None:
+        return pinned["conversations_cache"][1]
     try:
-        with open('data/conversation_pairs.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
+        mtime = os.path.getmtime(CONVERSATIONS_FILE)
+        if conversations_cache is not None and conversations_cache[0] == mtime:
+            return conversations_cache[1]
+        with open(CONVERSATIONS_FILE, 'r', encoding='utf-8') as f:
+            pairs = json.load(f)
+        conversations_cache = (mtime, pairs)
+        return pairs
     except Exception as e:
         print(f"Kunne ikke indlæse samtalepar: {e}")
         return []
 
+def get_retrieval_index(pairs):
+    """TF-IDF-indeks for `pairs` - bygges kun når listen skifter, ikke ved hvert opslag"""
+    global retrieval_index
+    cached = artifact("retrieval_index")
+    if cached is not None and cached[0] is pairs:
+        return cached[1]
+    retrieval_index = (pairs, RetrievalIndex.build(pairs))
+    return retrieval_index[1]
+
+def reload_conversations():
+    """Byg indekset for en ændret conversation_pairs.json i baggrunden og skift det ind"""
+    global conversations_cache, retrieval_index
+    mtime = os.path.getmtime(CONVERSATIONS_FILE)
+    if conversations_cache is not None and conversations_cache[0] == mtime \
+            and retrieval_index is not None and retrieval_index[0] is conversations_cache[1]:
+        return False  # Allerede indlæst af en tur
+    with open(CONVERSATIONS_FILE, 'r', encoding='utf-8') as f:
+        pairs = json.load(f)
+    index = RetrievalIndex.build(pairs) if pairs else None
+    if index is not None and index.query(pairs[0]["user"], threshold=0.0)[0] is None:
+        raise ValueError("røgtest af retrieval-indekset fejlede")
+    # Indekset først: en tur der ser de nye par, finder også det nye indeks
+    if index is not None:
+        retrieval_index = (pairs, index)
+    conversations_cache = (mtime, pairs)
+    response_cache.clear()
+    print(f"[INFO] Samtalepar genindlæst ({len(pairs)} par).")
+    return True
+
+@timed("find_best_response")
 def find_best_response(user_input, pairs):
     for pair in pairs:
         if pair["user"] in user_input:
             return pair["jarvis"]
-    questions = [pair["user"] for pair in pairs]
-    if not questions:
+    if not pairs:
         return None
         
-    vectorizer = TfidfVectorizer()
     try:
-        tfidf_matrix = vectorizer.fit_transform(questions)
-        user_tfidf = vectorizer.transform([user_input])
-        
-        cosine_similarities = cosine_similarity(user_tfidf, tfidf_matrix)
-        best_match_index = cosine_similarities[0].argmax()
-        
         # Et vist minimum af lighed kræves
-        if cosine_similarities[0][best_match_index] >= 0.4:
-            return pairs[best_match_index]["jarvis"]
+        response, _ = get_retrieval_index(pairs).query(user_input, threshold=config["similarity_threshold"])
+        return response
     except Exception as e:
         print(f"Fejl i similarity beregning: {e}")
         
     return None
 
+def unknown_details(sentence, nlu_bundle, index):
+    """NLU's bedste gæt og nærmeste retrieval-lighed - beregnes på log-tråden, ikke i turen"""
+    details = {}
+    if nlu_bundle is not None:
+        model, vectorizer = nlu_bundle
+        probs = model.predict_proba(vectorizer.transform([sentence]))[0]
+        best = int(np.argmax(probs))
+        details["top_intent"] = str(model.classes_[best])
+        details["intent_prob"] = float(probs[best])
+    if index is not None:
+        details["retrieval_score"] = index.query(sentence)[1]
+    return details
+
 def log_unknown_sentence(sentence):
     if not sentence or sentence.isspace():
         return
     
     try:
-        with open("ukendte_sætninger.txt", "a", encoding="utf-8") as f:
-            f.write(f"{sentence}\n")
+        pairs = load_conversations()
+        index = get_retrieval_index(pairs) if pairs else None
+        # Turens versioner af NLU og indeks følger med, så detaljerne passer til det brugeren fik
+        get_unknown_log().record(sentence, partial(unknown_details, sentence, artifact("nlu"), index))
     except Exception as e:
         print(f"Kunne ikke logge ukendt sætning: {e}")
 
-def handle_command(command):
+def handle_command(command, session_id=LOCAL_SESSION):
+    # Er brugeren midt i en teach-me dialog, er inputtet svaret på dialogens spørgsmål
+    dialog = dialogs.active(session_id) if TEACH_ENABLED else None
+    if dialog is not None:
+        response = continue_teach(dialog, session_id, command)
+        if response is not None:
+            return response
+
+    # Normalt er turen låst fra starten (før transskriptionen); ellers låses den her
+    token = begin_turn() if _turn_artifacts.get() is None else None
+    try:
+        return _cached_handle_command(command, session_id)
+    finally:
+        if token is not None:
+            _turn_artifacts.reset(token)
+
+def _cached_handle_command(command, session_id):
+    turn = _turn_artifacts.get()
+    key = None
+    if command and not command.isspace():
+        # Samme form som _handle_command arbejder på - tegnsætning kan ændre svaret og bevares
+        versions = turn["versions"]
+        cache_version = turn["conversations_cache"][0] if turn["conversations_cache"] else None
+        key = (command.strip().lower(), versions.get("nlu"), versions.get("nn_chatbot"), cache_version)
+        cached = response_cache.get(key)
+        if cached is not None:
+            set_path("cache")
+            trace = current_trace()
+            if trace is not None:
+                trace.set(cached_path=cached[1])
+            if cached[1] == "nn_chatbot":
+                # Sætningen var ukendt for retrieval - den logges ved hver forekomst, også fra cachen
+                log_unknown_sentence(command.strip().lower())
+            return cached[0]
+    response = _handle_command(command, session_id)
+    if key is not None and turn["path"] in CACHEABLE_PATHS:
+        response_cache.put(key, (response, turn["path"]))
+    return response
+
+def begin_turn():
+    """Lås modeller og samtalepar for turen i den aktuelle context og returnér ContextVar-token.
+
+    Kaldes ved turens start, før transskriptionen, så N-best rescoring og svaret bruger
+    samme versioner, og en genindlæsning midt i turen ikke blander dem.
+    """
+    _turn_artifacts.set(None)  # En tidligere turs lås må ikke holde samtaleparrene tilbage
+    load_conversations()  # Opdaterer cachen hvis filen er ændret siden sidste tur
+    return _turn_artifacts.set({
+        "nlu": nlu,
+        "nn_chatbot": nn_chatbot,
+        "retrieval_index": retrieval_index,
+        "conversations_cache": conversations_cache,
+        "versions": dict(MODEL_VERSIONS),
+        "path": None,
+    })
+
+def route(path):
+    """set_path - og husk stien på turen, så svar-cachen ved om svaret må caches"""
+    set_path(path)
+    turn = _turn_artifacts.get()
+    if turn is not None and turn["path"] is None:
+        turn["path"] = path
+
+def continue_teach(dialog, session_id, command):
+    """Ét skridt i teach-me dialogen. None = dialogen er opgivet, og inputtet er en ny kommando"""
+    with trace_stage("teach"):
+        reply, learned = dialog.step(command)
+    if dialog.state == "answer":
+        set_path("teach")
+        return reply
+    dialogs.finish(session_id)
+    if dialog.state == "abandoned":
+        return None
+    if dialog.state == "declined":
+        # Fallback til Google API på det oprindelige spørgsmål, hvis tilgængeligt
+        with trace_stage("gemini"):
+            gemini_response = get_gemini_response(dialog.question)
+        if gemini_response:
+            set_path("gemini")
+            return gemini_response
+        set_path("unknown")
+        return "Okay. Det forstår jeg ikke endnu, men jeg har noteret det til senere læring."
+    if learned:
+        add_conversation_pair(dialog.question, learned)
+    set_path("teach")
+    return reply
+
+def _handle_command(command, session_id=LOCAL_SESSION):
     if not command or command.isspace():
         return "Jeg kunne ikke forstå, hvad du sagde. Prøv igen."
     
     command = command.strip().lower()
+
+    # Oplæsning og søgning i noter genkendes før NLU (ellers forveksles de med gem_note)
+    notes_request = parse_notes_request(command)
+    if notes_request:
+        route("intent:notes")
+        return answer_notes_request(notes_request)
     
-    intent = predict_intent(command)
+    with trace_stage("intent"):
+        intent = predict_intent(command)
     print(f"Intent: {intent}")
+    metrics.INTENTS.inc(intent=intent or "ukendt")
+    response = respond_to_intent(intent, command)
+    if response is not None:
+        return response
+
+    with trace_stage("retrieval"):
+        pairs = load_conversations()
+        response = find_best_response(command, pairs)
+    if response:
+        route("retrieval")
+        return response
+    log_unknown_sentence(command)
+
+    if KERAS_AVAILABLE:
+        with trace_stage("nn_chatbot"):
+            nn_response = nn_chatbot_response(command)
+        if nn_response:
+            route("nn_chatbot")
+            return nn_response
+    
+    if TEACH_ENABLED:
+        # Kun spørgsmålet stilles her - svarene kommer som de næste ture i pipelinen
+        route("teach")
+        return dialogs.start(session_id, TeachDialog(command)).prompt()
+    
+    # Fallback til Google API, hvis tilgængeligt
+    with trace_stage("gemini"):
+        gemini_response = get_gemini_response(command)
+    if gemini_response:
+        route("gemini")
+        return gemini_response
+    
+    route("unknown")
+    return "Det forstår jeg ikke endnu, men jeg har noteret det til senere læring."
+
+def respond_to_intent(intent, command):
+    """Svar for intents med en fast handler - None hvis kommandoen skal videre til retrieval"""
+    if intent in ("klokken", "dato", "vejr", "website", "youtube", "gem_note", "google"):
+        route(f"intent:{intent}")
     
     if intent == "klokken":
         now = datetime.datetime.now()
@@ -403,6 +944,7 @@ def handle_command(command):
         return "Jeg kunne ikke finde et websted at åbne."
     
     if intent == "youtube" or "youtube" in command.lower():
+        route("intent:youtube")
         try:
             # Kør i en separat tråd for at undgå blokeringsproblemer
             def open_youtube():
@@ -419,8 +961,7 @@ def handle_command(command):
         if not note_text:
             return "Hvad skal jeg gemme som note?"
         
-        with open(NOTES_FILE, "a", encoding="utf-8") as f:
-            f.write(note_text + "\n")
+        get_notes_store().add(note_text, kind="note", speaker=current_speaker())
         return f"Jeg har gemt noten: {note_text}"
     
     if intent == "google":
@@ -429,80 +970,125 @@ def handle_command(command):
             return "Hvad skal jeg søge efter?"
         webbrowser.open(f"https://www.google.com/search?q={q}")
         return f"Søger på nettet efter {q}."
+    return None
 
-    pairs = load_conversations()
-    response = find_best_response(command, pairs)
-    if response:
-        return response
-    log_unknown_sentence(command)
+def get_notes_store():
+    return get_store(NOTES_DB, [(LEGACY_NOTES_FILE, "note")] + LEGACY_NOTES_FILES)
 
-    if KERAS_AVAILABLE:
-        nn_response = nn_chatbot_response(command)
-        if nn_response:
-            return nn_response
-    
-    speak("Det ved jeg ikke endnu. Vil du lære mig svaret? Sig 'ja' eller 'nej'.")
-    user_reply = transcribe_audio(record_audio())
-    if user_reply and 'ja' in user_reply.lower():
-        speak("Hvad skal jeg svare, når nogen siger " + command + "?")
-        answer = transcribe_audio(record_audio())
-        if answer:
-            add_conversation_pair(command, answer)
-            return f"Tak, nu har jeg lært at svare: {answer}"
-        else:
-            return "Jeg forstod ikke dit svar. Vi prøver igen senere."
-    
-    # Fallback til Google API, hvis tilgængeligt
-    gemini_response = get_gemini_response(command)
-    if gemini_response:
-        return gemini_response
-    
-    return "Det forstår jeg ikke endnu, men jeg har noteret det til senere læring."
+def current_speaker():
+    trace = current_trace()
+    return trace.fields.get("speaker") if trace else None
+
+def answer_notes_request(request):
+    """'Læs mine sidste 5 noter' / 'søg noter efter mælk' - kun et sidestørrelse-udsnit læses op"""
+    kind, arg = request
+    store = get_notes_store()
+    if kind == "search":
+        entries = store.search(arg, "note", limit=5)
+        return f"Noter om {arg}:\n{format_entries(entries)}" if entries else f"Jeg fandt ingen noter om {arg}."
+    entries = store.recent("note", limit=arg)
+    return format_entries(entries) if entries else "Du har ingen noter endnu."
 
 def add_conversation_pair(user_text, jarvis_text):
     try:
-        with open('data/conversation_pairs.json', 'r', encoding='utf-8') as f:
+        with open(CONVERSATIONS_FILE, 'r', encoding='utf-8') as f:
             data = json.load(f)
     except (FileNotFoundError, json.JSONDecodeError):
         data = []
     
     data.append({"user": user_text, "jarvis": jarvis_text})
     
-    with open('data/conversation_pairs.json', 'w', encoding='utf-8') as f:
+    with open(CONVERSATIONS_FILE, 'w', encoding='utf-8') as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
+    response_cache.clear()
 
 # Asynkron hoved-loop
+async def traced(name, coro):
+    """Await en coroutine og mål den som et stadie på den aktuelle tur"""
+    with trace_stage(name):
+        return await coro
+
 async def main_async():
     """Asynkront hovedloop"""
     load_all_models()
+    try:
+        metrics.watch_executor(executor)
+        metrics.register_admin_route("/admin/profile", admin_profile, read=profile_status)
+        metrics.register_admin_route("/admin/config", admin_config, read=show_config)
+        metrics.start_metrics_server()
+    except OSError as e:
+        print(f"[ADVARSEL] Kunne ikke starte metrics-endpoint: {e}")
     
     os.makedirs("data", exist_ok=True)
     cleanup_temp_files(TEMP_MP3_BASE, ".mp3")
+    if install_signal_toggle():
+        print(f"[INFO] Send SIGUSR1 til pid {os.getpid()} for at slå sampling-profileren til/fra.")
+    if os.environ.get("JARVIS_PROFILE"):
+        profiler.start(os.environ["JARVIS_PROFILE"])
     
+    # Nytrænede modeller og redigerede samtalepar tages i brug uden genstart
+    start_hot_reload()
+
+    # Start mikrofonen med det samme, så pre-roll fyldes under velkomstbeskeden
+    get_audio_capture()
+
     print("=== Jarvis Lite er klar! ===")
     await speak_async("Jarvis Lite er aktiveret og klar til at hjælpe")
 
     try:
         while True:
             # Optagelse (potentielt blokerende, men kører i thread pool)
-            audio_file_path = await record_audio_async()
+            trace = start_turn(MODEL_VERSIONS)
+            audio = await traced("capture", record_audio_async())
+            begin_turn()  # Efter optagelsen: versionerne låses til det turen faktisk bruger
             
-            if audio_file_path:
-                # Transskription (CPU/GPU-intensiv, kører i thread pool)
-                user_input = await transcribe_audio_async(audio_file_path)
-                
-                if user_input: 
-                    print(f"Bruger sagde: '{user_input}'")
+            if audio is not None:
+                trace.audio_seconds = len(audio) / RATE
+                # Svar i en teach-me dialog er fritekst - de går altid gennem Whisper og rescores ikke
+                in_dialog = dialogs.active(LOCAL_SESSION) is not None
+                spotted = None
+                if not in_dialog and command_spotter is not None:
+                    # Genvejen og taler-genkendelsen kører parallelt; kun en usikker genvej venter på Whisper
+                    (spotted, confidence), (speaker, _) = await asyncio.gather(
+                        traced("spot", spot_command_async(audio)),
+                        traced("speaker_id", identify_speaker_async(audio)),
+                    )
+                    trace.set(speaker=speaker, spotted=spotted, spot_confidence=round(confidence, 3))
+                    user_input = None
+                    if not spotted:
+                        user_input = await traced("stt", transcribe_audio_async(audio))
+                else:
+                    # Transskription og taler-genkendelse kører parallelt i thread pool på samme buffer
+                    user_input, (speaker, _) = await asyncio.gather(
+                        traced("stt", transcribe_audio_async(audio, rescore=not in_dialog)),
+                        traced("speaker_id", identify_speaker_async(audio)),
+                    )
+                    trace.set(speaker=speaker)
+
+                if spotted:
+                    print(f"Kommando genkendt direkte fra lyden ({speaker}): {spotted} ({confidence:.2f})")
+                    set_path(f"spot:{spotted}")  # Første sti vinder - handlerens intent-sti ignoreres
+                    response = handle_spotted(spotted)
+                    await traced("tts", speak_async(response))
+                elif user_input:
+                    print(f"Bruger sagde ({speaker}): '{user_input}'")
                     speak_text = f"Du sagde: {user_input}. "
                     
                     # Intent-håndtering (mindre intensiv, kører i hovedtråd)
                     response = handle_command(user_input)
                     # TTS (netværk + I/O, kører i thread pool)
-                    await speak_async(speak_text + response)
+                    seconds = await traced("tts", speak_async(speak_text + response))
+                    dialog = dialogs.active(LOCAL_SESSION)
+                    if dialog is not None:
+                        dialog.arm(seconds)  # Svartiden løber fra spørgsmålet er spillet færdigt
                 else:
+                    set_path("no_transcript")
                     print("Ingen gyldig tekst genkendt. Prøv igen.")
             else:
+                set_path("no_audio")
                 print("Ingen lyd blev optaget. Prøv igen.")
+            metrics.observe_turn(trace.emit())
+            profiler.turn_boundary(trace.turn_id)
                 
             await asyncio.sleep(0.5)
 
@@ -510,11 +1096,15 @@ async def main_async():
         print("\nJarvis Lite lukkes ned via tastaturafbrydelse.")
     finally:
         print("Rydder op...")
-        try: 
-            p = pyaudio.PyAudio()
-            p.terminate()
-        except:
-            pass
+        profiler.stop()
+        hot_reloader.stop()
+        get_notes_store().close()  # Skriv ventende noter
+        get_unknown_log().close()
+        model_manager.stop()
+        if audio_capture:
+            audio_capture.stop()
+        if audio_io:
+            audio_io.close()  # Den eneste PortAudio-kontekst lukkes her
         cleanup_temp_files(TEMP_WAV, "") # Slet specifik wav fil hvis den stadig findes
         cleanup_temp_files(TEMP_MP3_BASE, ".mp3")
         print("Jarvis Lite er lukket ned.")
@@ -0,0 +1,334 @@
+# Server-mode: en supervisor der fordeler ture på N worker-processer.
+#
+#   python src/jarvis_server.py --workers 4 --stt-threads 2 --port 8765
+#   python src/jarvis_server.py --profile high-accuracy
+#
+# POST /turn?session=<id>  body: rå PCM16 mono 16 kHz (Content-Type: audio/pcm)
+#                          eller JSON {"text": "..."} (Content-Type: application/json)
+# Svar: {"text": "...", "response": "...", "worker": n}
+# GET /admin/config                                vis konfigurationen
+# POST /admin/config?beam_size=3|profile=<navn>    ændr den i supervisoren og alle workers
+#
+# Read-only artefakter (NLU-model, kommando-genvej, retrieval-indeks) indlæses i
+# supervisoren før der forkes, og retrieval-indekset gemmes som mmap-bare NumPy arrays,
+# så workers deler de samme sider. jarvis_main - og dermed TensorFlow, torch og
+# CTranslate2, der ikke er fork-sikre - importeres først i hver worker. Hver worker har
+# sit eget STT-trådbudget, og sessioner routes med consistent hashing, så en session
+# altid rammer samme worker.
+
+import os
+import sys
+import json
+import time
+import uuid
+import bisect
+import hashlib
+import argparse
+import threading
+import multiprocessing as mp
+import concurrent.futures
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+
+import numpy as np
+
+import jarvis_config
+from jarvis_config import config
+from nlu_trainer import current_version as current_nlu_version, read_nlu
+from command_spotter import load_spotter
+from retrieval_index import RetrievalIndex, INDEX_DIR, pairs_fingerprint
+
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8765
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+DEFAULT_PROFILE = "server"  # STT-trådbudget pr. worker (stt_cpu_threads) kommer fra profilen
+VIRTUAL_NODES = 100  # Virtuelle noder pr. worker på hash-ringen
+REQUEST_TIMEOUT = 60
+CONVERSATIONS_FILE = os.path.join("data", "conversation_pairs.json")  # Samme fil som jarvis_main
+
+
+class ConsistentHashRing:
+    """Session -> worker. Tilføjes eller fjernes en worker, flyttes kun ~1/N af sessionerne"""
+
+    def __init__(self, nodes=(), replicas=VIRTUAL_NODES):
+        self.replicas = replicas
+        self._keys = []
+        self._nodes = {}
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(key):
+        return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+    def add(self, node):
+        for i in range(self.replicas):
+            h = self._hash(f"{node}#{i}")
+            bisect.insort(self._keys, h)
+            self._nodes[h] = node
+
+    def remove(self, node):
+        for i in range(self.replicas):
+            h = self._hash(f"{node}#{i}")
+            self._keys.remove(h)
+            del self._nodes[h]
+
+    def get(self, session_id):
+        if not self._keys:
+            raise LookupError("Ingen workers på hash-ringen")
+        idx = bisect.bisect(self._keys, self._hash(session_id)) % len(self._keys)
+        return self._nodes[self._keys[idx]]
+
+
+# Artefakter indlæst i supervisoren; workers arver dem copy-on-write ved fork
+SHARED = {}
+
+
+def load_pairs():
+    try:
+        with open(CONVERSATIONS_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"[ADVARSEL] Kunne ikke indlæse samtalepar: {e}")
+        return []
+
+
+def preload_shared_artifacts():
+    """Indlæs read-only artefakter i supervisoren, før der forkes.
+
+    Kun joblib/NumPy/scikit-learn - NN-chatbottens tokenizer kræver Keras at unpickle
+    og indlæses derfor sammen med Keras-modellen i hver worker.
+    """
+    SHARED["nlu"] = read_nlu(current_nlu_version())  # joblib mmap_mode="r"
+    SHARED["command_spotter"] = load_spotter()
+    pairs = load_pairs()
+    if pairs:
+        index = RetrievalIndex.build(pairs)
+        index.save(INDEX_DIR)
+        print(f"[INFO] Retrieval-indeks ({len(pairs)} par) gemt i {INDEX_DIR} til deling mellem workers.")
+
+
+def worker_main(worker_id, profile, settings, requests, results):
+    """Worker-proces: egen Whisper med begrænset trådbudget, delte read-only artefakter"""
+    # Supervisorens konfiguration (profil og runtime-ændringer) - også når workeren er spawnet.
+    # Sættes før jarvis_main importeres, så modulets konstanter bygges med de samme værdier
+    config.reset(profile, settings, {})
+    import jarvis_main as jm  # Først her: TensorFlow og CTranslate2 er ikke fork-sikre
+    jm.TEACH_ENABLED = False
+    # Ved spawn (Windows) er intet arvet fra supervisoren, og artefakterne indlæses her
+    jm.load_nlu(SHARED.get("nlu"))
+    jm.load_command_spotter(SHARED.get("command_spotter"))
+
+    pairs = jm.load_conversations()
+    try:
+        index = RetrievalIndex.load(INDEX_DIR, mmap=True)
+        if pairs and index.fingerprint == pairs_fingerprint(pairs):
+            jm.retrieval_index = (pairs, index)
+    except (OSError, ValueError) as e:
+        print(f"[ADVARSEL] Worker {worker_id}: kunne ikke indlæse delt retrieval-indeks: {e}")
+
+    jm.load_whisper()
+    if jm.KERAS_AVAILABLE:
+        try:
+            jm.load_nn_chatbot()
+        except Exception as e:
+            print(f"[FEJL] Worker {worker_id}: kunne ikke indlæse NN chatbot: {e}")
+            jm.nn_chatbot = None
+    jm.start_hot_reload()  # Nye modeller og samtalepar tages i brug mellem to ture
+    print(f"[INFO] Worker {worker_id} (pid {os.getpid()}) klar med {config['stt_cpu_threads']} STT-tråde.")
+
+    while True:
+        item = requests.get()
+        if item is None:
+            break
+        request_id, session_id, kind, payload = item
+        if kind == "config":
+            try:
+                config.update(payload)
+            except Exception as e:
+                print(f"[FEJL] Worker {worker_id}: kunne ikke anvende konfiguration: {e}")
+            continue
+        token = jm.begin_turn()  # Samme modelversioner fra rescoring til svar
+        try:
+            spotted = None
+            if kind == "audio":
+                audio = np.frombuffer(payload, dtype=np.int16).astype(np.float32) / 32768.0
+                spotted, _ = jm.spot_command(audio)
+                text = None if spotted else jm.transcribe_audio(audio)
+            else:
+                text = payload
+            if spotted:
+                response = jm.handle_spotted(spotted)
+            else:
+                response = jm.handle_command(text or "", session_id)
+            results.put((request_id, {"text": text, "response": response, "worker": worker_id,
+                                      "spotted": spotted}, None))
+        except Exception as e:
+            results.put((request_id, None, str(e)))
+        finally:
+            jm._turn_artifacts.reset(token)
+
+
+class Supervisor:
+    def __init__(self, n_workers=DEFAULT_WORKERS):
+        # fork deler de forudindlæste sider copy-on-write; spawn bruges hvor fork ikke findes
+        method = "fork" if "fork" in mp.get_all_start_methods() else "spawn"
+        self.ctx = mp.get_context(method)
+        self.n_workers = n_workers
+        self.results = self.ctx.Queue()
+        self.queues = {}
+        self.processes = {}
+        self.ring = ConsistentHashRing()
+        self.pending = {}  # request_id -> (future, worker_id)
+        self._lock = threading.Lock()
+
+    def start(self):
+        preload_shared_artifacts()
+        for worker_id in range(self.n_workers):
+            self._start_worker(worker_id)
+            self.ring.add(worker_id)
+        threading.Thread(target=self._collect, name="jarvis-results", daemon=True).start()
+
+    def _start_worker(self, worker_id):
+        queue = self.ctx.Queue()
+        process = self.ctx.Process(target=worker_main, args=(worker_id, config.profile, config.as_dict(), queue, self.results),
+                                   name=f"jarvis-worker-{worker_id}", daemon=True)
+        process.start()
+        self.queues[worker_id] = queue
+        self.processes[worker_id] = process
+
+    def _collect(self):
+        while True:
+            request_id, result, error = self.results.get()
+            with self._lock:
+                future, _ = self.pending.pop(request_id, (None, None))
+            if future is None:
+                continue
+            if error:
+                future.set_exception(RuntimeError(error))
+            else:
+                future.set_result(result)
+
+    def _restart_worker(self, worker_id):
+        """Kaldes med self._lock. Ture i den døde workers kø fejles med det samme i stedet for at
+        vente på REQUEST_TIMEOUT - de gentages ikke, da de kan have haft sideeffekter (fx en note)"""
+        print(f"[ADVARSEL] Worker {worker_id} er død - genstarter.")
+        lost = [request_id for request_id, (_, owner) in self.pending.items() if owner == worker_id]
+        for request_id in lost:
+            future, _ = self.pending.pop(request_id)
+            future.set_exception(RuntimeError(f"worker {worker_id} stoppede før turen var færdig"))
+        self._start_worker(worker_id)
+
+    def submit(self, session_id, kind, payload):
+        request_id = uuid.uuid4().hex
+        future = concurrent.futures.Future()
+        with self._lock:
+            worker_id = self.ring.get(session_id)
+            if not self.processes[worker_id].is_alive():
+                self._restart_worker(worker_id)
+            self.pending[request_id] = (future, worker_id)
+            self.queues[worker_id].put((request_id, session_id, kind, payload))
+        return future
+
+    def configure(self, params):
+        """/admin/config: valider og anvend i supervisoren, og send ændringerne til alle workers.
+        De anvendes mellem to ture; en genstartet worker får de gældende værdier med fra start."""
+        profile, changes, pending = jarvis_config.changes_from_params(params)
+        changed = config.update(changes) if changes else {}
+        if profile:
+            config.profile = profile
+        if changed:
+            with self._lock:
+                for queue in self.queues.values():
+                    queue.put((None, None, "config", changed))
+        return 200, jarvis_config.status(changed, pending)
+
+    def stop(self):
+        for queue in self.queues.values():
+            queue.put(None)
+        for process in self.processes.values():
+            process.join(timeout=5)
+
+
+def make_handler(supervisor):
+    class TurnHandler(BaseHTTPRequestHandler):
+        def _send(self, status, data, content_type):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path != "/admin/config":
+                self.send_error(404)
+                return
+            status, text = jarvis_config.show_config(dict(parse_qsl(url.query)))
+            self._send(status, text.encode("utf-8"), "text/plain; charset=utf-8")
+
+        def do_POST(self):
+            url = urlsplit(self.path)
+            if url.path == "/admin/config":
+                try:
+                    status, text = supervisor.configure(dict(parse_qsl(url.query)))
+                except ValueError as e:
+                    status, text = 400, f"Fejl: {e}\n"
+                self._send(status, text.encode("utf-8"), "text/plain; charset=utf-8")
+                return
+            if url.path != "/turn":
+                self.send_error(404)
+                return
+            params = dict(parse_qsl(url.query))
+            session_id = params.get("session") or self.client_address[0]
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.headers.get("Content-Type", "").startswith("application/json"):
+                kind, payload = "text", json.loads(body.decode("utf-8")).get("text", "")
+            else:
+                kind, payload = "audio", body
+            start = time.perf_counter()
+            try:
+                result = supervisor.submit(session_id, kind, payload).result(timeout=REQUEST_TIMEOUT)
+                status = 200
+            except Exception as e:
+                result, status = {"error": str(e)}, 500
+            result["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            self._send(status, json.dumps(result, ensure_ascii=False).encode("utf-8"),
+                       "application/json; charset=utf-8")
+
+        def log_message(self, format, *args):
+            pass
+
+    return TurnHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Jarvis Lite i multi-proces server-mode")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--stt-threads", type=int, default=None,
+                        help="CTranslate2-tråde pr. worker (standard: profilens stt_cpu_threads)")
+    parser.add_argument("--profile", default=DEFAULT_PROFILE, choices=sorted(jarvis_config.PROFILES))
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    args = parser.parse_args()
+
+    # Profilen vælges før der forkes, så alle workers starter med samme værdier
+    jarvis_config.load_config(args.profile)
+    if args.stt_threads is not None:
+        config.update({"stt_cpu_threads": args.stt_threads}, startup=True)
+    supervisor = Supervisor(args.workers)
+    supervisor.start()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(supervisor))
+    server.daemon_threads = True
+    print(f"=== Jarvis Lite server: {args.workers} workers på http://{args.host}:{args.port}/turn ===")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nServer lukkes ned...")
+    finally:
+        server.server_close()
+        supervisor.stop()
+
+
+if __name__ == "__main__":
+    main()
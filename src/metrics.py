@@ -0,0 +1,279 @@
+import os
+import time
+import bisect
+import threading
+import functools
+from urllib.parse import urlsplit, parse_qsl
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9108
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + list(extra or [])
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} forventer labels {self.labelnames}, fik {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def expose(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}"
+                                for key, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._functions = {}
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, fn, **labels):
+        """Værdien beregnes først når /metrics hentes"""
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = fn
+
+    def expose(self):
+        with self._lock:
+            items = dict(self._values)
+            functions = dict(self._functions)
+        for key, fn in functions.items():
+            try:
+                value = fn()
+            except Exception:
+                value = None
+            if value is not None:
+                items[key] = value
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}"
+                                for key, v in sorted(items.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            state["counts"][bisect.bisect_left(self.buckets, value)] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    def expose(self):
+        with self._lock:
+            items = sorted((key, {"counts": list(s["counts"]), "sum": s["sum"], "count": s["count"]})
+                           for key, s in self._values.items())
+        lines = self.header()
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state["counts"]):
+                cumulative += count
+                le = _format_labels(self.labelnames, key, [("le", _format_value(float(bound)))])
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            base = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{base} {_format_value(state['sum'])}")
+            lines.append(f"{self.name}_count{base} {state['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def expose(self):
+        """Alle metrics i Prometheus' tekstformat (version 0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+TURNS = REGISTRY.counter("jarvis_turns_total", "Antal gennemførte ture")
+TURN_LATENCY = REGISTRY.histogram("jarvis_turn_duration_seconds", "Samlet varighed af en tur")
+INTENTS = REGISTRY.counter("jarvis_intents_total", "Forudsagte intents", ["intent"])
+FALLBACKS = REGISTRY.counter("jarvis_fallback_total", "Hvilken sti turens svar kom fra", ["path"])
+CACHE_HITS = REGISTRY.counter("jarvis_cache_hits_total", "Cache-hits", ["cache"])
+CACHE_MISSES = REGISTRY.counter("jarvis_cache_misses_total", "Cache-misses", ["cache"])
+ERRORS = REGISTRY.counter("jarvis_errors_total", "Fejl pr. pipeline-stadie", ["stage"])
+STAGE_LATENCY = REGISTRY.histogram("jarvis_stage_duration_seconds", "Varighed pr. pipeline-stadie", ["stage"])
+EXECUTOR_QUEUE = REGISTRY.gauge("jarvis_executor_queue_depth", "Ventende opgaver i thread pool")
+MODEL_MEMORY = REGISTRY.gauge("jarvis_model_memory_bytes", "RSS-tilvækst ved indlæsning af model", ["model"])
+PROCESS_RSS = REGISTRY.gauge("jarvis_process_resident_memory_bytes", "Processens resident memory")
+RELOADS = REGISTRY.counter("jarvis_model_reloads_total", "Genindlæsninger af ændrede artefakter", ["artifact", "result"])
+
+
+def timed(stage):
+    """Decorator der lægger funktionens varighed i STAGE_LATENCY"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                STAGE_LATENCY.observe(time.perf_counter() - start, stage=stage)
+        return wrapper
+    return decorator
+
+
+def record_error(stage):
+    ERRORS.inc(stage=stage)
+
+
+def observe_turn(record):
+    """Opdater tur-metrics ud fra en TurnTrace-post"""
+    TURNS.inc()
+    TURN_LATENCY.observe(record["total_ms"] / 1000)
+    FALLBACKS.inc(path=record.get("path") or "none")
+
+
+def process_rss_bytes():
+    """Processens RSS i bytes (psutil hvis installeret, ellers /proc)"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+PROCESS_RSS.set_function(process_rss_bytes)
+
+
+def watch_executor(executor):
+    """Eksporter kølængden for en ThreadPoolExecutor"""
+    EXECUTOR_QUEUE.set_function(lambda: executor._work_queue.qsize())
+
+
+ADMIN_ROUTES = {}
+
+
+def register_admin_route(path, handler, read=None):
+    """Tilføj en admin-route på metrics-serveren. handler(params) -> (status, tekst).
+    Med `read` går GET til den (kun visning), og handler kaldes kun ved POST"""
+    ADMIN_ROUTES[path] = (handler, read)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def _send(self, status, text, content_type="text/plain; charset=utf-8"):
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, post):
+        url = urlsplit(self.path)
+        if url.path == "/metrics":
+            self._send(200, REGISTRY.expose(), "text/plain; version=0.0.4; charset=utf-8")
+            return
+        route = ADMIN_ROUTES.get(url.path)
+        if route is None:
+            self.send_error(404)
+            return
+        handler, read = route
+        if not post and read is not None:
+            handler = read
+        try:
+            status, text = handler(dict(parse_qsl(url.query)))
+        except Exception as e:
+            status, text = 400, f"Fejl: {e}\n"
+        self._send(status, text)
+
+    def do_GET(self):
+        self._handle(post=False)
+
+    def do_POST(self):
+        self._handle(post=True)
+
+    def log_message(self, format, *args):
+        pass  # Ingen access-log i konsollen
+
+
+def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT):
+    """Start /metrics på en baggrundstråd og returner serveren"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="jarvis-metrics", daemon=True).start()
+    print(f"[INFO] Metrics tilgængelige på http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,147 @@
+import gc
+import time
+import threading
+from contextlib import contextmanager
+
+import metrics
+
+REAPER_INTERVAL = 30  # Sekunder mellem tjek for inaktive modeller
+
+
+class ManagedModel:
+    def __init__(self, name, load, unload=None, idle_ttl=None):
+        self.name = name
+        self.load = load          # Kaldes uden argumenter og sætter modellens globale referencer
+        self.unload = unload      # Rydder referencerne igen (None = kan ikke fjernes)
+        self.idle_ttl = idle_ttl  # Sekunder uden brug før modellen fjernes (None = altid indlæst)
+        self.loaded = False
+        self.last_used = 0.0
+        self.in_use = 0
+        self.rss_bytes = None
+        self.lock = threading.RLock()
+
+
+class ModelManager:
+    """Holder styr på hvilke modeller der er indlæst, og hvad de koster i RAM.
+
+    Hver model registreres med en load- og unload-funktion. RSS måles før og
+    efter indlæsning og tilskrives modellen. Modeller med `idle_ttl` fjernes af
+    en baggrundstråd når de ikke har været brugt i så lang tid, og indlæses
+    igen ved næste `use()`. En model der er i brug fjernes aldrig.
+    """
+
+    def __init__(self, reaper_interval=REAPER_INTERVAL):
+        self.models = {}
+        self.reaper_interval = reaper_interval
+        self._reaper = None
+        self._stop = threading.Event()
+
+    def register(self, name, load, unload=None, idle_ttl=None):
+        self.models[name] = ManagedModel(name, load, unload, idle_ttl if unload else None)
+        return self.models[name]
+
+    def ensure_loaded(self, name):
+        model = self.models.get(name)
+        if model is None:
+            return False
+        with model.lock:
+            if not model.loaded:
+                rss_before = metrics.process_rss_bytes()
+                start = time.perf_counter()
+                try:
+                    model.load()
+                except Exception as e:
+                    print(f"[FEJL] Kunne ikke indlæse {name}: {e}")
+                    metrics.record_error(f"load_{name}")
+                    return False
+                model.loaded = True
+                rss_after = metrics.process_rss_bytes()
+                if rss_before is not None and rss_after is not None:
+                    model.rss_bytes = max(rss_after - rss_before, 0)
+                    metrics.MODEL_MEMORY.set(model.rss_bytes, model=name)
+                print(f"[INFO] {name} indlæst på {time.perf_counter() - start:.2f}s"
+                      f"{f' (+{model.rss_bytes / 1024 ** 2:.0f} MB RSS)' if model.rss_bytes else ''}.")
+            model.last_used = time.monotonic()
+        return True
+
+    @contextmanager
+    def use(self, name):
+        """Sørg for at modellen er indlæst og beskyt den mod at blive fjernet imens"""
+        model = self.models.get(name)
+        if model is None:
+            # Ikke administreret (fx sat direkte af et benchmark) - brug som den er
+            yield False
+            return
+        with model.lock:
+            loaded = self.ensure_loaded(name)
+            model.in_use += 1
+        try:
+            yield loaded
+        finally:
+            with model.lock:
+                model.in_use -= 1
+                model.last_used = time.monotonic()
+
+    def unload(self, name):
+        model = self.models.get(name)
+        if model is None or model.unload is None:
+            return False
+        with model.lock:
+            if not model.loaded or model.in_use:
+                return False
+            model.unload()
+            model.loaded = False
+            model.rss_bytes = None
+            metrics.MODEL_MEMORY.set(0, model=name)
+        gc.collect()
+        print(f"[INFO] {name} fjernet fra hukommelsen (inaktiv i mere end {model.idle_ttl:.0f}s).")
+        return True
+
+    def reap(self):
+        now = time.monotonic()
+        for name, model in self.models.items():
+            if model.loaded and model.idle_ttl is not None and not model.in_use \
+                    and now - model.last_used > model.idle_ttl:
+                self.unload(name)
+
+    def start_reaper(self):
+        if self._reaper or not any(m.idle_ttl is not None for m in self.models.values()):
+            return
+        def run():
+            while not self._stop.wait(self.reaper_interval):
+                self.reap()
+        self._reaper = threading.Thread(target=run, name="jarvis-model-reaper", daemon=True)
+        self._reaper.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def report(self, budget_bytes=None):
+        """Udskriv hukommelsesbudget: RSS pr. model, processens RSS og systemets RAM"""
+        rss = metrics.process_rss_bytes()
+        total = total_memory_bytes()
+        mb = lambda b: f"{b / 1024 ** 2:7.0f} MB" if b is not None else "      ? MB"
+        print("[INFO] Hukommelsesbudget:")
+        for name, model in self.models.items():
+            policy = f"fjernes efter {model.idle_ttl:.0f}s" if model.idle_ttl is not None else "altid indlæst"
+            state = "indlæst" if model.loaded else "ikke indlæst"
+            print(f"   {name:<12} {mb(model.rss_bytes)}  ({state}, {policy})")
+        print(f"   {'proces':<12} {mb(rss)}")
+        if total:
+            print(f"   {'system':<12} {mb(total)}")
+        if budget_bytes and rss and rss > budget_bytes:
+            print(f"[ADVARSEL] Processen bruger {mb(rss).strip()} - over budgettet på {mb(budget_bytes).strip()}.")
+        return {"models": {n: m.rss_bytes for n, m in self.models.items()}, "process": rss, "system": total}
+
+
+def total_memory_bytes():
+    try:
+        import psutil
+        return psutil.virtual_memory().total
+    except ImportError:
+        pass
+    try:
+        import os
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, AttributeError, OSError):
+        return None
@@ -1,35 +1,210 @@
 import json
 import os
+import shutil
+import hashlib
+import argparse
+import datetime
+import numpy as np
 import joblib
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.linear_model import LogisticRegression
 from sklearn.pipeline import Pipeline
+from sklearn.model_selection import GridSearchCV, StratifiedKFold
+from turn_trace import file_version
 
 # Sti til data og model
 DATA_PATH = "nlu_commands.json"
 MODEL_DIR = "models"
 MODEL_PATH = os.path.join(MODEL_DIR, "nlu_model.joblib")
 VECTORIZER_PATH = os.path.join(MODEL_DIR, "vectorizer.joblib")
+VERSIONS_DIR = os.path.join(MODEL_DIR, "nlu")  # <version>/ + CURRENT-pointer
 
-# 1. Indlæs træningsdata
-with open(DATA_PATH, "r", encoding="utf-8") as f:
-    data = json.load(f)
-
-X = []
-y = []
-for intent in data["intents"]:
-    for ex in intent["examples"]:
-        X.append(ex)
-        y.append(intent["intent"])
-
-# 2. Træn model
-vectorizer = TfidfVectorizer()
-X_vec = vectorizer.fit_transform(X)
-model = LogisticRegression(max_iter=1000)
-model.fit(X_vec, y)
-
-# 3. Gem model og vectorizer
-os.makedirs(MODEL_DIR, exist_ok=True)
-joblib.dump(model, MODEL_PATH)
-joblib.dump(vectorizer, VECTORIZER_PATH)
-print("[INFO] NLU-model og vectorizer gemt!")
+# Hyperparametre der afprøves ved --search (krydsvalidering parallelt med joblib)
+PARAM_GRID = {
+    "tfidf__ngram_range": [(1, 1), (1, 2)],
+    "tfidf__sublinear_tf": [False, True],
+    "clf__C": [0.5, 1.0, 4.0, 16.0],
+}
+DEFAULT_PARAMS = {"tfidf__ngram_range": (1, 1), "tfidf__sublinear_tf": False, "clf__C": 1.0}
+MAX_ITER = 1000
+CV_FOLDS = 5
+
+
+def load_training_data(path=DATA_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    X = []
+    y = []
+    for intent in data["intents"]:
+        for ex in intent["examples"]:
+            X.append(ex)
+            y.append(intent["intent"])
+    return X, y
+
+
+def data_hash(X, y):
+    h = hashlib.sha256()
+    for text, label in sorted(zip(X, y)):
+        h.update(f"{label}\t{text}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def current_version(versions_dir=VERSIONS_DIR):
+    try:
+        with open(os.path.join(versions_dir, "CURRENT"), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def read_nlu(version, versions_dir=VERSIONS_DIR):
+    """Indlæs en versioneret NLU-model (models/nlu/<version>/) eller de gamle filer i models/ til brug i Jarvis"""
+    model_dir = os.path.join(versions_dir, version) if version else MODEL_DIR
+    # mmap_mode: koefficient-arrays deles via page cache i stedet for at kopieres ind i processen
+    model = joblib.load(os.path.join(model_dir, "nlu_model.joblib"), mmap_mode="r")
+    vectorizer = joblib.load(os.path.join(model_dir, "vectorizer.joblib"), mmap_mode="r")
+    return model, vectorizer, version or file_version(os.path.join(model_dir, "nlu_model.joblib"))
+
+
+def load_version(version, versions_dir=VERSIONS_DIR):
+    version_dir = os.path.join(versions_dir, version)
+    with open(os.path.join(version_dir, "meta.json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    model = joblib.load(os.path.join(version_dir, "nlu_model.joblib"))
+    vectorizer = joblib.load(os.path.join(version_dir, "vectorizer.joblib"))
+    return model, vectorizer, meta
+
+
+def search_params(X, y, n_jobs=-1):
+    """Grid search med krydsvalidering fordelt over alle kerner"""
+    min_class = min(np.unique(y, return_counts=True)[1])
+    folds = max(2, min(CV_FOLDS, min_class))
+    pipeline = Pipeline([("tfidf", TfidfVectorizer()), ("clf", LogisticRegression(max_iter=MAX_ITER))])
+    search = GridSearchCV(pipeline, PARAM_GRID, cv=StratifiedKFold(folds, shuffle=True, random_state=42),
+                          n_jobs=n_jobs, scoring="accuracy")
+    search.fit(X, y)
+    print(f"[INFO] Bedste parametre ({folds}-fold CV, accuracy {search.best_score_:.3f}): {search.best_params_}")
+    return dict(search.best_params_), float(search.best_score_)
+
+
+def warm_start_coefficients(previous, vectorizer, classes):
+    """Flyt tidligere koefficienter ind i det nye vokabular (nye ord starter i 0)"""
+    old_model, old_vectorizer, _ = previous
+    if list(old_model.classes_) != list(classes):
+        return None
+    old_vocab = old_vectorizer.vocabulary_
+    coef = np.zeros((old_model.coef_.shape[0], len(vectorizer.vocabulary_)))
+    for term, new_idx in vectorizer.vocabulary_.items():
+        old_idx = old_vocab.get(term)
+        if old_idx is not None:
+            coef[:, new_idx] = old_model.coef_[:, old_idx]
+    return coef, np.array(old_model.intercept_)
+
+
+def train(X, y, params, previous=None):
+    """Fit vectorizer + LogisticRegression. Med `previous` warm-startes fra dens koefficienter"""
+    vectorizer = TfidfVectorizer(ngram_range=tuple(params["tfidf__ngram_range"]),
+                                 sublinear_tf=params["tfidf__sublinear_tf"])
+    X_vec = vectorizer.fit_transform(X)
+    model = LogisticRegression(max_iter=MAX_ITER, C=params["clf__C"])
+    warm = warm_start_coefficients(previous, vectorizer, np.unique(y)) if previous else None
+    if warm is not None:
+        model.set_params(warm_start=True)
+        model.coef_, model.intercept_ = warm
+        model.classes_ = np.unique(y)
+    model.fit(X_vec, y)
+    print(f"[INFO] Trænet på {len(X)} eksempler ({'warm start' if warm is not None else 'fra bunden'}, "
+          f"{int(np.max(model.n_iter_))} iterationer).")
+    return model, vectorizer
+
+
+def write_version(model, vectorizer, meta, versions_dir=VERSIONS_DIR):
+    """Gem som versioneret, indholds-hashet artefakt og flyt CURRENT atomisk"""
+    os.makedirs(versions_dir, exist_ok=True)
+    staging = os.path.join(versions_dir, f".staging-{os.getpid()}")
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    joblib.dump(model, os.path.join(staging, "nlu_model.joblib"))
+    joblib.dump(vectorizer, os.path.join(staging, "vectorizer.joblib"))
+
+    h = hashlib.sha256()
+    for name in ("nlu_model.joblib", "vectorizer.joblib"):
+        with open(os.path.join(staging, name), "rb") as f:
+            h.update(f.read())
+    version = h.hexdigest()[:12]
+    meta = {**meta, "version": version}
+    with open(os.path.join(staging, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    version_dir = os.path.join(versions_dir, version)
+    if os.path.exists(version_dir):
+        shutil.rmtree(staging)  # Samme indhold er allerede gemt
+    else:
+        os.replace(staging, version_dir)
+
+    tmp_pointer = os.path.join(versions_dir, f".CURRENT-{os.getpid()}")
+    with open(tmp_pointer, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp_pointer, os.path.join(versions_dir, "CURRENT"))
+
+    # Bagudkompatible kopier til scripts der læser de gamle stier
+    for name, legacy in (("nlu_model.joblib", MODEL_PATH), ("vectorizer.joblib", VECTORIZER_PATH)):
+        shutil.copyfile(os.path.join(version_dir, name), legacy + ".tmp")
+        os.replace(legacy + ".tmp", legacy)
+    return version
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Træner NLU-modellen (TF-IDF + LogisticRegression)")
+    parser.add_argument("--data", default=DATA_PATH)
+    parser.add_argument("--search", action="store_true",
+                        help="Kør parallel grid search med krydsvalidering før træning")
+    parser.add_argument("--full", action="store_true", help="Træn fra bunden (ingen warm start)")
+    parser.add_argument("--jobs", type=int, default=-1, help="Antal kerner til søgningen (-1 = alle)")
+    args = parser.parse_args()
+
+    # 1. Indlæs træningsdata
+    X, y = load_training_data(args.data)
+    digest = data_hash(X, y)
+
+    previous = None
+    version = current_version()
+    if version:
+        try:
+            previous = load_version(version)
+        except (OSError, ValueError) as e:
+            print(f"[ADVARSEL] Kunne ikke indlæse version {version}: {e}")
+    # --full og --search træner altid, også når data er uændret
+    if previous and previous[2].get("data_hash") == digest and not (args.search or args.full):
+        print(f"[INFO] Træningsdata uændret - version {version} er allerede aktuel.")
+        return
+
+    # 2. Vælg hyperparametre
+    if args.search:
+        params, cv_score = search_params(X, y, n_jobs=args.jobs)
+    else:
+        params = dict(previous[2]["params"]) if previous else dict(DEFAULT_PARAMS)
+        cv_score = previous[2].get("cv_score") if previous else None
+
+    # 3. Træn model - warm start når kun eksempler er tilføjet og parametrene er de samme
+    can_warm_start = (previous is not None and not args.full and not args.search
+                      and set(previous[0].classes_) == set(y))
+    model, vectorizer = train(X, y, params, previous if can_warm_start else None)
+
+    # 4. Gem versioneret model og flyt CURRENT
+    meta = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "data_hash": digest,
+        "examples": len(X),
+        "intents": sorted(set(y)),
+        "params": {k: list(v) if isinstance(v, tuple) else v for k, v in params.items()},
+        "cv_score": cv_score,
+        "parent": version,
+        "warm_start": bool(can_warm_start),
+    }
+    new_version = write_version(model, vectorizer, meta)
+    print(f"[INFO] NLU-model version {new_version} gemt og sat som aktuel.")
+
+
+if __name__ == "__main__":
+    main()
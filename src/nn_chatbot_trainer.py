@@ -1,13 +1,21 @@
 # Forbedret neural net chatbot-træner til danske spørgsmål/svar-par
-# Kræver: pip install tensorflow scikit-learn
+# Kræver: pip install tensorflow scikit-learn (matplotlib kun til --plot)
+#
+#   python src/nn_chatbot_trainer.py                         # NumPy-arrays, batch_size=8 (som hidtil)
+#   python src/nn_chatbot_trainer.py --tfdata --intra-op 8   # tf.data med bucketing og prefetch
+#   python src/nn_chatbot_trainer.py --tfdata --batch-schedule 8:10,32:20,128:70 --plot
 
 import json
+import time
+import argparse
 import numpy as np
 import os
-import matplotlib.pyplot as plt
+import pickle
+import tensorflow as tf
 from tensorflow import keras
 from sklearn.preprocessing import LabelEncoder
 from sklearn.model_selection import train_test_split
+from chatbot_eval import evaluate, print_report
 
 # --- Konfiguration (justerbare hyperparametre) ---
 EPOCHS = 100
@@ -19,176 +27,336 @@ PATIENCE = 10       # Tidlig stop - antal epochs uden forbedring
 VALIDATION_SPLIT = 0.2
 RANDOM_SEED = 42
 VERBOSE = 1
+BUCKET_COUNT = 4    # Antal længde-buckets i tf.data mode (grænser sættes ved kvantiler)
+DATA_PATH = "conversation_pairs.json"
+
+
+def parse_batch_schedule(spec):
+    """'8:10,32:20,128' -> [(8, 10), (32, 20), (128, None)] - None = resten af EPOCHS"""
+    schedule = []
+    for part in spec.split(","):
+        size, _, epochs = part.partition(":")
+        schedule.append((int(size), int(epochs) if epochs else None))
+    return schedule
+
+
+class EpochTimer(keras.callbacks.Callback):
+    """Måler tid pr. epoch og samples/s"""
+
+    def __init__(self, samples):
+        super().__init__()
+        self.samples = samples
+        self.epoch_seconds = []
+        self._start = None
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._start = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        seconds = time.perf_counter() - self._start
+        self.epoch_seconds.append(seconds)
+        print(f"[INFO] Epoch {epoch + 1}: {seconds:.2f}s, {self.samples / seconds:.0f} samples/s")
+
+    def summary(self):
+        if not self.epoch_seconds:
+            return {}
+        # Første epoch indeholder graf-opbygning og tæller ikke med i gennemsnittet
+        steady = self.epoch_seconds[1:] or self.epoch_seconds
+        mean = float(np.mean(steady))
+        return {
+            "epochs": len(self.epoch_seconds),
+            "total_seconds": round(float(np.sum(self.epoch_seconds)), 2),
+            "first_epoch_seconds": round(self.epoch_seconds[0], 3),
+            "mean_epoch_seconds": round(mean, 3),
+            "samples_per_second": round(self.samples / mean, 1),
+        }
+
+
+def configure_threads(inter_op, intra_op):
+    """Skal kaldes før TensorFlow udfører den første operation"""
+    if inter_op:
+        tf.config.threading.set_inter_op_parallelism_threads(inter_op)
+    if intra_op:
+        tf.config.threading.set_intra_op_parallelism_threads(intra_op)
+    print(f"[INFO] TensorFlow tråde: inter-op {tf.config.threading.get_inter_op_parallelism_threads() or 'auto'}, "
+          f"intra-op {tf.config.threading.get_intra_op_parallelism_threads() or 'auto'}")
+
+
+def build_model(vocab_size, num_classes, input_length=None, mask_zero=False):
+    return keras.Sequential([
+        # Input-lag. Med mask_zero ignoreres padding, så batches kan have forskellig længde
+        keras.layers.Embedding(input_dim=vocab_size,
+                               output_dim=EMBEDDING_DIM,
+                               input_length=input_length,
+                               mask_zero=mask_zero),
+
+        # Forbedret feature-ekstraktion med bidirectional LSTM
+        keras.layers.Bidirectional(keras.layers.LSTM(EMBEDDING_DIM, return_sequences=True)),
+        keras.layers.Dropout(DROPOUT_RATE),  # Dropout for at undgå overfitting
+
+        # Attention-mekanisme
+        keras.layers.GlobalAveragePooling1D(),
+
+        # Første Dense-lag
+        keras.layers.Dense(HIDDEN_UNITS, activation="relu"),
+        keras.layers.Dropout(DROPOUT_RATE),  # Endnu et dropout-lag
+
+        # Output-lag
+        keras.layers.Dense(num_classes, activation="softmax")
+    ])
 
-# --- Opret model-mappe hvis den ikke findes ---
-os.makedirs("models", exist_ok=True)
-
-# 1. Indlæs data
-print("[INFO] Indlæser og forbereder data...")
-with open("conversation_pairs.json", "r", encoding="utf-8") as f:
-    pairs = json.load(f)
-
-# Tjek for tom data
-if not pairs:
-    print("[FEJL] Ingen data fundet i conversation_pairs.json!")
-    exit(1)
-
-print(f"[INFO] Indlæste {len(pairs)} samtalepar")
-
-questions = [pair["user"] for pair in pairs]
-answers = [pair["jarvis"] for pair in pairs]
-
-# 2. Tekst til tal (tokenizer) - forbedret med danske stop-words
-tokenizer = keras.preprocessing.text.Tokenizer(char_level=False)
-tokenizer.fit_on_texts(questions)
-X = tokenizer.texts_to_sequences(questions)
-X = keras.preprocessing.sequence.pad_sequences(X, padding="post")
-
-# 3. Label encode svar
-le = LabelEncoder()
-y = le.fit_transform(answers)
-
-# 4. Split data
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=VALIDATION_SPLIT, random_state=RANDOM_SEED)
-
-print(f"[INFO] Vokabular-størrelse: {len(tokenizer.word_index)+1}")
-print(f"[INFO] Antal klasser (unikke svar): {len(set(y))}")
-print(f"[INFO] Træningssæt størrelse: {len(X_train)}")
-print(f"[INFO] Testsæt størrelse: {len(X_test)}")
-
-# 5. Byg og træn model - forbedret arkitektur
-print("[INFO] Bygger og træner model...")
-model = keras.Sequential([
-    # Input-lag
-    keras.layers.Embedding(input_dim=len(tokenizer.word_index)+1, 
-                          output_dim=EMBEDDING_DIM, 
-                          input_length=X.shape[1]),
-    
-    # Forbedret feature-ekstraktion med bidirectional LSTM
-    keras.layers.Bidirectional(keras.layers.LSTM(EMBEDDING_DIM, return_sequences=True)),
-    keras.layers.Dropout(DROPOUT_RATE),  # Dropout for at undgå overfitting
-    
-    # Attention-mekanisme
-    keras.layers.GlobalAveragePooling1D(),
-    
-    # Første Dense-lag
-    keras.layers.Dense(HIDDEN_UNITS, activation="relu"),
-    keras.layers.Dropout(DROPOUT_RATE),  # Endnu et dropout-lag
-    
-    # Output-lag
-    keras.layers.Dense(len(set(y)), activation="softmax")
-])
-
-# Model-opsummering
-model.summary()
-
-# Compile model med forbedrede metrics
-model.compile(
-    loss="sparse_categorical_crossentropy", 
-    optimizer=keras.optimizers.Adam(learning_rate=0.001),
-    metrics=["accuracy"]
-)
-
-# Callbacks for tidlig stop og model-checkpoint
-callbacks = [
-    keras.callbacks.EarlyStopping(
-        monitor='val_loss',
-        patience=PATIENCE,
-        restore_best_weights=True,
-        verbose=1
-    ),
-    keras.callbacks.ReduceLROnPlateau(
-        monitor='val_loss',
-        factor=0.5,
-        patience=5,
-        verbose=1
+
+def bucketed_dataset(sequences, labels, batch_size, boundaries, shuffle):
+    """tf.data pipeline: sekvenser grupperes efter længde og paddes kun til bucketens længste"""
+
+    def generator():
+        for seq, label in zip(sequences, labels):
+            yield np.asarray(seq, dtype=np.int32), np.int32(label)
+
+    dataset = tf.data.Dataset.from_generator(generator, output_signature=(
+        tf.TensorSpec(shape=(None,), dtype=tf.int32),
+        tf.TensorSpec(shape=(), dtype=tf.int32),
+    )).cache()
+    if shuffle:
+        dataset = dataset.shuffle(len(sequences), seed=RANDOM_SEED, reshuffle_each_iteration=True)
+    dataset = dataset.bucket_by_sequence_length(
+        element_length_func=lambda seq, label: tf.shape(seq)[0],
+        bucket_boundaries=boundaries,
+        bucket_batch_sizes=[batch_size] * (len(boundaries) + 1),
     )
-]
-
-# Træn modellen med callbacks
-print("[INFO] Træner model...")
-history = model.fit(
-    X_train, y_train, 
-    epochs=EPOCHS, 
-    batch_size=BATCH_SIZE, 
-    validation_data=(X_test, y_test), 
-    verbose=VERBOSE,
-    callbacks=callbacks
-)
-
-# 6. Evaluering og visualisering
-print("[INFO] Evaluerer model...")
-test_loss, test_acc = model.evaluate(X_test, y_test, verbose=0)
-print(f"[RESULTAT] Test accuracy: {test_acc:.4f}")
-print(f"[RESULTAT] Test loss: {test_loss:.4f}")
-
-# Plot training history
-plt.figure(figsize=(12, 4))
-
-# Plot accuracy
-plt.subplot(1, 2, 1)
-plt.plot(history.history['accuracy'], label='Train')
-plt.plot(history.history['val_accuracy'], label='Validation')
-plt.title('Model Accuracy')
-plt.xlabel('Epoch')
-plt.ylabel('Accuracy')
-plt.legend()
-
-# Plot loss
-plt.subplot(1, 2, 2)
-plt.plot(history.history['loss'], label='Train')
-plt.plot(history.history['val_loss'], label='Validation')
-plt.title('Model Loss')
-plt.xlabel('Epoch')
-plt.ylabel('Loss')
-plt.legend()
-
-# Gem plot
-plt.tight_layout()
-plt.savefig('models/nn_chatbot_training_history.png')
-print("[INFO] Træningshistorik gemt som 'models/nn_chatbot_training_history.png'")
-
-# 7. Test model med et par eksempler
-print("\n[INFO] Tester model med nogle eksempler...")
-for i in range(min(5, len(X_test))):
-    # Lav prediction
-    pred = model.predict(np.expand_dims(X_test[i], 0), verbose=0)
-    pred_class = np.argmax(pred)
-    confidence = pred[0][pred_class]
-    
-    # Original tekst
-    test_sequence = X_test[i]
-    words = []
-    for idx in test_sequence:
-        if idx != 0:  # Skip padding
-            for word, word_idx in tokenizer.word_index.items():
-                if word_idx == idx:
-                    words.append(word)
-                    break
-    original_text = " ".join(words)
-    
-    # Vis resultat
-    print(f"Input: '{original_text}'")
-    print(f"Predicted answer: '{le.inverse_transform([pred_class])[0]}'")
-    print(f"Confidence: {confidence:.2f}")
-    print(f"True answer: '{le.inverse_transform([y_test[i]])[0]}'")
-    print("-" * 40)
-
-# 8. Gem alt
-print("[INFO] Gemmer model og relaterede data...")
-model.save("models/nn_chatbot.h5")
-import pickle
-with open("models/nn_tokenizer.pkl", "wb") as f:
-    pickle.dump(tokenizer, f)
-with open("models/nn_labelencoder.pkl", "wb") as f:
-    pickle.dump(le, f)
-
-# 9. Gem model med softmax allerede anvendt (som i TensorFlow eksemplet)
-probability_model = keras.Sequential([
-    model,
-    keras.layers.Softmax()  # Selvom den allerede har softmax, sikrer dette konsistent output
-])
-probability_model.save("models/nn_chatbot_with_softmax.h5")
-
-print("[INFO] Neural net chatbot er trænet og gemt!")
-print("[INFO] For at bruge modellen, indlæs 'models/nn_chatbot.h5', 'models/nn_tokenizer.pkl' og 'models/nn_labelencoder.pkl'")
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+
+def length_boundaries(sequences, buckets=BUCKET_COUNT):
+    lengths = np.array([max(len(seq), 1) for seq in sequences])
+    quantiles = np.quantile(lengths, np.linspace(0, 1, buckets + 1)[1:-1])
+    return sorted({int(q) + 1 for q in quantiles})
+
+
+class _KeepStateAcrossPhases:
+    """Nulstiller kun ved første fit: batch-skemaets faser er én træning, så bedste
+    val_loss og ventetid fortsætter fra fase til fase i stedet for at starte forfra"""
+
+    _started = False
+
+    def on_train_begin(self, logs=None):
+        if not self._started:
+            self._started = True
+            super().on_train_begin(logs)
+
+
+class PhasedEarlyStopping(_KeepStateAcrossPhases, keras.callbacks.EarlyStopping):
+    pass
+
+
+class PhasedReduceLROnPlateau(_KeepStateAcrossPhases, keras.callbacks.ReduceLROnPlateau):
+    pass
+
+
+def make_callbacks():
+    return [
+        PhasedEarlyStopping(
+            monitor='val_loss',
+            patience=PATIENCE,
+            restore_best_weights=True,
+            verbose=1
+        ),
+        PhasedReduceLROnPlateau(
+            monitor='val_loss',
+            factor=0.5,
+            patience=5,
+            verbose=1
+        )
+    ]
+
+
+def plot_history(history, path="models/nn_chatbot_training_history.png"):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(12, 4))
+
+    # Plot accuracy
+    plt.subplot(1, 2, 1)
+    plt.plot(history['accuracy'], label='Train')
+    plt.plot(history['val_accuracy'], label='Validation')
+    plt.title('Model Accuracy')
+    plt.xlabel('Epoch')
+    plt.ylabel('Accuracy')
+    plt.legend()
+
+    # Plot loss
+    plt.subplot(1, 2, 2)
+    plt.plot(history['loss'], label='Train')
+    plt.plot(history['val_loss'], label='Validation')
+    plt.title('Model Loss')
+    plt.xlabel('Epoch')
+    plt.ylabel('Loss')
+    plt.legend()
+
+    # Gem plot
+    plt.tight_layout()
+    plt.savefig(path)
+    print(f"[INFO] Træningshistorik gemt som '{path}'")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Træner NN chatbotten på conversation_pairs.json")
+    parser.add_argument("--data", default=DATA_PATH)
+    parser.add_argument("--tfdata", action="store_true",
+                        help="tf.data pipeline med bucketing efter sekvenslængde og prefetch")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--batch-schedule", default=None,
+                        help="Voksende batchstørrelse, fx '8:10,32:20,128' (størrelse:epochs, sidste = resten)")
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--inter-op", type=int, default=0, help="TensorFlow inter-op tråde (0 = auto)")
+    parser.add_argument("--intra-op", type=int, default=0, help="TensorFlow intra-op tråde (0 = auto)")
+    parser.add_argument("--plot", action="store_true", help="Gem træningskurver som PNG efter træning")
+    args = parser.parse_args()
+
+    configure_threads(args.inter_op, args.intra_op)
+
+    # --- Opret model-mappe hvis den ikke findes ---
+    os.makedirs("models", exist_ok=True)
+
+    # 1. Indlæs data
+    print("[INFO] Indlæser og forbereder data...")
+    with open(args.data, "r", encoding="utf-8") as f:
+        pairs = json.load(f)
+
+    # Tjek for tom data
+    if not pairs:
+        print(f"[FEJL] Ingen data fundet i {args.data}!")
+        exit(1)
+
+    print(f"[INFO] Indlæste {len(pairs)} samtalepar")
+
+    questions = [pair["user"] for pair in pairs]
+    answers = [pair["jarvis"] for pair in pairs]
+
+    # 2. Tekst til tal (tokenizer)
+    tokenizer = keras.preprocessing.text.Tokenizer(char_level=False)
+    tokenizer.fit_on_texts(questions)
+    sequences = tokenizer.texts_to_sequences(questions)
+    X = keras.preprocessing.sequence.pad_sequences(sequences, padding="post")
+
+    # 3. Label encode svar
+    le = LabelEncoder()
+    y = le.fit_transform(answers)
+
+    # 4. Split data
+    train_idx, test_idx = train_test_split(np.arange(len(X)), test_size=VALIDATION_SPLIT, random_state=RANDOM_SEED)
+    X_train, X_test, y_train, y_test = X[train_idx], X[test_idx], y[train_idx], y[test_idx]
+
+    vocab_size = len(tokenizer.word_index) + 1
+    print(f"[INFO] Vokabular-størrelse: {vocab_size}")
+    print(f"[INFO] Antal klasser (unikke svar): {len(le.classes_)}")
+    print(f"[INFO] Træningssæt størrelse: {len(X_train)}")
+    print(f"[INFO] Testsæt størrelse: {len(X_test)}")
+
+    # 5. Byg og træn model
+    print("[INFO] Bygger og træner model...")
+    if args.tfdata:
+        # Variabel sekvenslængde: padding maskeres, så modellen er uafhængig af hvor meget der paddes
+        model = build_model(vocab_size, len(le.classes_), input_length=None, mask_zero=True)
+    else:
+        model = build_model(vocab_size, len(le.classes_), input_length=X.shape[1])
+    model.build((None, None if args.tfdata else X.shape[1]))
+
+    # Model-opsummering
+    model.summary()
+
+    # Compile model med forbedrede metrics
+    model.compile(
+        loss="sparse_categorical_crossentropy",
+        optimizer=keras.optimizers.Adam(learning_rate=0.001),
+        metrics=["accuracy"]
+    )
+
+    schedule = parse_batch_schedule(args.batch_schedule) if args.batch_schedule else [(args.batch_size, None)]
+    timer = EpochTimer(len(X_train))
+    history = {}
+    epoch = 0
+    print("[INFO] Træner model...")
+    if args.tfdata:
+        train_seqs = [sequences[i] for i in train_idx]
+        test_seqs = [sequences[i] for i in test_idx]
+        boundaries = length_boundaries(train_seqs)
+        print(f"[INFO] tf.data: bucket-grænser {boundaries}, prefetch AUTOTUNE")
+        val_data = bucketed_dataset(test_seqs, y_test, max(size for size, _ in schedule), boundaries, shuffle=False)
+    else:
+        val_data = (X_test, y_test)
+
+    # Hver fase i batch-skemaet fortsætter hvor den forrige slap (initial_epoch) med de samme callbacks
+    callbacks = make_callbacks() + [timer]
+    for phase, (batch_size, phase_epochs) in enumerate(schedule):
+        end_epoch = args.epochs if phase_epochs is None else min(epoch + phase_epochs, args.epochs)
+        if end_epoch <= epoch:
+            break
+        if len(schedule) > 1:
+            print(f"[INFO] Fase {phase + 1}: batch_size={batch_size}, epoch {epoch + 1}-{end_epoch}")
+        fit_kwargs = dict(epochs=end_epoch, initial_epoch=epoch, validation_data=val_data,
+                          verbose=VERBOSE, callbacks=callbacks)
+        if args.tfdata:
+            train_data = bucketed_dataset(train_seqs, y_train, batch_size, boundaries, shuffle=True)
+            result = model.fit(train_data, **fit_kwargs)
+        else:
+            result = model.fit(X_train, y_train, batch_size=batch_size, **fit_kwargs)
+        for key, values in result.history.items():
+            history.setdefault(key, []).extend(values)
+        epoch = result.epoch[-1] + 1 if result.epoch else end_epoch
+        if model.stop_training or epoch < end_epoch:
+            print(f"[INFO] Tidlig stop efter epoch {epoch} - de resterende faser springes over")
+            break
+
+    stats = timer.summary()
+    if stats:
+        print(f"[RESULTAT] {stats['epochs']} epochs på {stats['total_seconds']:.1f}s - "
+              f"{stats['mean_epoch_seconds']:.2f}s/epoch, {stats['samples_per_second']:.0f} samples/s "
+              f"({'tf.data' if args.tfdata else 'numpy'})")
+
+    # 6. Evaluering
+    print("[INFO] Evaluerer model...")
+    if args.tfdata:
+        test_loss, test_acc = model.evaluate(val_data, verbose=0)
+    else:
+        test_loss, test_acc = model.evaluate(X_test, y_test, verbose=0)
+    print(f"[RESULTAT] Test accuracy: {test_acc:.4f}")
+    print(f"[RESULTAT] Test loss: {test_loss:.4f}")
+
+    with open("models/nn_chatbot_training_history.json", "w", encoding="utf-8") as f:
+        json.dump({"history": {k: [float(v) for v in vals] for k, vals in history.items()},
+                   "timing": stats, "pipeline": "tfdata" if args.tfdata else "numpy",
+                   "batch_schedule": schedule}, f, indent=2)
+    if args.plot:
+        plot_history(history)
+
+    # 7. Rapport over hele testsættet: top-k, forvekslinger, kalibrering og eksempler
+    print("\n[INFO] Evaluerer modellen på testsættet...")
+    report = evaluate(model, X_test, y_test, le, tokenizer, examples=5)
+    print_report(report)
+    with open("models/nn_chatbot_eval.json", "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    # 8. Gem alt
+    print("[INFO] Gemmer model og relaterede data...")
+    model.save("models/nn_chatbot.h5")
+    with open("models/nn_tokenizer.pkl", "wb") as f:
+        pickle.dump(tokenizer, f)
+    with open("models/nn_labelencoder.pkl", "wb") as f:
+        pickle.dump(le, f)
+
+    # 9. Gem model med softmax allerede anvendt (som i TensorFlow eksemplet)
+    probability_model = keras.Sequential([
+        model,
+        keras.layers.Softmax()  # Selvom den allerede har softmax, sikrer dette konsistent output
+    ])
+    probability_model.save("models/nn_chatbot_with_softmax.h5")
+
+    print("[INFO] Neural net chatbot er trænet og gemt!")
+    print("[INFO] For at bruge modellen, indlæs 'models/nn_chatbot.h5', 'models/nn_tokenizer.pkl' og 'models/nn_labelencoder.pkl'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import os
+import time
+import queue
+import sqlite3
+import threading
+import datetime
+
+NOTES_DB = os.path.join("data", "notes.db")
+# Gamle tekstfiler der importeres én gang (sti, type)
+LEGACY_FILES = [("noter.txt", "note"), (os.path.join("data", "notes.txt"), "note"), ("beskeder.txt", "message")]
+WRITE_BATCH_SIZE = 256
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    text TEXT NOT NULL,
+    speaker TEXT,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_kind_created ON entries(kind, created);
+CREATE TABLE IF NOT EXISTS imports (path TEXT PRIMARY KEY, imported REAL NOT NULL);
+"""
+
+# FTS5 som external content-tabel: teksten gemmes kun én gang, indekset holdes opdateret af triggers
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(
+    text, content='entries', content_rowid='id', tokenize='unicode61 remove_diacritics 0'
+);
+CREATE TRIGGER IF NOT EXISTS entries_ai AFTER INSERT ON entries BEGIN
+    INSERT INTO entries_fts(rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS entries_ad AFTER DELETE ON entries BEGIN
+    INSERT INTO entries_fts(entries_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+"""
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=10)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")  # Læsere blokeres ikke af skriveren
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def _fts_query(text):
+    """Brugerens søgeord som FTS5-forespørgsel: hvert ord citeret og med prefix-match"""
+    words = ["".join(ch for ch in word if ch.isalnum()) for word in text.split()]
+    return " ".join(f'"{word}"*' for word in words if word)
+
+
+class NotesStore:
+    """Noter og beskeder i SQLite (WAL) med FTS5-søgning.
+
+    Skrivninger lægges i en kø og skrives af én baggrundstråd, der samler
+    alt hvad der venter i én transaktion. Læsninger bruger en forbindelse pr.
+    tråd og venter først på at køen er tømt, så en note der lige er gemt
+    også kan læses op med det samme.
+    """
+
+    def __init__(self, path=NOTES_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = _connect(path)
+        conn.executescript(SCHEMA)
+        try:
+            conn.executescript(FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError:
+            print("[ADVARSEL] SQLite er bygget uden FTS5 - notesøgning bruger LIKE.")
+            self.fts = False
+        conn.commit()
+        conn.close()
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="jarvis-notes-writer", daemon=True)
+        self._writer.start()
+
+    def _reader(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = _connect(self.path)
+        return conn
+
+    def _write_loop(self):
+        conn = _connect(self.path)
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            while len(batch) < WRITE_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            rows = [row for row in batch if row is not None]
+            try:
+                if rows:
+                    with conn:
+                        conn.executemany("INSERT INTO entries(kind, text, speaker, created) VALUES (?, ?, ?, ?)",
+                                         rows)
+            except sqlite3.Error as e:
+                print(f"[FEJL] Kunne ikke gemme {len(rows)} noter: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if len(rows) < len(batch):  # None = stop
+                conn.close()
+                return
+
+    def add(self, text, kind="note", speaker=None, created=None):
+        """Læg en note/besked i skrivekøen (returnerer med det samme)"""
+        self._queue.put((kind, text, speaker, created if created is not None else time.time()))
+
+    def flush(self):
+        self._queue.join()
+
+    def close(self):
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join(timeout=5)
+
+    def recent(self, kind="note", limit=5, offset=0, speaker=None):
+        """De nyeste først, side for side"""
+        self.flush()
+        sql = "SELECT id, kind, text, speaker, created FROM entries WHERE kind = ?"
+        params = [kind]
+        if speaker:
+            sql += " AND speaker = ?"
+            params.append(speaker)
+        sql += " ORDER BY created DESC, id DESC LIMIT ? OFFSET ?"
+        return [dict(row) for row in self._reader().execute(sql, params + [limit, offset])]
+
+    def search(self, query, kind="note", limit=5, offset=0, speaker=None):
+        """Fuldtekstsøgning - bedste match først (bm25), derefter nyeste"""
+        self.flush()
+        if self.fts:
+            match = _fts_query(query)
+            if not match:
+                return []
+            sql = ("SELECT e.id, e.kind, e.text, e.speaker, e.created FROM entries_fts "
+                   "JOIN entries e ON e.id = entries_fts.rowid WHERE entries_fts MATCH ? AND e.kind = ?")
+            params = [match, kind]
+            order = " ORDER BY entries_fts.rank, e.created DESC"
+        else:
+            sql = "SELECT id, kind, text, speaker, created FROM entries e WHERE text LIKE ? AND kind = ?"
+            params = [f"%{query}%", kind]
+            order = " ORDER BY created DESC"
+        if speaker:
+            sql += " AND e.speaker = ?"
+            params.append(speaker)
+        sql += order + " LIMIT ? OFFSET ?"
+        return [dict(row) for row in self._reader().execute(sql, params + [limit, offset])]
+
+    def count(self, kind="note"):
+        self.flush()
+        return self._reader().execute("SELECT COUNT(*) FROM entries WHERE kind = ?", (kind,)).fetchone()[0]
+
+    def import_legacy(self, files=LEGACY_FILES):
+        """Importér gamle tekstfiler én gang. Linjerne får filens mtime som tidspunkt"""
+        conn = self._reader()
+        for path, kind in files:
+            key = os.path.abspath(path)
+            if not os.path.exists(path):
+                continue
+            if conn.execute("SELECT 1 FROM imports WHERE path = ?", (key,)).fetchone():
+                continue
+            mtime = os.path.getmtime(path)
+            with open(path, "r", encoding="utf-8") as f:
+                lines = [line.strip() for line in f if line.strip()]
+            with conn:
+                conn.executemany("INSERT INTO entries(kind, text, speaker, created) VALUES (?, ?, NULL, ?)",
+                                 [(kind, line, mtime) for line in lines])
+                conn.execute("INSERT INTO imports(path, imported) VALUES (?, ?)", (key, time.time()))
+            print(f"[INFO] {len(lines)} linjer importeret fra {path} til {self.path}.")
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path=NOTES_DB, legacy_files=LEGACY_FILES):
+    """Én NotesStore (og dermed én skrivetråd) pr. databasefil. Gamle tekstfiler importeres ved oprettelse"""
+    key = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = NotesStore(path)
+            store.import_legacy(legacy_files)
+        return store
+
+
+def format_entries(entries):
+    """Noter som tekst til oplæsning: '1. (24/05 14:30) køb mælk'"""
+    lines = []
+    for i, entry in enumerate(entries, 1):
+        stamp = datetime.datetime.fromtimestamp(entry["created"]).strftime("%d/%m %H:%M")
+        lines.append(f"{i}. ({stamp}) {entry['text']}")
+    return "\n".join(lines)
@@ -0,0 +1,53 @@
+import time
+import threading
+from collections import OrderedDict
+
+import metrics
+
+RESPONSE_CACHE_SIZE = 1024
+RESPONSE_CACHE_TTL = 3600  # Sekunder
+
+
+class ResponseCache:
+    """LRU-cache med TTL til færdige svar.
+
+    Nøglen er kommandoen (som pipelinen ser den) plus versionerne af de modeller og
+    samtalepar svaret kom fra, så en ny version aldrig rammer et gammelt svar.
+    Hits og misses tælles i CACHE_HITS/CACHE_MISSES med cache="<name>".
+    """
+
+    def __init__(self, maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL, name="response"):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and now - item[0] > self.ttl:
+                del self._items[key]
+                item = None
+            if item is not None:
+                self._items.move_to_end(key)
+        if item is None:
+            metrics.CACHE_MISSES.inc(cache=self.name)
+            return None
+        metrics.CACHE_HITS.inc(cache=self.name)
+        return item[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = (time.monotonic(), value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
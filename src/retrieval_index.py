@@ -0,0 +1,79 @@
+import os
+import json
+import hashlib
+import numpy as np
+import joblib
+from scipy.sparse import csr_matrix
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+INDEX_DIR = os.path.join("data", "index")
+SIMILARITY_THRESHOLD = 0.4
+
+
+def pairs_fingerprint(pairs):
+    h = hashlib.sha1()
+    for pair in pairs:
+        h.update(pair["user"].encode("utf-8"))
+        h.update(b"\x00")
+        h.update(pair["jarvis"].encode("utf-8"))
+        h.update(b"\x01")
+    return h.hexdigest()
+
+
+class RetrievalIndex:
+    """TF-IDF-indeks over spørgsmålene i conversation_pairs.json.
+
+    Vectorizeren fittes én gang i stedet for ved hvert opslag. Matricen er
+    L2-normaliseret (TfidfVectorizer's standard), så cosinus-lighed er et
+    enkelt sparse matrix-vektor produkt. Indekset kan gemmes som rå NumPy
+    CSR-arrays og indlæses med mmap, så flere worker-processer deler de samme
+    sider i page cache.
+    """
+
+    def __init__(self, vectorizer, matrix, answers, fingerprint):
+        self.vectorizer = vectorizer
+        self.matrix = matrix
+        self.answers = answers
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def build(cls, pairs):
+        questions = [pair["user"] for pair in pairs]
+        vectorizer = TfidfVectorizer()
+        matrix = vectorizer.fit_transform(questions).tocsr().astype(np.float32)
+        return cls(vectorizer, matrix, [pair["jarvis"] for pair in pairs], pairs_fingerprint(pairs))
+
+    def query(self, text, threshold=SIMILARITY_THRESHOLD):
+        """Bedste svar og dets lighed, eller (None, lighed) hvis under tærsklen"""
+        scores = self.query_many([text])[0]
+        if scores.size == 0:
+            return None, 0.0
+        best = int(scores.argmax())
+        score = float(scores[best])
+        return (self.answers[best] if score >= threshold else None), score
+
+    def query_many(self, texts):
+        """Cosinus-lighed for flere tekster på én gang: (len(texts), antal spørgsmål)"""
+        user_tfidf = self.vectorizer.transform(texts).astype(np.float32)
+        return np.asarray((user_tfidf @ self.matrix.T).todense())
+
+    def save(self, index_dir=INDEX_DIR):
+        os.makedirs(index_dir, exist_ok=True)
+        np.save(os.path.join(index_dir, "data.npy"), self.matrix.data)
+        np.save(os.path.join(index_dir, "indices.npy"), self.matrix.indices)
+        np.save(os.path.join(index_dir, "indptr.npy"), self.matrix.indptr)
+        joblib.dump(self.vectorizer, os.path.join(index_dir, "vectorizer.joblib"))
+        with open(os.path.join(index_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"shape": list(self.matrix.shape), "fingerprint": self.fingerprint,
+                       "answers": self.answers}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, index_dir=INDEX_DIR, mmap=True):
+        mode = "r" if mmap else None
+        with open(os.path.join(index_dir, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = [np.load(os.path.join(index_dir, name), mmap_mode=mode)
+                  for name in ("data.npy", "indices.npy", "indptr.npy")]
+        matrix = csr_matrix(tuple(arrays), shape=tuple(meta["shape"]), copy=False)
+        vectorizer = joblib.load(os.path.join(index_dir, "vectorizer.joblib"), mmap_mode=mode)
+        return cls(vectorizer, matrix, meta["answers"], meta["fingerprint"])
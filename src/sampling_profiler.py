@@ -0,0 +1,156 @@
+import os
+import sys
+import time
+import signal
+import datetime
+import threading
+import collections
+
+PROFILE_DIR = os.path.join("logs", "profiles")
+SAMPLE_INTERVAL = 0.01  # 100 Hz - lav overhead, men nok samples til en tur på ~1-5 s
+MAX_STACK_DEPTH = 64
+
+
+class SamplingProfiler:
+    """Stack-sampler der kører på en baggrundstråd.
+
+    Med `sys._current_frames()` tages et snapshot af alle tråde (hovedloopet og
+    executor-trådene) hvert SAMPLE_INTERVAL. Stakkene tælles i collapsed-format
+    ("tråd;modul:funktion;...  antal"), som kan gives direkte til flamegraph.pl
+    eller speedscope. I "turn"-mode skrives en fil pr. tur, i "window"-mode en
+    fil når profileringen stoppes (eller efter `seconds`).
+    """
+
+    def __init__(self, profile_dir=PROFILE_DIR, interval=SAMPLE_INTERVAL):
+        self.profile_dir = profile_dir
+        self.interval = interval
+        self.mode = None
+        self._stacks = collections.Counter()
+        self._samples = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._deadline = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, mode="window", seconds=None):
+        """Start sampling. mode: "window" (én fil ved stop) eller "turn" (én fil pr. tur)"""
+        if mode not in ("window", "turn"):
+            raise ValueError(f"Ukendt profiler-mode: {mode}")
+        if self.running:
+            return False
+        self.mode = mode
+        self._deadline = time.monotonic() + seconds if seconds else None
+        with self._lock:
+            self._stacks.clear()
+            self._samples = 0
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="jarvis-profiler", daemon=True)
+        self._thread.start()
+        print(f"[INFO] Sampling-profiler startet ({mode}-mode, {1 / self.interval:.0f} Hz).")
+        return True
+
+    def stop(self):
+        """Stop sampling og returner stien til den sidste dump (hvis nogen)"""
+        if not self.running:
+            return None
+        self._stop.set()
+        if threading.current_thread() is not self._thread:
+            self._thread.join(timeout=2.0)
+        self._thread = None
+        path = self.dump("window") if self.mode == "window" else None
+        print("[INFO] Sampling-profiler stoppet.")
+        self.mode = None
+        return path
+
+    def toggle(self, *args):
+        """Signal-handler venlig: starter eller stopper (window-mode)"""
+        if self.running:
+            self.stop()
+        else:
+            self.start("window")
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, frame in frames.items():
+                    if thread_id == own_id:
+                        continue
+                    self._stacks[self._collapse(names.get(thread_id, str(thread_id)), frame)] += 1
+                self._samples += 1
+            if self._deadline and time.monotonic() >= self._deadline:
+                self._deadline = None
+                threading.Thread(target=self.stop, daemon=True).start()
+                break
+
+    @staticmethod
+    def _collapse(thread_name, frame):
+        parts = []
+        while frame is not None and len(parts) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            module = os.path.splitext(os.path.basename(code.co_filename))[0]
+            parts.append(f"{module}:{code.co_name}")
+            frame = frame.f_back
+        parts.append(thread_name.replace(";", "_"))
+        return ";".join(reversed(parts))
+
+    def turn_boundary(self, turn_id):
+        """Kaldes efter hver tur - i turn-mode skrives turens stakke til en fil"""
+        if self.mode == "turn" and self.running:
+            return self.dump(f"turn_{turn_id}")
+        return None
+
+    def dump(self, label):
+        with self._lock:
+            stacks = self._stacks
+            samples = self._samples
+            self._stacks = collections.Counter()
+            self._samples = 0
+        if not stacks:
+            return None
+        os.makedirs(self.profile_dir, exist_ok=True)
+        stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(self.profile_dir, f"{stamp}_{label}.collapsed")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        print(f"[INFO] Profil gemt i {path} ({samples} samples)")
+        return path
+
+
+profiler = SamplingProfiler()
+
+
+def install_signal_toggle(sig_name="SIGUSR1"):
+    """`kill -USR1 <pid>` slår profileren til/fra (findes ikke på Windows)"""
+    sig = getattr(signal, sig_name, None)
+    if sig is None:
+        return False
+    signal.signal(sig, profiler.toggle)
+    return True
+
+
+def profile_status(params):
+    """Admin-route (GET): /admin/profile viser om profileren kører. Start/stop kræver POST"""
+    if params:
+        return 405, "Fejl: brug POST for at starte eller stoppe profileren\n"
+    return 200, f"{'kører (' + profiler.mode + ')' if profiler.running else 'stoppet'}\n"
+
+
+def admin_profile(params):
+    """Admin-route (POST): /admin/profile?action=start|stop&mode=window|turn&seconds=30"""
+    action = params.get("action", "status")
+    if action == "start":
+        seconds = float(params["seconds"]) if params.get("seconds") else None
+        started = profiler.start(params.get("mode", "window"), seconds)
+        return 200, "startet\n" if started else "kører allerede\n"
+    if action == "stop":
+        path = profiler.stop()
+        return 200, f"stoppet{': ' + path if path else ''}\n"
+    return profile_status({})
@@ -0,0 +1,283 @@
+import os
+import glob
+import warnings
+import concurrent.futures
+import numpy as np
+import librosa
+import joblib
+from scipy.special import logsumexp
+from speaker_registry import SpeakerRegistry
+from audio_features import features_for, SAMPLE_RATE
+from metrics import CACHE_HITS, CACHE_MISSES
+
+# Ignorer advarsler
+warnings.filterwarnings('ignore')
+
+N_MFCC = 13
+VOICES_DIR = 'data/voices'
+FEATURE_CACHE_PATH = 'data/speaker_features.joblib'
+GMM_DIR = 'data/speaker_models'
+# Øges når MFCC-beregningen ændres - cachede embeddings med en anden version udtrækkes igen
+FEATURE_VERSION = 2  # 2: fælles 25 ms / 10 ms frames fra audio_features
+# Tale-GMM'erne i GMM_DIR er trænet på librosas MFCC (egen mel-DCT, framing og skalering).
+# De scores derfor på librosa-features og ikke på de fælles frames, der har en anden fordeling
+
+
+# Embedding: middelværdi og spredning af MFCC 1..N_MFCC-1 og deres deltaer.
+# c0 (energi) udelades, da den mest afspejler mikrofonafstand.
+EMBEDDING_DIM = 4 * (N_MFCC - 1)
+
+
+def compute_embedding(mfccs):
+    """Fast-størrelse taler-embedding ud fra MFCC-frames (n_mfcc, T)"""
+    coeffs = mfccs[1:N_MFCC]
+    deltas = np.gradient(coeffs, axis=1) if coeffs.shape[1] > 1 else np.zeros_like(coeffs)
+    return np.concatenate([coeffs.mean(axis=1), coeffs.std(axis=1),
+                           deltas.mean(axis=1), deltas.std(axis=1)]).astype(np.float32)
+
+
+def extract_features(file_path):
+    """Udtræk taler-embedding fra en WAV-fil.
+
+    Ligger på modulniveau, så den kan køres i en ProcessPoolExecutor.
+    """
+    try:
+        y, sr = librosa.load(file_path, sr=SAMPLE_RATE)
+        return compute_embedding(compute_mfcc(y, sr=sr))
+    except Exception as e:
+        print(f"Fejl ved feature extraction for {file_path}: {e}")
+        return None
+
+
+def compute_mfcc(audio, sr=SAMPLE_RATE, n_mfcc=N_MFCC):
+    """MFCC-frames (n_mfcc, T) for en float32 PCM-buffer.
+
+    Frames kommer fra den fælles feature-service: er bufferen optaget af
+    record_audio, er de allerede beregnet under optagelsen, og resultatet er et
+    view uden kopi. De første N_MFCC rækker er de samme uanset n_mfcc.
+    """
+    if sr != SAMPLE_RATE:
+        audio = librosa.resample(np.asarray(audio, dtype=np.float32), orig_sr=sr, target_sr=SAMPLE_RATE)
+    return features_for(audio).mfcc[:, :max(n_mfcc, N_MFCC)].T
+
+
+def gmm_mfcc(audio, sr=SAMPLE_RATE, n_mfcc=N_MFCC):
+    """MFCC-frames (T, n_mfcc) som tale-GMM'erne er trænet på (librosa)"""
+    audio = np.asarray(audio, dtype=np.float32)
+    if sr != SAMPLE_RATE:
+        audio = librosa.resample(audio, orig_sr=sr, target_sr=SAMPLE_RATE)
+    return librosa.feature.mfcc(y=audio, sr=SAMPLE_RATE, n_mfcc=n_mfcc).T
+
+
+class GMMScorer:
+    """Scorer alle tale-GMM'er (data/speaker_models/*_gmm.joblib) i ét vektoriseret pass.
+
+    Frames skal komme fra gmm_mfcc (samme features som GMM'erne er trænet på).
+    Parametrene fra hver sklearn GaussianMixture stables i arrays med formen
+    (talere, komponenter, ...), så log-likelihood for alle talere beregnes med
+    numpy på én gang i stedet for et score_samples-kald pr. taler.
+    """
+
+    def __init__(self, labels, gmms):
+        self.labels = np.array(labels)
+        self.gmms = gmms
+        self.n_features = gmms[0].means_.shape[-1]
+        cov_types = {gmm.covariance_type for gmm in gmms}
+        shapes = {gmm.means_.shape for gmm in gmms}
+        self.vectorized = len(shapes) == 1 and len(cov_types) == 1 and cov_types <= {"full", "diag"}
+        if self.vectorized:
+            self.covariance_type = cov_types.pop()
+            self.means = np.stack([gmm.means_ for gmm in gmms])                      # (S, K, D)
+            self.prec_chol = np.stack([gmm.precisions_cholesky_ for gmm in gmms])    # (S, K, D[, D])
+            self.log_weights = np.log(np.stack([gmm.weights_ for gmm in gmms]))      # (S, K)
+            if self.covariance_type == "full":
+                self.log_det = np.log(np.diagonal(self.prec_chol, axis1=-2, axis2=-1)).sum(-1)
+                self.means_proj = np.einsum('skd,skde->ske', self.means, self.prec_chol)
+            else:
+                self.log_det = np.log(self.prec_chol).sum(-1)
+
+    @classmethod
+    def load(cls, gmm_dir=GMM_DIR):
+        paths = sorted(glob.glob(os.path.join(gmm_dir, "*_gmm.joblib")))
+        if not paths:
+            return None
+        labels = [os.path.basename(path)[:-len("_gmm.joblib")] for path in paths]
+        return cls(labels, [joblib.load(path) for path in paths])
+
+    def score(self, frames):
+        """Gennemsnitlig log-likelihood pr. frame for hver taler. frames: (T, D)"""
+        frames = np.asarray(frames, dtype=np.float64)
+        if not self.vectorized:
+            return np.array([gmm.score(frames) for gmm in self.gmms])
+        if self.covariance_type == "full":
+            y = np.einsum('td,skde->skte', frames, self.prec_chol) - self.means_proj[:, :, None, :]
+        else:
+            y = (frames[None, None] - self.means[:, :, None, :]) * self.prec_chol[:, :, None, :]
+        log_prob = -0.5 * (self.n_features * np.log(2 * np.pi) + (y ** 2).sum(-1)) + self.log_det[:, :, None]
+        return logsumexp(log_prob + self.log_weights[:, :, None], axis=1).mean(axis=1)
+
+    def best(self, frames):
+        scores = self.score(frames)
+        idx = int(np.argmax(scores))
+        return self.labels[idx], float(scores[idx])
+
+
+def file_signature(file_path):
+    """(mtime, størrelse) bruges til at afgøre om en stemmeprøve er ændret"""
+    st = os.stat(file_path)
+    return st.st_mtime_ns, st.st_size
+
+
+class SpeakerRecognizer:
+    """Taler-genkendelse oven på et samlet SpeakerRegistry.
+
+    Features gemmes i FEATURE_CACHE_PATH med filsti, mtime og størrelse som nøgle,
+    så kun nye eller ændrede stemmeprøver skal igennem librosa. Registret
+    synkroniseres inkrementelt med data/voices: nye prøver enrolles, ændrede
+    eller slettede prøver fjernes - uden at noget skal gentrænes.
+    """
+
+    def __init__(self, voices_dir=VOICES_DIR, cache_path=FEATURE_CACHE_PATH, registry_dir=None,
+                 threshold=0.6, max_workers=None):
+        self.voices_dir = voices_dir
+        self.cache_path = cache_path
+        self.threshold = threshold  # Tærskel for cosinus-lighed (0-1)
+        self.max_workers = max_workers
+        self.gmm = None
+
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        if registry_dir:
+            self.registry = SpeakerRegistry(registry_dir, dim=EMBEDDING_DIM)
+        else:
+            self.registry = SpeakerRegistry(dim=EMBEDDING_DIM)
+        self.sync_registry()
+        try:
+            self.gmm = GMMScorer.load(GMM_DIR)
+        except Exception as e:
+            print(f"[ADVARSEL] Kunne ikke indlæse tale-GMM'er: {e}")
+
+    @property
+    def labels(self):
+        return self.registry.speakers()
+
+    def scan_samples(self):
+        """Find alle stemmeprøver som {sti: (label, mtime, størrelse)}"""
+        samples = {}
+        if not os.path.isdir(self.voices_dir):
+            return samples
+        for person in sorted(os.listdir(self.voices_dir)):
+            person_dir = os.path.join(self.voices_dir, person)
+            if not os.path.isdir(person_dir):
+                continue
+            for wav in sorted(os.listdir(person_dir)):
+                if wav.endswith('.wav'):
+                    wav_path = os.path.join(person_dir, wav)
+                    samples[wav_path] = (person, *file_signature(wav_path))
+        return samples
+
+    def load_feature_cache(self):
+        try:
+            return joblib.load(self.cache_path)
+        except Exception:
+            return {}
+
+    def update_features(self, samples):
+        """Returnerer (opdateret feature-cache, genudtrukne stier); kun nye/ændrede filer udtrækkes"""
+        cache = self.load_feature_cache()
+        # Fjern filer der ikke længere findes
+        cache = {path: entry for path, entry in cache.items() if path in samples}
+
+        pending = [path for path, (label, mtime, size) in samples.items()
+                   if path not in cache or cache[path]["mtime"] != mtime or cache[path]["size"] != size
+                   or "embedding" not in cache[path] or cache[path].get("version") != FEATURE_VERSION]
+
+        CACHE_HITS.inc(len(samples) - len(pending), cache="speaker_features")
+        CACHE_MISSES.inc(len(pending), cache="speaker_features")
+        if pending:
+            print(f"Udtrækker features for {len(pending)} nye/ændrede stemmeprøver "
+                  f"({len(samples) - len(pending)} fra cache)...")
+            if len(pending) == 1:
+                results = [extract_features(pending[0])]
+            else:
+                workers = self.max_workers or min(len(pending), os.cpu_count() or 1)
+                with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+                    results = list(pool.map(extract_features, pending))
+            for path, embedding in zip(pending, results):
+                if embedding is None:
+                    cache.pop(path, None)
+                    continue
+                label, mtime, size = samples[path]
+                cache[path] = {"label": label, "mtime": mtime, "size": size, "embedding": embedding,
+                               "version": FEATURE_VERSION}
+            joblib.dump(cache, self.cache_path)
+        return cache, set(pending)
+
+    def sync_registry(self):
+        """Bring registret i overensstemmelse med stemmeprøverne på disken"""
+        samples = self.scan_samples()
+        cache, extracted = self.update_features(samples)
+        enrolled = self.registry.rows_by_source()
+
+        stale = [row for path, row in enrolled.items()
+                 if path not in cache or path in extracted
+                 or self.registry.meta["rows"][row]["mtime"] != cache[path]["mtime"]
+                 or self.registry.meta["rows"][row]["size"] != cache[path]["size"]]
+        if stale:
+            self.registry.remove_rows(stale)
+
+        current = self.registry.rows_by_source()
+        # Én skrivning af labels.json for alle nye prøver - ikke én pr. prøve
+        added = len(self.registry.enroll_many(
+            (cache[path]["label"], cache[path]["embedding"], path, cache[path]["mtime"], cache[path]["size"])
+            for path in sorted(cache) if path not in current))
+        print(f"[INFO] Taler-register: {len(self.registry)} stemmeprøver for {len(self.labels)} talere "
+              f"({added} tilføjet, {len(stale)} fjernet).")
+
+    def enroll(self, label, audio, sr=SAMPLE_RATE):
+        """Enroll en ny stemmeprøve direkte fra en PCM-buffer"""
+        return self.registry.enroll(label, compute_embedding(compute_mfcc(audio, sr=sr)))
+
+    def remove_speaker(self, label):
+        self.registry.remove_speaker(label)
+
+    def identify(self, audio, sr=SAMPLE_RATE):
+        """Identificer taleren direkte fra den PCM-buffer der også går til Whisper.
+
+        Embeddingen bygger på de fælles frames fra optagelsen, og registret laver
+        én vektoriseret søgning. GMM'erne bekræfter kun et match over tærsklen og
+        får librosa-MFCC som de er trænet på. Returnerer (bruger, konfidens, afstand).
+        """
+        if audio is None or len(audio) == 0 or len(self.registry) == 0:
+            return "guest", 0.0, float("inf")
+
+        mfccs = compute_mfcc(audio, sr=sr)
+        if mfccs.shape[1] == 0:
+            # Kortere end én analyseramme (FRAME_LENGTH samples) - embeddingen ville blive NaN
+            return "guest", 0.0, float("inf")
+
+        prediction, similarity = self.registry.search(compute_embedding(mfccs), k=1)[0]
+        confidence = max(similarity, 0.0)
+        distance = 1.0 - similarity  # Cosinus-afstand
+
+        print(f"Genkendelse: {prediction} (konfidens: {confidence:.2f})")
+        if confidence < self.threshold:
+            return "guest", confidence, distance
+
+        # GMM'erne er en bekræftelse: de scores kun når K-NN har et match, og et match
+        # for en taler med GMM, som GMM'erne peger på en anden taler end, afvises
+        if self.gmm and prediction in self.gmm.labels:
+            gmm_label, gmm_score = self.gmm.best(gmm_mfcc(audio, sr=sr, n_mfcc=self.gmm.n_features))
+            if gmm_label != prediction:
+                print(f" - GMM er uenig: {gmm_label} ({gmm_score:.1f}) - behandles som gæst")
+                return "guest", confidence, distance
+        return prediction, confidence, distance
+
+    def predict(self, wav_file):
+        """Forudsig taler fra en WAV-fil og returner (bruger, konfidens)"""
+        try:
+            y, _ = librosa.load(wav_file, sr=SAMPLE_RATE)
+        except Exception as e:
+            print(f"Fejl ved indlæsning af {wav_file}: {e}")
+            return "guest", 0.0
+        prediction, confidence, _ = self.identify(y)
+        return prediction, confidence
@@ -0,0 +1,180 @@
+import os
+import json
+import threading
+import numpy as np
+
+REGISTRY_DIR = 'data/speaker_registry'
+EMBEDDINGS_FILE = 'embeddings.npy'
+LABELS_FILE = 'labels.json'
+INITIAL_CAPACITY = 64
+
+
+class SpeakerRegistry:
+    """Samlet register over enrollede talere.
+
+    Alle embeddings ligger i én memory-mapped .npy-fil (kapacitet x dim) med en
+    tilhørende labeltabel i JSON - i stedet for en modelfil pr. bruger. Opslag
+    er en vektoriseret cosinus-søgning over alle aktive rækker. Enrollment
+    tilføjer en række og fjernelse markerer rækken som slettet, så intet skal
+    gentrænes. Løbende summer bruges til at standardisere dimensionerne, så
+    fx energi-koefficienter ikke dominerer cosinus-afstanden.
+    """
+
+    def __init__(self, registry_dir=REGISTRY_DIR, dim=None):
+        self.registry_dir = registry_dir
+        self.embeddings_path = os.path.join(registry_dir, EMBEDDINGS_FILE)
+        self.labels_path = os.path.join(registry_dir, LABELS_FILE)
+        self._lock = threading.Lock()
+        self._index = None  # Cache af normaliserede aktive rækker (nulstilles ved ændringer)
+
+        os.makedirs(registry_dir, exist_ok=True)
+        if os.path.exists(self.labels_path) and os.path.exists(self.embeddings_path):
+            with open(self.labels_path, 'r', encoding='utf-8') as f:
+                self.meta = json.load(f)
+            self.embeddings = np.load(self.embeddings_path, mmap_mode='r+')
+            if dim is not None and self.meta["dim"] != dim:
+                raise ValueError(f"Registeret har dimension {self.meta['dim']}, forventede {dim}")
+        else:
+            if dim is None:
+                raise ValueError("dim skal angives når et nyt register oprettes")
+            self.meta = {"dim": dim, "count": 0, "rows": [],
+                         "sum": [0.0] * dim, "sumsq": [0.0] * dim, "active": 0}
+            self.embeddings = self._create_array(INITIAL_CAPACITY, dim)
+            self._save_meta()
+
+    @property
+    def dim(self):
+        return self.meta["dim"]
+
+    def __len__(self):
+        return self.meta["active"]
+
+    def speakers(self):
+        return sorted({row["label"] for row in self.meta["rows"] if row["label"] is not None})
+
+    def _create_array(self, capacity, dim):
+        tmp_path = self.embeddings_path + ".tmp"
+        arr = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=(capacity, dim))
+        arr.flush()
+        del arr
+        os.replace(tmp_path, self.embeddings_path)
+        return np.load(self.embeddings_path, mmap_mode='r+')
+
+    def _grow(self):
+        count = self.meta["count"]
+        data = np.array(self.embeddings[:count])
+        self.embeddings = None  # Luk mmap før filen erstattes (krævet på Windows)
+        self.embeddings = self._create_array(max(INITIAL_CAPACITY, 2 * len(data) or INITIAL_CAPACITY), self.dim)
+        self.embeddings[:count] = data
+
+    def _save_meta(self):
+        tmp_path = self.labels_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f, ensure_ascii=False)
+        os.replace(tmp_path, self.labels_path)
+
+    def enroll(self, label, embedding, source=None, mtime=None, size=None):
+        """Tilføj en embedding for `label` og returner rækkens indeks"""
+        return self.enroll_many([(label, embedding, source, mtime, size)])[0]
+
+    def enroll_many(self, entries):
+        """Tilføj (label, embedding, source, mtime, size) i én omgang og returner rækkernes indeks.
+
+        Arrayet flushes og labels.json skrives én gang for hele batchen.
+        """
+        entries = [(label, np.asarray(embedding, dtype=np.float32).reshape(-1), source, mtime, size)
+                   for label, embedding, source, mtime, size in entries]
+        for entry in entries:
+            if entry[1].shape[0] != self.dim:
+                raise ValueError(f"Embedding har dimension {entry[1].shape[0]}, forventede {self.dim}")
+        rows = []
+        if not entries:
+            return rows
+        with self._lock:
+            for label, embedding, source, mtime, size in entries:
+                if self.meta["count"] >= self.embeddings.shape[0]:
+                    self._grow()
+                row = self.meta["count"]
+                self.embeddings[row] = embedding
+                self.meta["rows"].append({"label": label, "source": source, "mtime": mtime, "size": size})
+                self.meta["count"] += 1
+                self._update_stats(embedding, +1)
+                rows.append(row)
+            self.embeddings.flush()
+            self._save_meta()
+            self._index = None
+        return rows
+
+    def remove_rows(self, rows):
+        with self._lock:
+            for row in rows:
+                entry = self.meta["rows"][row]
+                if entry["label"] is None:
+                    continue
+                self._update_stats(np.array(self.embeddings[row]), -1)
+                entry["label"] = None
+            self._save_meta()
+            self._index = None
+
+    def remove_speaker(self, label):
+        """Fjern alle rækker for en taler (ingen gentræning nødvendig)"""
+        self.remove_rows([i for i, row in enumerate(self.meta["rows"]) if row["label"] == label])
+
+    def rows_by_source(self):
+        return {row["source"]: i for i, row in enumerate(self.meta["rows"])
+                if row["label"] is not None and row["source"] is not None}
+
+    def _update_stats(self, embedding, sign):
+        e = embedding.astype(np.float64)
+        self.meta["sum"] = (np.array(self.meta["sum"]) + sign * e).tolist()
+        self.meta["sumsq"] = (np.array(self.meta["sumsq"]) + sign * e * e).tolist()
+        self.meta["active"] += sign
+
+    def _standardize(self, x):
+        n = max(self.meta["active"], 1)
+        mean = np.array(self.meta["sum"]) / n
+        var = np.array(self.meta["sumsq"]) / n - mean ** 2
+        std = np.sqrt(np.maximum(var, 1e-8))
+        return ((x - mean) / std).astype(np.float32)
+
+    def _build_index(self):
+        rows = [i for i, row in enumerate(self.meta["rows"]) if row["label"] is not None]
+        if not rows:
+            return None
+        matrix = self._standardize(np.asarray(self.embeddings[rows], dtype=np.float64))
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-8
+        labels = np.array([self.meta["rows"][i]["label"] for i in rows])
+        return matrix, labels
+
+    def search(self, embedding, k=1):
+        """Vektoriseret cosinus-søgning. Returnerer [(label, similarity), ...] bedst først"""
+        index = self._index
+        if index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = self._build_index()
+                index = self._index
+        if index is None:
+            return []
+        matrix, labels = index
+        query = self._standardize(np.asarray(embedding, dtype=np.float64).reshape(-1))
+        query /= np.linalg.norm(query) + 1e-8
+        sims = matrix @ query
+        k = min(k, len(sims))
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+        return [(str(labels[i]), float(sims[i])) for i in top]
+
+    def compact(self):
+        """Omskriv arrayet uden slettede rækker"""
+        with self._lock:
+            keep = [i for i, row in enumerate(self.meta["rows"]) if row["label"] is not None]
+            data = np.array(self.embeddings[keep]) if keep else np.zeros((0, self.dim), dtype=np.float32)
+            self.embeddings = None
+            self.embeddings = self._create_array(max(INITIAL_CAPACITY, len(keep)), self.dim)
+            self.embeddings[:len(keep)] = data
+            self.embeddings.flush()
+            self.meta["rows"] = [self.meta["rows"][i] for i in keep]
+            self.meta["count"] = len(keep)
+            self._save_meta()
+            self._index = None
@@ -0,0 +1,95 @@
+import time
+import threading
+
+CONFIRM_TIMEOUT = 15  # Sekunder til at svare ja/nej
+ANSWER_TIMEOUT = 30   # Sekunder til at sige det nye svar
+
+YES_WORDS = ("ja", "jo", "gerne", "yes", "okay", "ok")
+NO_WORDS = ("nej", "nope", "ellers tak", "lad være", "no")
+
+
+def _starts_with_any(reply, words):
+    """'ja tak' matcher 'ja', men 'nogen' matcher ikke 'no'"""
+    return any(reply == word or reply.startswith(word + " ") for word in words)
+
+
+class TeachDialog:
+    """Lær-et-nyt-svar dialogen som en tilstandsmaskine.
+
+    Hvert skridt er én almindelig tur i pipelinen (optag -> STT -> handle_command),
+    så event loopet og mikrofonen aldrig blokeres mens brugeren tænker:
+
+        confirm  --ja-->   answer  --svar-->  done (parret gemmes)
+           |--nej-->  declined (Gemini prøves på det oprindelige spørgsmål)
+           |--andet-> abandoned (inputtet behandles som en ny kommando)
+        Et skridt der ikke besvares inden for sin timeout opgives.
+
+    Et skridts timeout løber først fra arm(), som kaldes når spørgsmålet er
+    læst op - ellers ville en langsom TTS spise af brugerens svartid.
+    """
+
+    def __init__(self, question, clock=time.monotonic):
+        self.question = question
+        self.clock = clock
+        self.state = "confirm"
+        self.deadline = None  # Sættes af arm()
+
+    @property
+    def active(self):
+        if self.state not in ("confirm", "answer"):
+            return False
+        return self.deadline is None or self.clock() <= self.deadline
+
+    def arm(self, playing_seconds=0.0):
+        """Start skridtets timeout, når spørgsmålet er spillet færdigt om `playing_seconds`"""
+        if self.state in ("confirm", "answer") and self.deadline is None:
+            timeout = CONFIRM_TIMEOUT if self.state == "confirm" else ANSWER_TIMEOUT
+            self.deadline = self.clock() + playing_seconds + timeout
+
+    def prompt(self):
+        return "Det ved jeg ikke endnu. Vil du lære mig svaret? Sig 'ja' eller 'nej'."
+
+    def step(self, text):
+        """Næste brugerinput -> (svar til brugeren, lært svar eller None)"""
+        text = (text or "").strip()
+        reply = text.lower()
+        if self.state == "confirm":
+            if _starts_with_any(reply, YES_WORDS):
+                self.state = "answer"
+                self.deadline = None  # Armeres igen når spørgsmålet er læst op
+                return f"Hvad skal jeg svare, når nogen siger {self.question}?", None
+            self.state = "declined" if _starts_with_any(reply, NO_WORDS) else "abandoned"
+            return None, None
+        if self.state == "answer":
+            self.state = "done"
+            if not text:
+                return "Jeg forstod ikke dit svar. Vi prøver igen senere.", None
+            return f"Tak, nu har jeg lært at svare: {text}", text
+        return None, None
+
+
+class DialogManager:
+    """Aktive dialoger pr. session. Udløbne dialoger ryddes væk ved næste opslag"""
+
+    def __init__(self):
+        self._dialogs = {}
+        self._lock = threading.Lock()
+
+    def start(self, session_id, dialog):
+        with self._lock:
+            self._dialogs[session_id] = dialog
+        return dialog
+
+    def active(self, session_id):
+        with self._lock:
+            dialog = self._dialogs.get(session_id)
+            if dialog is not None and not dialog.active:
+                if dialog.state in ("confirm", "answer"):
+                    print(f"[INFO] Teach-me dialogen om '{dialog.question}' udløb uden svar.")
+                del self._dialogs[session_id]
+                dialog = None
+            return dialog
+
+    def finish(self, session_id):
+        with self._lock:
+            self._dialogs.pop(session_id, None)
@@ -0,0 +1,132 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+import datetime
+import contextvars
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+TRACE_LOG = os.path.join("logs", "turn_trace.jsonl")
+TRACE_MAX_BYTES = 5 * 1024 * 1024
+TRACE_BACKUP_COUNT = 5
+
+_current_trace = contextvars.ContextVar("jarvis_turn_trace", default=None)
+_logger = None
+
+
+def get_trace_logger(path=TRACE_LOG):
+    """JSONL-logger med rotation - én linje pr. tur"""
+    global _logger
+    if _logger is None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _logger = logging.getLogger("jarvis.trace")
+        _logger.setLevel(logging.INFO)
+        _logger.propagate = False
+        handler = RotatingFileHandler(path, maxBytes=TRACE_MAX_BYTES, backupCount=TRACE_BACKUP_COUNT,
+                                      encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        _logger.addHandler(handler)
+    return _logger
+
+
+def file_version(path, length=10):
+    """Kort indholds-hash af en modelfil (bruges som modelversion)"""
+    try:
+        h = hashlib.sha1()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        return h.hexdigest()[:length]
+    except OSError:
+        return None
+
+
+class TurnTrace:
+    """Samler tidsmålinger for én tur (capture -> STT -> intent -> ... -> TTS).
+
+    Stadier måles med time.perf_counter (monoton). Ved `emit()` skrives én
+    struktureret JSONL-post med varigheder, modelversioner, lydlængde,
+    real-time factor og den fallback-sti turen endte i.
+    """
+
+    def __init__(self, model_versions=None):
+        self.turn_id = uuid.uuid4().hex[:12]
+        self.started = time.perf_counter()
+        self.timestamp = datetime.datetime.now().isoformat(timespec="milliseconds")
+        self.stages = {}
+        self.model_versions = dict(model_versions or {})
+        self.audio_seconds = None
+        self.path = None
+        self.fields = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            # Et stadie der køres flere gange i samme tur (fx teach-me) lægges sammen
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def add_stage(self, name, seconds):
+        """Registrer et stadie der er målt andetsteds (fx endpoint-ventetid i optageren)"""
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def record(self):
+        total = time.perf_counter() - self.started
+        stt = self.stages.get("stt")
+        rtf = stt / self.audio_seconds if stt is not None and self.audio_seconds else None
+        return {
+            "turn_id": self.turn_id,
+            "timestamp": self.timestamp,
+            "total_ms": round(total * 1000, 1),
+            "stages_ms": {name: round(sec * 1000, 1) for name, sec in self.stages.items()},
+            "audio_seconds": round(self.audio_seconds, 3) if self.audio_seconds else self.audio_seconds,
+            "rtf": round(rtf, 3) if rtf is not None else None,
+            "path": self.path,
+            "models": self.model_versions,
+            **self.fields,
+        }
+
+    def emit(self):
+        record = self.record()
+        try:
+            get_trace_logger().info(json.dumps(record, ensure_ascii=False))
+        except Exception as e:
+            print(f"[ADVARSEL] Kunne ikke skrive trace: {e}")
+        return record
+
+
+def start_turn(model_versions=None):
+    """Start en ny tur og gør den til den aktuelle i denne context"""
+    trace = TurnTrace(model_versions)
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def trace_stage(name):
+    """Mål et stadie på den aktuelle tur (gør intet uden for en tur)"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+    with trace.stage(name):
+        yield trace
+
+
+def set_path(path):
+    """Registrer hvilken sti (intent/retrieval/nn/gemini ...) turen endte i"""
+    trace = _current_trace.get()
+    if trace is not None and trace.path is None:
+        trace.path = path
@@ -0,0 +1,274 @@
+# Log over sætninger Jarvis ikke kunne svare på - grundlag for gentræning.
+#
+#   python src/unknown_log.py top --limit 20          # hyppigste ukendte sætninger
+#   python src/unknown_log.py cluster --k 30           # TF-IDF + MiniBatchKMeans, klynger efter hyppighed
+#
+# Hver normaliseret sætning gemmes én gang med antal, første/sidste gang set, NLU's
+# bedste intent med sandsynlighed og den nærmeste retrieval-lighed.
+
+import os
+import re
+import json
+import time
+import queue
+import sqlite3
+import argparse
+import threading
+import unicodedata
+
+UNKNOWN_DB = os.path.join("data", "unknown_sentences.db")
+LEGACY_FILE = "ukendte_sætninger.txt"
+CLUSTERS_FILE = os.path.join("data", "unknown_clusters.json")
+WRITE_BATCH_SIZE = 256
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS unknowns (
+    normalized TEXT PRIMARY KEY,
+    example TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    top_intent TEXT,
+    intent_prob REAL,
+    retrieval_score REAL
+);
+CREATE INDEX IF NOT EXISTS unknowns_count ON unknowns(count);
+CREATE TABLE IF NOT EXISTS imports (path TEXT PRIMARY KEY, imported REAL NOT NULL);
+"""
+
+UPSERT = """
+INSERT INTO unknowns(normalized, example, count, first_seen, last_seen, top_intent, intent_prob, retrieval_score)
+VALUES (:normalized, :example, :count, :first_seen, :last_seen, :top_intent, :intent_prob, :retrieval_score)
+ON CONFLICT(normalized) DO UPDATE SET
+    count = count + excluded.count,
+    example = excluded.example,
+    first_seen = MIN(first_seen, excluded.first_seen),
+    last_seen = MAX(last_seen, excluded.last_seen),
+    top_intent = COALESCE(excluded.top_intent, top_intent),
+    intent_prob = COALESCE(excluded.intent_prob, intent_prob),
+    retrieval_score = COALESCE(excluded.retrieval_score, retrieval_score)
+"""
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(text):
+    """'Hvad er  klocken?' -> 'hvad er klocken'"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return _WHITESPACE.sub(" ", _PUNCTUATION.sub(" ", text)).strip()
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=10)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class UnknownLog:
+    """Deduplikeret log over ukendte sætninger med asynkron, batchet skrivning.
+
+    `record()` lægger blot sætningen i en kø. En baggrundstråd samler det
+    der venter, slår gentagelser sammen, kalder `details()` (NLU-intent og
+    retrieval-lighed) én gang pr. unik sætning og skriver batchen som
+    UPSERTs i én transaktion - intet af det ligger på svartiden.
+    """
+
+    def __init__(self, path=UNKNOWN_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = _connect(path)
+        conn.executescript(SCHEMA)
+        conn.close()
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="jarvis-unknown-writer", daemon=True)
+        self._writer.start()
+
+    def record(self, text, details=None):
+        """details: valgfri funktion der returnerer {top_intent, intent_prob, retrieval_score}"""
+        normalized = normalize(text or "")
+        if normalized:
+            self._queue.put((normalized, text.strip(), time.time(), details))
+
+    def _write_loop(self):
+        conn = _connect(self.path)
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < WRITE_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            rows = {}
+            for item in batch:
+                if item is None:
+                    continue
+                normalized, example, seen, details = item
+                row = rows.get(normalized)
+                if row is None:
+                    row = rows[normalized] = {"normalized": normalized, "example": example, "count": 0,
+                                              "first_seen": seen, "last_seen": seen, "top_intent": None,
+                                              "intent_prob": None, "retrieval_score": None, "details": details}
+                row["count"] += 1
+                row["last_seen"] = max(row["last_seen"], seen)
+            try:
+                for row in rows.values():
+                    details = row.pop("details")
+                    if details is not None:
+                        try:
+                            row.update(details())
+                        except Exception as e:
+                            print(f"[ADVARSEL] Kunne ikke beregne detaljer for ukendt sætning: {e}")
+                if rows:
+                    with conn:
+                        conn.executemany(UPSERT, list(rows.values()))
+            except sqlite3.Error as e:
+                print(f"[FEJL] Kunne ikke logge {len(rows)} ukendte sætninger: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                conn.close()
+                return
+
+    def flush(self):
+        self._queue.join()
+
+    def close(self):
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join(timeout=5)
+
+    def top(self, limit=20):
+        self.flush()
+        conn = _connect(self.path)
+        try:
+            return [dict(row) for row in conn.execute(
+                "SELECT * FROM unknowns ORDER BY count DESC, last_seen DESC LIMIT ?", (limit,))]
+        finally:
+            conn.close()
+
+    def import_legacy(self, path=LEGACY_FILE):
+        """Importér den gamle tekstfil én gang (gentagelser tælles sammen)"""
+        if not os.path.exists(path):
+            return
+        conn = _connect(self.path)
+        try:
+            key = os.path.abspath(path)
+            if conn.execute("SELECT 1 FROM imports WHERE path = ?", (key,)).fetchone():
+                return
+            mtime = os.path.getmtime(path)
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    self.record(line)
+            self.flush()
+            with conn:
+                conn.execute("INSERT INTO imports(path, imported) VALUES (?, ?)", (key, time.time()))
+                conn.execute("UPDATE unknowns SET first_seen = MIN(first_seen, ?)", (mtime,))
+            print(f"[INFO] {path} importeret til {self.path}.")
+        finally:
+            conn.close()
+
+
+_logs = {}
+_logs_lock = threading.Lock()
+
+
+def get_unknown_log(path=UNKNOWN_DB):
+    key = os.path.abspath(path)
+    with _logs_lock:
+        log = _logs.get(key)
+        if log is None:
+            log = _logs[key] = UnknownLog(path)
+            log.import_legacy()
+        return log
+
+
+def load_all(path=UNKNOWN_DB):
+    conn = _connect(path)
+    try:
+        return [dict(row) for row in conn.execute("SELECT * FROM unknowns")]
+    finally:
+        conn.close()
+
+
+def cluster_unknowns(rows, k=None, seed=42):
+    """TF-IDF + MiniBatchKMeans over de normaliserede sætninger, vægtet med antal.
+
+    Klyngerne rangeres efter samlet antal forekomster, så de sætninger der
+    rammer flest brugere kommer først i gentræningen.
+    """
+    import numpy as np
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.cluster import MiniBatchKMeans
+
+    if not rows:
+        return []
+    texts = [row["normalized"] for row in rows]
+    counts = np.array([row["count"] for row in rows], dtype=float)
+    k = min(k or max(1, int(np.sqrt(len(rows) / 2))), len(rows))
+    # Tegn-n-grammer fanger stavefejl fra STT ('klocken' ~ 'klokken')
+    matrix = TfidfVectorizer(analyzer="char_wb", ngram_range=(2, 4), sublinear_tf=True).fit_transform(texts)
+    km = MiniBatchKMeans(n_clusters=k, random_state=seed, batch_size=1024, n_init=3)
+    labels = km.fit_predict(matrix, sample_weight=counts)
+
+    clusters = []
+    for label in range(k):
+        members = np.flatnonzero(labels == label)
+        if members.size == 0:
+            continue
+        members = members[np.argsort(-counts[members], kind="stable")]
+        clusters.append({
+            "total": int(counts[members].sum()),
+            "size": int(members.size),
+            "representative": rows[members[0]]["example"],
+            "top_intents": _top_values([rows[i]["top_intent"] for i in members], counts[members]),
+            "members": [{key: rows[i][key] for key in ("example", "count", "top_intent", "intent_prob",
+                                                        "retrieval_score")} for i in members[:20]],
+        })
+    clusters.sort(key=lambda c: c["total"], reverse=True)
+    return clusters
+
+
+def _top_values(values, weights, limit=3):
+    totals = {}
+    for value, weight in zip(values, weights):
+        if value:
+            totals[value] = totals.get(value, 0) + int(weight)
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ukendte sætninger: topliste og klyngeanalyse")
+    parser.add_argument("command", choices=["top", "cluster"])
+    parser.add_argument("--db", default=UNKNOWN_DB)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--k", type=int, default=None, help="Antal klynger (standard: sqrt(n/2))")
+    parser.add_argument("--output", default=CLUSTERS_FILE)
+    args = parser.parse_args()
+
+    if args.command == "top":
+        for row in UnknownLog(args.db).top(args.limit):
+            intent = f"{row['top_intent']} ({row['intent_prob']:.2f})" if row["top_intent"] else "-"
+            score = f"{row['retrieval_score']:.2f}" if row["retrieval_score"] is not None else "-"
+            print(f"{row['count']:>6}x  {row['example']:<50} intent {intent:<22} retrieval {score}")
+        return
+
+    rows = load_all(args.db)
+    start = time.perf_counter()
+    clusters = cluster_unknowns(rows, args.k)
+    print(f"[INFO] {len(rows)} ukendte sætninger i {len(clusters)} klynger på {time.perf_counter() - start:.2f}s")
+    for i, cluster in enumerate(clusters[:args.limit], 1):
+        intents = ", ".join(f"{name} ({n})" for name, n in cluster["top_intents"]) or "-"
+        print(f"{i:>3}. {cluster['total']:>6}x  {cluster['size']:>4} varianter  '{cluster['representative']}'"
+              f"  intents: {intents}")
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(clusters, f, ensure_ascii=False, indent=2)
+    print(f"[INFO] Klynger gemt i {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modulerne i src/ importeres flat, som når Jarvis startes med `python src/...`
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
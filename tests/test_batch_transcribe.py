@@ -0,0 +1,131 @@
+import json
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import batch_transcribe
+from batch_transcribe import AudioBudget, file_key, find_audio_files, load_checkpoint, run
+
+
+class FakePipeline:
+    """Afkoder hver fil til ét segment med filens navn som tekst"""
+
+    def __init__(self):
+        self.calls = []
+
+    def transcribe(self, audio, **options):
+        self.calls.append(float(audio[0]))
+        duration = len(audio) / batch_transcribe.RATE
+        segment = SimpleNamespace(start=0.0, end=duration, text=f" klip {int(audio[0])} ",
+                                  avg_logprob=-0.1, no_speech_prob=0.01, compression_ratio=1.2)
+        return iter([segment]), SimpleNamespace(language="da", language_probability=0.99)
+
+
+@pytest.fixture
+def clips(tmp_path, monkeypatch):
+    """Tre "lydfiler" hvis indhold er et tal; load_audio giver ét sekunds lyd med det tal"""
+    root = tmp_path / "clips"
+    (root / "b").mkdir(parents=True)
+    paths = [root / "a.wav", root / "b" / "c.WAV", root / "d.mp3"]
+    for number, path in enumerate(paths, 1):
+        path.write_text(str(number))
+    (root / "noter.txt").write_text("ikke lyd")
+
+    def load_audio(path):
+        if open(path).read() == "fejl":
+            raise ValueError("kan ikke afkode")
+        return np.full(batch_transcribe.RATE, float(open(path).read()), dtype=np.float32)
+
+    monkeypatch.setattr(batch_transcribe, "load_audio", load_audio)
+    monkeypatch.setattr(batch_transcribe, "audio_duration", lambda path: 1.0)
+    return root
+
+
+def read_records(output):
+    with open(output, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_find_audio_files_is_sorted_and_filters_extensions(clips):
+    files = find_audio_files(str(clips))
+    assert [p[len(str(clips)) + 1:] for p in files] == ["a.wav", "d.mp3", "b/c.WAV"]
+    assert find_audio_files(files[0]) == [files[0]]
+
+
+def test_file_key_changes_with_the_file(clips):
+    path = str(clips / "a.wav")
+    key = file_key(path)
+    assert key == file_key(path)
+    (clips / "a.wav").write_text("123")
+    assert file_key(path) != key
+
+
+def test_load_checkpoint_skips_errors_and_half_lines(tmp_path):
+    output = tmp_path / "transcripts.jsonl"
+    assert load_checkpoint(str(output)) == set()
+    output.write_text(
+        json.dumps({"path": "a", "key": "a:1:1", "text": "hej"}) + "\n"
+        + json.dumps({"path": "b", "key": "b:1:1", "error": "kan ikke afkode"}) + "\n"
+        + '{"path": "c", "key": "c:1',
+        encoding="utf-8")
+    assert load_checkpoint(str(output)) == {"a:1:1"}
+
+
+def test_run_writes_one_record_per_file(clips, tmp_path):
+    output = str(tmp_path / "out" / "transcripts.jsonl")
+    files = [(path, file_key(path)) for path in find_audio_files(str(clips))]
+    totals = run(files, output, FakePipeline(), workers=2)
+
+    records = read_records(output)
+    assert totals["files"] == 3 and totals["failed"] == 0
+    assert sorted(r["text"] for r in records) == ["klip 1", "klip 2", "klip 3"]
+    assert {r["key"] for r in records} == {key for _, key in files}
+    assert all(r["confidence"] == pytest.approx(np.exp(-0.1), abs=1e-4) for r in records)
+
+
+def test_resume_only_transcribes_the_missing_and_failed_files(clips, tmp_path):
+    output = str(tmp_path / "transcripts.jsonl")
+    (clips / "d.mp3").write_text("fejl")
+    files = [(path, file_key(path)) for path in find_audio_files(str(clips))]
+    totals = run(files, output, FakePipeline(), workers=1)
+    assert totals["failed"] == 1
+
+    # Anden kørsel: den fejlede fil er rettet, resten står allerede i checkpointet
+    (clips / "d.mp3").write_text("4")
+    done = load_checkpoint(output)
+    todo = [(path, file_key(path)) for path in find_audio_files(str(clips))]
+    todo = [(path, key) for path, key in todo if key not in done]
+    pipeline = FakePipeline()
+    totals = run(todo, output, pipeline, workers=1)
+
+    assert [path for path, _ in todo] == [str(clips / "d.mp3")]
+    assert pipeline.calls == [4.0] and totals["failed"] == 0
+    assert len(load_checkpoint(output)) == 3
+
+
+def test_audio_budget_blocks_until_released():
+    budget = AudioBudget(10)
+    budget.acquire(6)
+    acquired = threading.Event()
+
+    def second():
+        budget.acquire(6)
+        acquired.set()
+
+    thread = threading.Thread(target=second)
+    thread.start()
+    assert not acquired.wait(0.05)
+    budget.release(6)
+    assert acquired.wait(1)
+    thread.join()
+    assert budget.in_use == 6
+
+
+def test_audio_budget_admits_an_oversized_file_when_empty():
+    budget = AudioBudget(10)
+    budget.acquire(60)  # Ville ellers blokere for evigt
+    assert budget.in_use == 60
+    budget.release(100)
+    assert budget.in_use == 0
@@ -0,0 +1,25 @@
+import pytest
+
+from jarvis_commands import parse_notes_request, NOTES_PAGE_SIZE
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("søg noter efter mælk", ("search", "mælk")),
+    ("Søg i mine noter om ferie?", ("search", "ferie")),
+    ("søg blandt noterne for tandlæge", ("search", "tandlæge")),
+    ("læs mine sidste 5 noter", ("recent", 5)),
+    ("vis de tre seneste noter", ("recent", 3)),
+    ("læs mine noter", ("recent", NOTES_PAGE_SIZE)),
+])
+def test_parse_notes_request(text, expected):
+    assert parse_notes_request(text) == expected
+
+
+def test_note_count_is_clamped():
+    assert parse_notes_request("læs 200 noter") == ("recent", 50)
+    assert parse_notes_request("læs mine sidste 0 noter") == ("recent", 1)
+
+
+@pytest.mark.parametrize("text", ["hvad er klokken", "gem note køb mælk", ""])
+def test_other_commands_are_not_notes_requests(text):
+    assert parse_notes_request(text) is None
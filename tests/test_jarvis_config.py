@@ -0,0 +1,151 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+import jarvis_config
+import metrics
+from jarvis_config import Config, ConfigError, SETTINGS, config, resolve, validate
+
+DATA = {
+    "profile": "low-latency",
+    "settings": {"beam_size": 3, "silence_threshold": 250},
+    "hosts": {"pi": {"profile": "low-memory", "settings": {"silence_threshold": 300}}},
+}
+
+
+@pytest.fixture
+def live_config():
+    """Den globale config (som admin-routerne bruger) nulstilles før og efter testen"""
+    profile, values = resolve("default", {}, hostname="test")
+    config.reset(profile, values, {})
+    yield config
+    config.reset(profile, resolve("default", {}, hostname="test")[1], {})
+
+
+def test_layers_apply_in_order():
+    profile, values = resolve(data=DATA, hostname="laptop")
+    assert profile == "low-latency"
+    assert values["chunk"] == 512  # Profilen
+    assert values["beam_size"] == 3  # "settings" slår profilen
+    assert values["silence_threshold"] == 250
+    assert values["whisper_model"] == SETTINGS["whisper_model"].default
+
+
+def test_host_section_overrides_profile_and_settings():
+    profile, values = resolve(data=DATA, hostname="pi")
+    assert profile == "low-memory"
+    assert values["whisper_model"] == "base"
+    assert values["silence_threshold"] == 300
+    # Et eksplicit profilnavn vinder over maskinens
+    assert resolve("high-accuracy", DATA, hostname="pi")[0] == "high-accuracy"
+
+
+def test_validation_parses_query_strings_and_collects_all_errors():
+    assert validate({"beam_size": "3", "low_memory": "ja", "silence_seconds": 2}) == \
+        {"beam_size": 3, "low_memory": True, "silence_seconds": 2.0}
+    with pytest.raises(ConfigError) as error:
+        validate({"beam_size": "mange", "whisper_model": "huge", "foo": 1})
+    message = str(error.value)
+    assert "beam_size" in message and "whisper_model" in message and "'foo'" in message
+
+
+def test_invalid_file_values_and_inconsistent_settings_are_rejected():
+    with pytest.raises(ConfigError, match="hosts.pi.settings"):
+        resolve(data={"hosts": {"pi": {"settings": {"chunk": 4}}}}, hostname="pi")
+    with pytest.raises(ConfigError, match="silence_seconds"):
+        resolve(data={"settings": {"silence_seconds": 30.0, "max_recording_seconds": 10.0}}, hostname="x")
+    with pytest.raises(ConfigError, match="ukendt profil"):
+        resolve("turbo", {}, hostname="x")
+
+
+def test_update_rejects_restart_settings_at_runtime():
+    cfg = Config()
+    with pytest.raises(ConfigError, match="genstart"):
+        cfg.update({"chunk": 512})
+    assert cfg["chunk"] == SETTINGS["chunk"].default
+    assert cfg.update({"chunk": 512}, startup=True) == {"chunk": 512}
+
+
+def test_update_returns_only_real_changes():
+    cfg = Config()
+    assert cfg.update({"beam_size": SETTINGS["beam_size"].default}) == {}
+    assert cfg.update({"beam_size": "2"}) == {"beam_size": 2}
+    assert cfg["beam_size"] == 2
+
+
+def test_failing_listener_reverts_the_change():
+    cfg = Config()
+
+    def broken():
+        raise RuntimeError("ingen GPU")
+
+    cfg.on_change(("whisper_device",), broken)
+    with pytest.raises(ConfigError, match="ingen GPU"):
+        cfg.update({"whisper_device": "cuda", "beam_size": 2})
+    assert cfg["whisper_device"] == "auto"
+    assert cfg["beam_size"] == SETTINGS["beam_size"].default
+
+
+def test_listener_runs_without_holding_the_config_lock():
+    cfg = Config()
+    seen = []
+
+    def reload():
+        # En langsom genindlæsning må ikke blokere andre ændringer
+        done = threading.Event()
+        threading.Thread(target=lambda: (cfg.update({"beam_size": 1}), done.set())).start()
+        assert done.wait(1)
+        seen.append(cfg["whisper_model"])
+
+    cfg.on_change(("whisper_model",), reload)
+    cfg.update({"whisper_model": "base"})
+    assert seen == ["base"] and cfg["beam_size"] == 1
+
+
+def test_profile_switch_lists_restart_only_settings_as_pending(live_config):
+    profile, changes, pending = jarvis_config.changes_from_params({"profile": "low-latency", "beam_size": "2"})
+    assert profile == "low-latency"
+    assert "chunk" not in changes and "chunk" in pending
+    assert changes["silence_seconds"] == 1.0 and changes["beam_size"] == "2"
+
+    status, text = jarvis_config.admin_config({"profile": "low-latency"})
+    result = json.loads(text)
+    assert status == 200 and result["profile"] == "low-latency"
+    assert result["restart_required"] == ["chunk"]
+    assert live_config["silence_seconds"] == 1.0
+
+
+def test_show_config_never_changes_anything(live_config):
+    status, text = jarvis_config.show_config({})
+    assert status == 200 and json.loads(text)["settings"]["beam_size"]["value"] == 5
+    status, _ = jarvis_config.show_config({"beam_size": "1"})
+    assert status == 405
+    assert live_config["beam_size"] == 5
+
+
+@pytest.fixture
+def metrics_server(live_config, monkeypatch):
+    monkeypatch.setattr(metrics, "ADMIN_ROUTES", {})
+    metrics.register_admin_route("/admin/config", jarvis_config.admin_config, read=jarvis_config.show_config)
+    server = metrics.start_metrics_server("127.0.0.1", 0)
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_admin_route_changes_only_on_post(metrics_server, live_config):
+    url = metrics_server + "/admin/config?beam_size=2"
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(url)
+    assert error.value.code == 405
+    assert live_config["beam_size"] == 5
+
+    with urllib.request.urlopen(urllib.request.Request(url, method="POST")) as response:
+        assert json.loads(response.read())["changed"] == {"beam_size": 2}
+    assert live_config["beam_size"] == 2
+
+    with urllib.request.urlopen(metrics_server + "/admin/config") as response:
+        assert json.loads(response.read())["settings"]["beam_size"]["value"] == 2
@@ -0,0 +1,81 @@
+import concurrent.futures
+from collections import Counter
+
+import pytest
+
+import jarvis_server
+from jarvis_server import ConsistentHashRing, Supervisor
+
+
+def test_ring_routes_a_session_to_the_same_worker():
+    ring = ConsistentHashRing(range(4))
+    assert {ring.get("session-42") for _ in range(10)} == {ring.get("session-42")}
+
+
+def test_ring_spreads_sessions_over_all_workers():
+    ring = ConsistentHashRing(range(4))
+    counts = Counter(ring.get(f"session-{i}") for i in range(4000))
+    assert set(counts) == {0, 1, 2, 3}
+    assert min(counts.values()) > 500  # Ingen worker får næsten ingenting
+
+
+def test_ring_moves_only_the_removed_workers_sessions():
+    ring = ConsistentHashRing(range(4))
+    sessions = [f"session-{i}" for i in range(2000)]
+    before = {s: ring.get(s) for s in sessions}
+    ring.remove(3)
+    after = {s: ring.get(s) for s in sessions}
+    moved = [s for s in sessions if before[s] != after[s]]
+    assert moved and all(before[s] == 3 for s in moved)
+    assert 3 not in after.values()
+
+
+def test_ring_without_workers_raises():
+    with pytest.raises(LookupError):
+        ConsistentHashRing().get("session")
+
+
+class FakeProcess:
+    def __init__(self, alive):
+        self.alive = alive
+
+    def is_alive(self):
+        return self.alive
+
+
+class FakeQueue(list):
+    put = list.append
+
+
+def test_dead_worker_is_restarted_once_and_its_pending_turns_fail(monkeypatch):
+    supervisor = Supervisor(n_workers=1)
+    supervisor.ring.add(0)
+    old_queue = FakeQueue()
+    supervisor.queues[0] = old_queue
+    supervisor.processes[0] = FakeProcess(alive=True)
+    stuck = supervisor.submit("a", "text", "hej")
+
+    started = []
+
+    def fake_start(worker_id):
+        started.append(worker_id)
+        supervisor.queues[worker_id] = FakeQueue()
+        supervisor.processes[worker_id] = FakeProcess(alive=True)
+
+    monkeypatch.setattr(supervisor, "_start_worker", fake_start)
+    supervisor.processes[0].alive = False
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as pool:
+        futures = list(pool.map(lambda i: supervisor.submit(f"s{i}", "text", "hej"), range(8)))
+
+    assert started == [0]
+    with pytest.raises(RuntimeError):
+        stuck.result(timeout=0)
+    assert len(supervisor.queues[0]) == 8
+    assert not any(f.done() for f in futures)
+    assert len(supervisor.pending) == 8
+
+
+def test_supervisor_does_not_import_jarvis_main():
+    import sys
+    assert jarvis_server.SHARED == {}
+    assert "jarvis_main" not in sys.modules
@@ -0,0 +1,60 @@
+import os
+import sqlite3
+
+import pytest
+
+from notes_store import NotesStore, _fts_query
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = NotesStore(str(tmp_path / "notes.db"))
+    yield store
+    store.close()
+
+
+def test_database_uses_wal(store):
+    conn = sqlite3.connect(store.path)
+    try:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    finally:
+        conn.close()
+
+
+def test_recent_returns_newest_first_per_kind(store):
+    store.add("køb mælk", created=1.0)
+    store.add("ring til tandlægen", created=3.0)
+    store.add("mød Jonas kl. 10", kind="message", created=2.0)
+    store.add("hent pakke", created=2.0)
+    assert [e["text"] for e in store.recent(limit=2)] == ["ring til tandlægen", "hent pakke"]
+    assert [e["text"] for e in store.recent(limit=2, offset=2)] == ["køb mælk"]
+    assert [e["text"] for e in store.recent(kind="message")] == ["mød Jonas kl. 10"]
+    assert store.count() == 3
+
+
+def test_search_matches_word_prefixes_and_filters_speaker(store):
+    if not store.fts:
+        pytest.skip("SQLite uden FTS5")
+    store.add("køb mælk og brød", speaker="jonas", created=1.0)
+    store.add("mælkebøtter i haven", speaker="david", created=2.0)
+    store.add("ring til tandlægen", speaker="jonas", created=3.0)
+    assert {e["text"] for e in store.search("mælk")} == {"køb mælk og brød", "mælkebøtter i haven"}
+    assert [e["text"] for e in store.search("mælk", speaker="jonas")] == ["køb mælk og brød"]
+    assert [e["text"] for e in store.search("tandlæge")] == ["ring til tandlægen"]
+    assert store.search("?!") == []  # Intet søgeord tilbage efter rensning
+
+
+def test_fts_query_quotes_words():
+    assert _fts_query('mælk "OR" brød*') == '"mælk"* "OR"* "brød"*'
+
+
+def test_legacy_files_are_imported_once(store, tmp_path):
+    legacy = tmp_path / "noter.txt"
+    legacy.write_text("første note\n\nanden note\n", encoding="utf-8")
+    os.utime(legacy, (1000.0, 1000.0))
+    files = [(str(legacy), "note")]
+    store.import_legacy(files)
+    store.import_legacy(files)
+    entries = store.recent(limit=10)
+    assert sorted(e["text"] for e in entries) == ["anden note", "første note"]
+    assert {e["created"] for e in entries} == {1000.0}
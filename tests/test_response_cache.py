@@ -0,0 +1,63 @@
+import response_cache
+from response_cache import ResponseCache
+from jarvis_config import Config
+
+
+def test_get_returns_what_was_put():
+    cache = ResponseCache()
+    cache.put(("hej", "v1"), ("Hej!", "retrieval"))
+    assert cache.get(("hej", "v1")) == ("Hej!", "retrieval")
+    assert cache.get(("hej", "v2")) is None  # Ny modelversion = ny nøgle
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "a" er nu senest brugt
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert len(cache) == 2
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "monotonic", lambda: now[0])
+    cache = ResponseCache(ttl=60)
+    cache.put("a", 1)
+    now[0] += 59
+    assert cache.get("a") == 1
+    now[0] += 2
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_put_refreshes_the_timestamp(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(response_cache.time, "monotonic", lambda: now[0])
+    cache = ResponseCache(ttl=10)
+    cache.put("a", 1)
+    now[0] = 8
+    cache.put("a", 2)
+    now[0] = 15
+    assert cache.get("a") == 2
+
+
+def test_clear_empties_the_cache():
+    cache = ResponseCache()
+    cache.put("a", 1)
+    cache.clear()
+    assert cache.get("a") is None
+
+
+def test_changing_similarity_threshold_clears_the_cache():
+    # Samme kobling som i jarvis_main: tærsklen ændrer svaret uden at ændre nøglen
+    cfg = Config()
+    cache = ResponseCache()
+    cfg.on_change(("similarity_threshold",), cache.clear)
+    cache.put(("hej", "v1"), ("Hej!", "retrieval"))
+    cfg.update({"beam_size": 2})
+    assert len(cache) == 1
+    cfg.update({"similarity_threshold": 0.7})
+    assert cache.get(("hej", "v1")) is None
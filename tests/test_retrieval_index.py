@@ -0,0 +1,45 @@
+import numpy as np
+
+from retrieval_index import RetrievalIndex, pairs_fingerprint
+
+PAIRS = [
+    {"user": "hvad hedder du", "jarvis": "Jeg hedder Jarvis."},
+    {"user": "hvordan har du det", "jarvis": "Jeg har det fint."},
+    {"user": "hvem har lavet dig", "jarvis": "Jonas har lavet mig."},
+]
+
+
+def is_memory_mapped(array):
+    while array is not None and not isinstance(array, np.memmap):
+        array = array.base
+    return array is not None
+
+
+def test_query_finds_the_closest_question():
+    index = RetrievalIndex.build(PAIRS)
+    answer, score = index.query("hvad hedder du egentlig")
+    assert answer == "Jeg hedder Jarvis."
+    assert score > 0.4
+
+
+def test_query_below_threshold_returns_no_answer():
+    answer, score = RetrievalIndex.build(PAIRS).query("fortæl en vittighed")
+    assert answer is None
+    assert score < 0.4
+
+
+def test_save_and_mmap_load_round_trip(tmp_path):
+    index = RetrievalIndex.build(PAIRS)
+    index.save(str(tmp_path))
+    loaded = RetrievalIndex.load(str(tmp_path), mmap=True)
+    for array in (loaded.matrix.data, loaded.matrix.indices, loaded.matrix.indptr):
+        assert is_memory_mapped(array)  # Views på filen, ikke kopier
+    assert loaded.answers == index.answers
+    assert loaded.fingerprint == pairs_fingerprint(PAIRS)
+    texts = ["hvad hedder du", "hvem har lavet dig", "ukendt"]
+    np.testing.assert_allclose(loaded.query_many(texts), index.query_many(texts))
+
+
+def test_fingerprint_changes_with_the_pairs():
+    changed = PAIRS[:2] + [{"user": "hvem har lavet dig", "jarvis": "Det har Jonas."}]
+    assert pairs_fingerprint(changed) != pairs_fingerprint(PAIRS)
@@ -0,0 +1,19 @@
+from sampling_profiler import profiler, profile_status, admin_profile
+
+
+def test_get_only_reports_status():
+    assert profile_status({}) == (200, "stoppet\n")
+    status, _ = profile_status({"action": "start"})
+    assert status == 405
+    assert not profiler.running
+
+
+def test_post_starts_and_stops(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiler, "profile_dir", str(tmp_path))
+    assert admin_profile({"action": "start", "mode": "window"}) == (200, "startet\n")
+    try:
+        assert profile_status({}) == (200, "kører (window)\n")
+    finally:
+        status, text = admin_profile({"action": "stop"})
+    assert status == 200 and text.startswith("stoppet")
+    assert not profiler.running
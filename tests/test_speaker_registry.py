@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from speaker_registry import SpeakerRegistry, INITIAL_CAPACITY
+
+
+def test_enroll_many_grows_and_saves_labels_once(tmp_path, monkeypatch):
+    registry = SpeakerRegistry(str(tmp_path / "registry"), dim=4)
+    saves = []
+    original = registry._save_meta
+    monkeypatch.setattr(registry, "_save_meta", lambda: (saves.append(1), original()))
+
+    rng = np.random.default_rng(0)
+    n = INITIAL_CAPACITY + 5  # Kræver at arrayet vokser midt i batchen
+    entries = [(f"taler{i % 3}", rng.normal(size=4), f"voices/{i}.wav", i, 100 + i) for i in range(n)]
+    rows = registry.enroll_many(entries)
+
+    assert rows == list(range(n))
+    assert len(saves) == 1
+    assert len(registry) == n
+    assert registry.speakers() == ["taler0", "taler1", "taler2"]
+    assert registry.rows_by_source()["voices/7.wav"] == 7
+
+    # Genåbnet fra disken er batchen der i sin helhed
+    reopened = SpeakerRegistry(str(tmp_path / "registry"), dim=4)
+    assert len(reopened) == n
+    np.testing.assert_allclose(reopened.embeddings[3], entries[3][1].astype(np.float32))
+    assert reopened.search(entries[3][1], k=1)[0][0] == "taler0"
+
+
+def test_enroll_many_rejects_wrong_dimension_before_writing(tmp_path):
+    registry = SpeakerRegistry(str(tmp_path / "registry"), dim=4)
+    with pytest.raises(ValueError):
+        registry.enroll_many([("a", np.zeros(4), None, None, None), ("b", np.zeros(3), None, None, None)])
+    assert len(registry) == 0
+    assert registry.enroll_many([]) == []
@@ -0,0 +1,101 @@
+import pytest
+
+from teach_dialog import TeachDialog, DialogManager, CONFIRM_TIMEOUT, ANSWER_TIMEOUT
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def test_yes_then_answer_learns_the_pair(clock):
+    dialog = TeachDialog("hvad er din yndlingsfarve", clock=clock)
+    reply, learned = dialog.step("Ja tak")
+    assert dialog.state == "answer" and learned is None
+    assert "hvad er din yndlingsfarve" in reply
+    reply, learned = dialog.step("  Blå  ")
+    assert (dialog.state, learned) == ("done", "Blå")
+    assert not dialog.active
+
+
+def test_no_declines(clock):
+    dialog = TeachDialog("spørgsmål", clock=clock)
+    assert dialog.step("nej") == (None, None)
+    assert dialog.state == "declined"
+
+
+def test_other_input_abandons_the_dialog(clock):
+    dialog = TeachDialog("spørgsmål", clock=clock)
+    assert dialog.step("hvad er klokken") == (None, None)
+    assert dialog.state == "abandoned"
+
+
+@pytest.mark.parametrize("text, state", [("nogen", "abandoned"), ("jamen", "abandoned"),
+                                         ("ok", "answer"), ("ellers tak", "declined")])
+def test_yes_and_no_match_whole_words(clock, text, state):
+    dialog = TeachDialog("spørgsmål", clock=clock)
+    dialog.step(text)
+    assert dialog.state == state
+
+
+def test_empty_answer_ends_without_learning(clock):
+    dialog = TeachDialog("spørgsmål", clock=clock)
+    dialog.step("ja")
+    reply, learned = dialog.step("")
+    assert learned is None and dialog.state == "done" and reply
+
+
+def test_each_step_has_its_own_timeout(clock):
+    dialog = TeachDialog("spørgsmål", clock=clock)
+    dialog.arm()
+    clock.now += CONFIRM_TIMEOUT
+    assert dialog.active
+    dialog.step("ja")
+    dialog.arm()
+    clock.now += ANSWER_TIMEOUT
+    assert dialog.active
+    clock.now += 0.1
+    assert not dialog.active
+
+
+def test_timeout_starts_when_the_prompt_has_been_spoken(clock):
+    dialog = TeachDialog("spørgsmål", clock=clock)
+    clock.now += CONFIRM_TIMEOUT + 5  # Langsom TTS - tiden tæller ikke før arm()
+    assert dialog.active
+    dialog.arm(playing_seconds=4.0)
+    clock.now += 4.0 + CONFIRM_TIMEOUT
+    assert dialog.active
+    dialog.arm(playing_seconds=100.0)  # Allerede armeret - fristen flyttes ikke
+    clock.now += 0.1
+    assert not dialog.active
+
+    dialog = TeachDialog("spørgsmål", clock=clock)
+    dialog.arm()
+    dialog.step("ja")
+    clock.now += ANSWER_TIMEOUT + 5  # Spørgsmålet om svaret er heller ikke læst op endnu
+    assert dialog.active
+
+
+def test_manager_drops_expired_dialogs(clock):
+    manager = DialogManager()
+    dialog = manager.start("s1", TeachDialog("spørgsmål", clock=clock))
+    assert manager.active("s1") is dialog
+    assert manager.active("s2") is None  # Sessioner er uafhængige
+    dialog.arm()
+    clock.now += CONFIRM_TIMEOUT + 1
+    assert manager.active("s1") is None
+
+
+def test_manager_finish_removes_the_dialog(clock):
+    manager = DialogManager()
+    manager.start("s1", TeachDialog("spørgsmål", clock=clock))
+    manager.finish("s1")
+    assert manager.active("s1") is None
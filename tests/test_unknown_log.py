@@ -0,0 +1,65 @@
+from unknown_log import UnknownLog, normalize
+
+
+def test_normalize_strips_case_punctuation_and_spacing():
+    assert normalize("Hvad er  klocken?") == "hvad er klocken"
+    assert normalize("  HEJ, Jarvis!! ") == "hej jarvis"
+    assert normalize("Ｈej") == "hej"  # NFKC: fuld-bredde tegn
+    assert normalize("?!") == ""
+
+
+def test_repeated_sentences_are_upserted_into_one_row(tmp_path):
+    log = UnknownLog(str(tmp_path / "unknown.db"))
+    try:
+        log.record("Hvad er klocken?")
+        log.record("hvad er klocken")
+        log.record("Hvem vandt kampen")
+        rows = {row["normalized"]: row for row in log.top()}
+        assert rows["hvad er klocken"]["count"] == 2
+        assert rows["hvem vandt kampen"]["count"] == 1
+        assert rows["hvad er klocken"]["first_seen"] <= rows["hvad er klocken"]["last_seen"]
+
+        # En senere batch tæller videre på den samme række
+        log.record("HVAD ER KLOCKEN")
+        top = log.top(limit=1)[0]
+        assert (top["normalized"], top["count"]) == ("hvad er klocken", 3)
+    finally:
+        log.close()
+
+
+def test_details_are_stored_and_kept_when_missing_later(tmp_path):
+    log = UnknownLog(str(tmp_path / "unknown.db"))
+    try:
+        log.record("spil musik", details=lambda: {"top_intent": "youtube", "intent_prob": 0.31,
+                                                   "retrieval_score": 0.12})
+        log.flush()
+        log.record("spil musik")
+        row = log.top()[0]
+        assert row["count"] == 2
+        assert (row["top_intent"], row["intent_prob"], row["retrieval_score"]) == ("youtube", 0.31, 0.12)
+    finally:
+        log.close()
+
+
+def test_empty_sentences_are_ignored(tmp_path):
+    log = UnknownLog(str(tmp_path / "unknown.db"))
+    try:
+        log.record("")
+        log.record("...")
+        assert log.top() == []
+    finally:
+        log.close()
+
+
+def test_failing_details_do_not_drop_the_sentence(tmp_path):
+    log = UnknownLog(str(tmp_path / "unknown.db"))
+
+    def broken():
+        raise RuntimeError("ingen model")
+
+    try:
+        log.record("noget nyt", details=broken)
+        row = log.top()[0]
+        assert (row["normalized"], row["count"], row["top_intent"]) == ("noget nyt", 1, None)
+    finally:
+        log.close()